@@ -0,0 +1,164 @@
+import glob
+import os
+import threading
+from collections import namedtuple
+
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+
+from data_store import PROCESSED_DIR, temp_path, write_table
+
+ANIMATED_DIR = os.path.join(PROCESSED_DIR, "animated")
+# to change when the figure is built differently, for the stored figures of
+#   the same data to be built again
+FIGURE_VERSION = 1
+
+# the shorter names of the columns of the monthly table shown in the app
+SHORT_NAMES = {'WP KUALA LUMPUR': 'KL',
+               'WP LABUAN': 'LABUAN',
+               'WP PUTRAJAYA': 'PUTRAJAYA',
+               'PULAU PINANG': 'PENANG'}
+
+# the animated map of a version of the data bundle:
+#   - monthly: the monthly cases of each state, with the short names
+#   - figure: the animated choropleth, one frame per month
+AnimatedMap = namedtuple("AnimatedMap", ["version", "monthly", "figure"])
+
+# the maps of this process, shared by every session like `data_bundle.bundles`
+animated_maps = {}
+animated_lock = threading.Lock()
+
+
+def monthly_state(dfState):
+    """the sum of the new cases of each state in each month"""
+    df_month = dfState.groupby(dfState.index.to_period('M')).sum().astype(int)
+    df_month.index = df_month.index.to_timestamp()
+    df_month.index.name = 'Date'
+    return df_month
+
+
+def preprocess_long(df, correct_state_id):
+    df = pd.melt(df, ignore_index=False,
+                 var_name='State', value_name='Confirmed')
+    df['id'] = df.State.map(correct_state_id)
+    df.reset_index(inplace=True)
+    # Sort it based on dates to possibly speed up the plotting
+    df = df.sort_values('Date', ignore_index=True)
+    # the month as a string for the plotly function to work
+    df['Date'] = df.Date.dt.strftime("%b, %y")
+    # change the column name to Month
+    df.rename(columns={'Date': 'Month'}, inplace=True)
+    return df
+
+
+def build_figure(df_long, msia_geojson):
+    fig = px.choropleth(
+        df_long,
+        locations="id",
+        geojson=msia_geojson,
+        color="Confirmed",
+        hover_name="State",
+        hover_data={"id": False, "Confirmed": True},
+        color_continuous_scale="Purp",
+        animation_frame="Month"
+    )
+    fig.update_layout(
+        geo=dict(
+            showframe=False,
+            fitbounds="locations",
+            visible=False
+        )
+    )
+    fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0}, height=600)
+    return fig
+
+
+def artefact_paths(version, animated_dir=ANIMATED_DIR):
+    """the stored monthly table and figure of the version of the bundle"""
+    name = f"animated_v{FIGURE_VERSION}_{version}"
+    return (os.path.join(animated_dir, f"{name}.arrow"),
+            os.path.join(animated_dir, f"{name}.json"))
+
+
+def build_animated_map(bundle, animated_dir=ANIMATED_DIR):
+    """build the animated map of the bundle and store it in `animated_dir`"""
+    df_month = monthly_state(bundle.state_new)
+    # without the first and the last months, which are incomplete
+    df_long = preprocess_long(df_month.iloc[1:-1], bundle.state_ids)
+    fig = build_figure(df_long, bundle.maps["coarse"])
+    df_month = df_month.rename(columns=SHORT_NAMES)
+
+    os.makedirs(animated_dir, exist_ok=True)
+    table_path, figure_path = artefact_paths(bundle.version, animated_dir)
+    write_table(df_month, table_path)
+    tmp_path = temp_path(figure_path)
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(pio.to_json(fig, validate=False))
+        os.replace(tmp_path, figure_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    # the artefacts of the older versions, but not the temporary files
+    #   of the other processes still writing theirs
+    for path in glob.glob(os.path.join(animated_dir, "animated_*")):
+        if path not in (table_path, figure_path) \
+                and not path.endswith(".tmp"):
+            # to ignore the files already removed by another process
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return AnimatedMap(bundle.version, df_month, fig)
+
+
+def read_animated_map(version, animated_dir=ANIMATED_DIR):
+    table_path, figure_path = artefact_paths(version, animated_dir)
+    df_month = pd.read_feather(table_path).set_index('Date')
+    with open(figure_path, 'r') as f:
+        fig = pio.from_json(f.read())
+    return AnimatedMap(version, df_month, fig)
+
+
+def load_animated_map(bundle, animated_dir=ANIMATED_DIR):
+    """
+    The animated map of the data bundle, built once per version of the
+    data and stored, to be read by the other processes (or after a
+    restart) instead of built again. A rerun of the app only returns the
+    figure of this process.
+
+    The figure is shared, it must not be modified by the caller.
+    """
+    animated = animated_maps.get(animated_dir)
+    if animated is not None and animated.version == bundle.version:
+        return animated
+
+    with animated_lock:
+        animated = animated_maps.get(animated_dir)
+        if animated is None or animated.version != bundle.version:
+            if all(os.path.exists(path) for path in
+                   artefact_paths(bundle.version, animated_dir)):
+                animated = read_animated_map(bundle.version, animated_dir)
+            else:
+                print(f"[INFO] Building the animated map {bundle.version} ...")
+                animated = build_animated_map(bundle, animated_dir)
+            animated_maps[animated_dir] = animated
+        return animated
+
+
+if __name__ == '__main__':
+    import time
+
+    from data_bundle import load_bundle
+
+    bundle = load_bundle()
+    for i in range(2):
+        start_time = time.perf_counter()
+        animated_maps.clear()
+        animated = load_animated_map(bundle)
+        total_time = time.perf_counter() - start_time
+        print(f"[INFO] Animated map {animated.version} "
+              f"({len(animated.figure.frames)} frames) in "
+              f"{1000 * total_time:.2f} ms")
@@ -1,10 +1,12 @@
-import json
 import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objs as go
 import streamlit as st
-from PIL import Image
+
+from animated_map import load_animated_map
+from data_bundle import load_bundle, read_image
+from figure_cache import cached_figure
 
 ORIG_DIR = "original_data"
 PROCESSED_DIR = "processed_data"
@@ -39,66 +41,26 @@ All the figures are ***interactive***. You can zoom in by dragging in the figure
 """)
 
 st.markdown('---')
-image = Image.open('covid19.jpg')
+image = read_image('covid19.jpg')
 st.image(image, use_column_width=True)
 st.markdown("""
 Image source: [COVID-19](https://www.ei-ie.org/en/detail/16723/covid-19-educators-call-for-global-solidarity-and-a-human-centred-approach-to-the-crisis)
 """)
 
 
-@st.cache
-def read_all_csv():
-    df = pd.read_csv(f"{PROCESSED_DIR}//cleaned_all.csv")
-    df.Date = pd.to_datetime(df.Date, format='%Y-%m-%d')
-    df.set_index('Date', inplace=True)
-
-    df_m = pd.read_csv(f'{PROCESSED_DIR}//monthly_sum.csv')
-    df_m.Date = pd.to_datetime(df_m.Date, format='%Y-%m-%d')
-    df_m.set_index('Date', inplace=True)
-
-    dfState = pd.read_csv(f'{PROCESSED_DIR}//state_all.csv')
-    dfStateCumu = pd.read_csv(f'{PROCESSED_DIR}//state_cumu.csv')
-
-    dfState.Date = pd.to_datetime(dfState.Date)
-    dfStateCumu.Date = pd.to_datetime(dfStateCumu.Date)
-
-    dfState.set_index('Date', inplace=True)
-    dfStateCumu.set_index('Date', inplace=True)
-    return df, df_m, dfState, dfStateCumu
-
-
-def read_map():
-    # https://www.igismap.com/download-malaysia-shapefile-area-map-free-country-boundary-state-polygon/
-    with open('original_data//malaysia_state_province_boundary.geojson', 'r') as f:
-        msia_geojson = json.load(f)
-    return msia_geojson
-
-
-def get_df_state():
-    state_id_dict = {}
-    for i, feature in enumerate(msia_geojson['features']):
-        feature['id'] = i
-        state_id_dict[feature['properties']['locname']] = i
-
-    df_state_total = dfStateCumu.iloc[[-1]].T.reset_index()
-    df_state_total.columns = ['State', 'Confirmed']
-    df_state_total['State_spaced'] = df_state_total['State'] + '  '
-
-    correct_state_id = {}
-    for stateName in df_state_total.State:
-        name_to_search = stateName.replace('WP ', '')
-        for k, v in state_id_dict.items():
-            if name_to_search.lower() in k.lower():
-                correct_state_id[stateName] = int(v)
-
-    df_state_total['id'] = df_state_total.State.map(correct_state_id)
-
-    return df_state_total, correct_state_id
-
-
-df, df_m, dfState, dfStateCumu = read_all_csv()
-msia_geojson = read_map()
-df_state_total, correct_state_id = get_df_state()
+# loaded once per process (not per rerun), and again only when the files
+#   in `processed_data` or the map have changed
+bundle = load_bundle(PROCESSED_DIR)
+df, df_m = bundle.national, bundle.monthly
+dfState, dfStateCumu = bundle.state_new, bundle.state_cumu
+# the zoomable Mapbox map keeps the details of the coast, the maps fitted
+#   to Malaysia only need the coarse shapes (and the frames of the
+#   animated map each carry their own copy)
+msia_geojson = bundle.maps["fine"]
+coarse_geojson = bundle.maps["coarse"]
+df_state_total, correct_state_id = bundle.state_total, bundle.state_ids
+# the figures only depend on the version of the data and the options, they
+#   are built once and shared by every session, see `figure_cache.py`
 # with st.spinner("[INFO] Loading necessary files ..."):
 
 max_row = df.loc[df['SMA_new'] == df['SMA_new'].max()]
@@ -136,183 +98,200 @@ else:
     map_checkbox = st.sidebar.checkbox("Show Choropleth Map", value=True)
     animated_checkbox = st.sidebar.checkbox("Show Animated Map!", value=True)
 
-st.sidebar.info("""The animated map will take awhile to load.""")
-
 
 if (display_one == "Show by Daily Cases") or all_data_checkbox:
     st.markdown("---")
     st.markdown("# Daily Cases")
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df.index, y=df['New Case'],
-                             line=dict(color='teal'),
-                             name='Confirmed'))
-    fig.add_trace(go.Scatter(x=df.index, y=df['Recovered'],
-                             line=dict(color='royalblue'),
-                             name='Recovered'))
-    fig.add_trace(go.Scatter(x=df.index, y=df['Death'],
-                             line=dict(color='coral'),
-                             name='Death'))
-    fig.update_layout(title='COVID-19 Malaysia: Daily Cases',
-                      height=600,
-                      # hovermode="x unified",
-                      xaxis_title=None, yaxis_title=None,
-                      legend=dict(
-                          yanchor="top",
-                          y=0.99,
-                          xanchor="left",
-                          x=0.01
-                      ))
-    fig.update_layout(
-        hovermode="x",
-        hoverdistance=100,  # Distance to show hover label of data point
-        spikedistance=1000,  # Distance to show spike
-        xaxis=dict(
-            # linecolor="#BCCCDC",
-            showspikes=True,  # Show spike line for X-axis
-            # Format spike
-            spikethickness=2,
-            spikedash="dot",
-            spikecolor="#000000",
-            spikemode="across",
+
+    def daily_cases_figure():
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=df.index, y=df['New Case'],
+                                 line=dict(color='teal'),
+                                 name='Confirmed'))
+        fig.add_trace(go.Scatter(x=df.index, y=df['Recovered'],
+                                 line=dict(color='royalblue'),
+                                 name='Recovered'))
+        fig.add_trace(go.Scatter(x=df.index, y=df['Death'],
+                                 line=dict(color='coral'),
+                                 name='Death'))
+        fig.update_layout(title='COVID-19 Malaysia: Daily Cases',
+                          height=600,
+                          # hovermode="x unified",
+                          xaxis_title=None, yaxis_title=None,
+                          legend=dict(
+                              yanchor="top",
+                              y=0.99,
+                              xanchor="left",
+                              x=0.01
+                          ))
+        fig.update_layout(
+            hovermode="x",
+            hoverdistance=100,  # Distance to show hover label of data point
+            spikedistance=1000,  # Distance to show spike
+            xaxis=dict(
+                # linecolor="#BCCCDC",
+                showspikes=True,  # Show spike line for X-axis
+                # Format spike
+                spikethickness=2,
+                spikedash="dot",
+                spikecolor="#000000",
+                spikemode="across",
+            )
         )
-    )
-    fig.update_xaxes(rangeslider_visible=True)
+        fig.update_xaxes(rangeslider_visible=True)
+        return fig
+
+    fig = cached_figure("daily_cases", bundle.version, daily_cases_figure)
     st.plotly_chart(fig, use_container_width=True,
                     # config={"displayModeBar": False}
                     )
 
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df.index, y=df['Cumulative Case'],
-                             line=dict(color='teal'),
-                             name='Confirmed'))
-    fig.add_trace(go.Scatter(x=df.index, y=df['Cumulative Recovered'],
-                             line=dict(color='royalblue'),
-                             name='Recovered'))
-    fig.add_trace(go.Scatter(x=df.index, y=df['Cumulative Death'],
-                             line=dict(color='coral'),
-                             name='Death'))
-    fig.update_layout(title='COVID-19 Malaysia: Cumulative Cases',
-                      height=600,
-                      #   hovermode="x unified",
-                      xaxis_title=None, yaxis_title='Log Scale',
-                      hovermode="x",
-                      hoverdistance=100,  # Distance to show hover label of data point
-                      spikedistance=1000,
-                      xaxis=dict(
-                          showspikes=True,  # Show spike line for X-axis
-                          # Format spike
-                          spikethickness=2,
-                          spikedash="dot",
-                          spikecolor="#000000",
-                          spikemode="across",
-                      ),
-                      legend=dict(
-                          yanchor="top",
-                          y=0.99,
-                          xanchor="left",
-                          x=0.01
-                      ))
-    fig.update_yaxes(type='log')
+    def cumulative_cases_figure():
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=df.index, y=df['Cumulative Case'],
+                                 line=dict(color='teal'),
+                                 name='Confirmed'))
+        fig.add_trace(go.Scatter(x=df.index, y=df['Cumulative Recovered'],
+                                 line=dict(color='royalblue'),
+                                 name='Recovered'))
+        fig.add_trace(go.Scatter(x=df.index, y=df['Cumulative Death'],
+                                 line=dict(color='coral'),
+                                 name='Death'))
+        fig.update_layout(title='COVID-19 Malaysia: Cumulative Cases',
+                          height=600,
+                          #   hovermode="x unified",
+                          xaxis_title=None, yaxis_title='Log Scale',
+                          hovermode="x",
+                          hoverdistance=100,  # Distance to show hover label of data point
+                          spikedistance=1000,
+                          xaxis=dict(
+                              showspikes=True,  # Show spike line for X-axis
+                              # Format spike
+                              spikethickness=2,
+                              spikedash="dot",
+                              spikecolor="#000000",
+                              spikemode="across",
+                          ),
+                          legend=dict(
+                              yanchor="top",
+                              y=0.99,
+                              xanchor="left",
+                              x=0.01
+                          ))
+        fig.update_yaxes(type='log')
+        return fig
+
+    fig = cached_figure("cumulative_cases", bundle.version,
+                        cumulative_cases_figure)
     st.plotly_chart(fig, use_container_width=True)
 
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df.index, y=df['New Case'],
-                             # marker_color='royalblue',
-                             line=dict(color='royalblue'),
-                             name='New Case'))
-    fig.add_trace(go.Scatter(x=df.index, y=df['SMA_new'],
-                             line=dict(color='coral'),
-                             name='Average'))
-    fig.update_layout(title='COVID-19 Malaysia: New Case VS 7-day Moving Average',
-                      xaxis_title=None, yaxis_title=None)
-    fig.update_layout(hovermode="x unified",
-                      height=600,
-                      xaxis=dict(
-                          # Format spike
-                          spikethickness=2,
-                          spikecolor="#000000",
-                      ),
-                      legend=dict(
-                          yanchor="top",
-                          y=0.99,
-                          xanchor="left",
-                          x=0.01
-                      ))
-    fig.add_annotation(x=str(max_row.index.values[0]), y=int(max_row['SMA_new'].values[0]),
-                       text=f"Highest average on {max_row.index.date[0]}"
-                       f": {int(max_row['SMA_new'].values[0])}",
-                       xref="x",
-                       yref="y",
-                       showarrow=True,
-                       font=dict(
-        family="Courier New, monospace",
-        size=16,
-        color="#ffffff"
-    ),
-        align="center",
-        xanchor='right',
-        arrowhead=1,
-        arrowsize=1,
-        arrowwidth=2,
-        arrowcolor="#636363",
-        ax=-20,
-        ay=15,
-        bordercolor="#c7c7c7",
-        borderwidth=2,
-        borderpad=4,
-        bgcolor="brown",
-        standoff=2,
-        opacity=0.8)
-    fig.add_annotation(x=last_row.name, y=int(last_row['SMA_new']),
-                       text=f"Latest: {int(last_row['SMA_new'])}; "
-                       f"{pct_vs_peak}% of the peak average",
-                       xref="x",
-                       yref="y",
-                       showarrow=True,
-                       font=dict(
-        family="Courier New, monospace",
-        size=16,
-        color="#ffffff"
-    ),
-        align="center",
-        xanchor='right',
-        arrowhead=1,
-        arrowsize=1,
-        arrowwidth=2,
-        arrowcolor="#636363",
-        ax=-25,
-        ay=-20,
-        bordercolor="#c7c7c7",
-        borderwidth=2,
-        borderpad=4,
-        bgcolor="brown",
-        standoff=2,
-        opacity=0.8)
-    fig.update_xaxes(rangeslider_visible=True)
+    def new_case_average_figure():
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=df.index, y=df['New Case'],
+                                 # marker_color='royalblue',
+                                 line=dict(color='royalblue'),
+                                 name='New Case'))
+        fig.add_trace(go.Scatter(x=df.index, y=df['SMA_new'],
+                                 line=dict(color='coral'),
+                                 name='Average'))
+        fig.update_layout(title='COVID-19 Malaysia: New Case VS 7-day Moving Average',
+                          xaxis_title=None, yaxis_title=None)
+        fig.update_layout(hovermode="x unified",
+                          height=600,
+                          xaxis=dict(
+                              # Format spike
+                              spikethickness=2,
+                              spikecolor="#000000",
+                          ),
+                          legend=dict(
+                              yanchor="top",
+                              y=0.99,
+                              xanchor="left",
+                              x=0.01
+                          ))
+        fig.add_annotation(x=str(max_row.index.values[0]), y=int(max_row['SMA_new'].values[0]),
+                           text=f"Highest average on {max_row.index.date[0]}"
+                           f": {int(max_row['SMA_new'].values[0])}",
+                           xref="x",
+                           yref="y",
+                           showarrow=True,
+                           font=dict(
+            family="Courier New, monospace",
+            size=16,
+            color="#ffffff"
+        ),
+            align="center",
+            xanchor='right',
+            arrowhead=1,
+            arrowsize=1,
+            arrowwidth=2,
+            arrowcolor="#636363",
+            ax=-20,
+            ay=15,
+            bordercolor="#c7c7c7",
+            borderwidth=2,
+            borderpad=4,
+            bgcolor="brown",
+            standoff=2,
+            opacity=0.8)
+        fig.add_annotation(x=last_row.name, y=int(last_row['SMA_new']),
+                           text=f"Latest: {int(last_row['SMA_new'])}; "
+                           f"{pct_vs_peak}% of the peak average",
+                           xref="x",
+                           yref="y",
+                           showarrow=True,
+                           font=dict(
+            family="Courier New, monospace",
+            size=16,
+            color="#ffffff"
+        ),
+            align="center",
+            xanchor='right',
+            arrowhead=1,
+            arrowsize=1,
+            arrowwidth=2,
+            arrowcolor="#636363",
+            ax=-25,
+            ay=-20,
+            bordercolor="#c7c7c7",
+            borderwidth=2,
+            borderpad=4,
+            bgcolor="brown",
+            standoff=2,
+            opacity=0.8)
+        fig.update_xaxes(rangeslider_visible=True)
+        return fig
+
+    fig = cached_figure("new_case_average", bundle.version,
+                        new_case_average_figure)
     st.plotly_chart(fig, use_container_width=True)
 
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df.index, y=df['Death'],
-                             line=dict(color='royalblue'),
-                             name='Death'))
-    fig.add_trace(go.Scatter(x=df.index, y=df['SMA_death'],
-                             line=dict(color='coral'),
-                             name='Average'))
-    fig.update_layout(
-        title='COVID-19 Malaysia: Daily Death VS 7-day Moving Average')
-    fig.update_layout(hovermode="x unified",
-                      xaxis=dict(
-                          # Format spike
-                          spikethickness=2,
-                          spikecolor="#000000",
-                      ),
-                      legend=dict(
-                          yanchor="top",
-                          y=1.0,
-                          xanchor="left",
-                          x=0.01
-                      ))
-    # fig.update_xaxes(rangeslider_visible=True)
+    def death_average_figure():
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=df.index, y=df['Death'],
+                                 line=dict(color='royalblue'),
+                                 name='Death'))
+        fig.add_trace(go.Scatter(x=df.index, y=df['SMA_death'],
+                                 line=dict(color='coral'),
+                                 name='Average'))
+        fig.update_layout(
+            title='COVID-19 Malaysia: Daily Death VS 7-day Moving Average')
+        fig.update_layout(hovermode="x unified",
+                          xaxis=dict(
+                              # Format spike
+                              spikethickness=2,
+                              spikecolor="#000000",
+                          ),
+                          legend=dict(
+                              yanchor="top",
+                              y=1.0,
+                              xanchor="left",
+                              x=0.01
+                          ))
+        # fig.update_xaxes(rangeslider_visible=True)
+        return fig
+
+    fig = cached_figure("death_average", bundle.version, death_average_figure)
     st.plotly_chart(fig, use_container_width=True)
 
 
@@ -333,7 +312,7 @@ if (display_one == "Show by Monthly Cases") or monthly_checkbox:
     df_m_style = style_df(df_m)
     st.dataframe(df_m_style, height=1200)
 
-    def plot_bar(y):
+    def monthly_bar_figure(y):
         fig = px.bar(df_m, x=df_m.index, y=y, text=y, color=y,
                      title=f'COVID-19 Malaysia: Monthly {y}',
                      color_continuous_scale='Purp')
@@ -342,41 +321,50 @@ if (display_one == "Show by Monthly Cases") or monthly_checkbox:
         fig.update_layout(xaxis_title=None, yaxis_title=None,
                           uniformtext_minsize=8, uniformtext_mode='hide',
                           coloraxis_showscale=False)
+        return fig
+
+    def plot_bar(y):
+        fig = cached_figure("monthly_bar", bundle.version,
+                            lambda: monthly_bar_figure(y), y)
         st.plotly_chart(fig, use_container_width=True)
 
     plot_bar('New Case')
     plot_bar('Recovered')
     plot_bar('Death')
 
-    long_df_m = pd.melt(df_m[['New Case', 'Recovered', 'Death']],
-                        var_name='Case', value_name='Number',
-                        ignore_index=False).reset_index()
-    long_df_m['log_number'] = np.log10(long_df_m['Number']).round(4)
-
-    fig = px.bar(long_df_m, x='Date',
-                 y='Number', color='Case',
-                 text='Number',
-                 # hover_name='Case',
-                 # hover_data={'Number': True, 'Case': False,
-                 #             'log_number': False, 'Date': False},
-                 color_discrete_sequence=['rebeccapurple',
-                                          'teal',
-                                          'coral']
-                 )
-    fig.update_traces(texttemplate='%{text:,}', hovertemplate='<b>%{y:,}</b>')
-    fig.update_layout(title_text='COVID-19 Malaysia: Monthly Cases',
-                      xaxis_title=None, yaxis_title='Log Scale',
-                      uniformtext_minsize=10, barmode='group',
-                      legend=dict(
-                          yanchor="top",
-                          y=0.99,
-                          xanchor="left",
-                          x=0.01
-                      )
-                      # hovermode="x unified"
-                      )
-    fig.update_yaxes(type='log')
-    fig.update_xaxes(dtick="M1", tickformat="%b\n%Y")
+    def monthly_cases_figure():
+        long_df_m = pd.melt(df_m[['New Case', 'Recovered', 'Death']],
+                            var_name='Case', value_name='Number',
+                            ignore_index=False).reset_index()
+        long_df_m['log_number'] = np.log10(long_df_m['Number']).round(4)
+
+        fig = px.bar(long_df_m, x='Date',
+                     y='Number', color='Case',
+                     text='Number',
+                     # hover_name='Case',
+                     # hover_data={'Number': True, 'Case': False,
+                     #             'log_number': False, 'Date': False},
+                     color_discrete_sequence=['rebeccapurple',
+                                              'teal',
+                                              'coral']
+                     )
+        fig.update_traces(texttemplate='%{text:,}', hovertemplate='<b>%{y:,}</b>')
+        fig.update_layout(title_text='COVID-19 Malaysia: Monthly Cases',
+                          xaxis_title=None, yaxis_title='Log Scale',
+                          uniformtext_minsize=10, barmode='group',
+                          legend=dict(
+                              yanchor="top",
+                              y=0.99,
+                              xanchor="left",
+                              x=0.01
+                          )
+                          # hovermode="x unified"
+                          )
+        fig.update_yaxes(type='log')
+        fig.update_xaxes(dtick="M1", tickformat="%b\n%Y")
+        return fig
+
+    fig = cached_figure("monthly_cases", bundle.version, monthly_cases_figure)
     st.plotly_chart(fig, use_container_width=True)
 
 # STATE DATA
@@ -389,55 +377,66 @@ if (display_one == "Show by State Cases") or state_checkbox:
 
     # st.dataframe(df_state_total)
 
-    fig = go.Figure()
-    for col in dfState.columns:
-        fig.add_trace(go.Scatter(x=dfState.index,
-                                 y=dfState[col],
-                                 name=col,
-                                 visible=True
-                                 )
-                      )
-        fig.update_layout(
-            title='COVID-19 Malaysia: Daily Cases by State', height=600)
-        fig.add_annotation(xref='paper',
-                           yref='paper',
-                           x=1, y=1.09,
-                           showarrow=False,
-                           font=dict(
-                               # family="Courier New, monospace",
-                               size=12,
-                               color="royalblue"
-                           ),
-                           text='Tip: Double click a legend to isolate only the state')
+    def state_daily_figure():
+        fig = go.Figure()
+        for col in dfState.columns:
+            fig.add_trace(go.Scatter(x=dfState.index,
+                                     y=dfState[col],
+                                     name=col,
+                                     visible=True
+                                     )
+                          )
+            fig.update_layout(
+                title='COVID-19 Malaysia: Daily Cases by State', height=600)
+            fig.add_annotation(xref='paper',
+                               yref='paper',
+                               x=1, y=1.09,
+                               showarrow=False,
+                               font=dict(
+                                   # family="Courier New, monospace",
+                                   size=12,
+                                   color="royalblue"
+                               ),
+                               text='Tip: Double click a legend to isolate only the state')
+        return fig
+
+    fig = cached_figure("state_daily", bundle.version, state_daily_figure)
     st.plotly_chart(fig, use_container_width=True)
 
-    fig = px.bar(df_state_total.sort_values('Confirmed'), x='Confirmed',
-                 y='State_spaced', text='Confirmed',
-                 color='Confirmed',
-                 color_continuous_scale='Purp',
-                 hover_name='State',
-                 hover_data={'State_spaced': False, 'Confirmed': False}
-                 )
-    fig.update_layout(uniformtext_minsize=8, uniformtext_mode='hide',
-                      title=f'COVID-19 Malaysia: Total Cases as of {last_date}',
-                      width=700, height=800,
-                      xaxis_title=None, yaxis_title=None,
-                      showlegend=False, coloraxis_showscale=False)
-    fig.update_traces(texttemplate='%{text:,}')
+    def state_total_figure():
+        fig = px.bar(df_state_total.sort_values('Confirmed'), x='Confirmed',
+                     y='State_spaced', text='Confirmed',
+                     color='Confirmed',
+                     color_continuous_scale='Purp',
+                     hover_name='State',
+                     hover_data={'State_spaced': False, 'Confirmed': False}
+                     )
+        fig.update_layout(uniformtext_minsize=8, uniformtext_mode='hide',
+                          title=f'COVID-19 Malaysia: Total Cases as of {last_date}',
+                          width=700, height=800,
+                          xaxis_title=None, yaxis_title=None,
+                          showlegend=False, coloraxis_showscale=False)
+        fig.update_traces(texttemplate='%{text:,}')
+        return fig
+
+    fig = cached_figure("state_total", bundle.version, state_total_figure)
     st.plotly_chart(fig, use_container_width=True)
 
-    fig = px.pie(df_state_total, values='Confirmed',
-                 names='State', height=600,
-                 hover_name='State',
-                 hover_data={'State': False}
-                 )
-    fig.update_traces(textposition='inside', textinfo='percent+label')
+    def state_pie_figure():
+        fig = px.pie(df_state_total, values='Confirmed',
+                     names='State', height=600,
+                     hover_name='State',
+                     hover_data={'State': False}
+                     )
+        fig.update_traces(textposition='inside', textinfo='percent+label')
 
-    fig.update_layout(
-        title=f'COVID-19 Malaysia: Proportion of Confirmed Cases as of {last_date}',
-        # title_x=0.1
-    )
+        fig.update_layout(
+            title=f'COVID-19 Malaysia: Proportion of Confirmed Cases as of {last_date}',
+            # title_x=0.1
+        )
+        return fig
 
+    fig = cached_figure("state_pie", bundle.version, state_pie_figure)
     st.plotly_chart(fig, use_container_width=True)
 
 
@@ -445,7 +444,7 @@ def plot_choropleth(df):
     fig = px.choropleth(
         df,
         locations="id",
-        geojson=msia_geojson,
+        geojson=coarse_geojson,
         color="Confirmed",
         hover_name="State",
         hover_data={"id": False, "Confirmed": True},
@@ -479,30 +478,35 @@ if (display_one == "Show Choropleth Map") or map_checkbox:
         # plot_choropleth(df_state_total)
 
         # st.markdown("## Mapbox version")
-        fig = px.choropleth_mapbox(
-            df_state_total,
-            locations="id",
-            geojson=msia_geojson,
-            color="Confirmed",
-            hover_name="State",
-            hover_data={"id": False, "Confirmed": True},
-            color_continuous_scale="YlOrRd",
-            # range_color=(0, max_log),
-            mapbox_style='open-street-map',
-            zoom=4.3,
-            center={'lat': 4.1, 'lon': 109.4},
-            opacity=0.6
-        )
-        fig.update_layout(
-            margin={'r': 0, 't': 0, 'l': 0, 'b': 0},
-            # coloraxis_colorbar={
-            #     'title': 'Confirmed',
-            #     'tickvals': values,
-            #     'ticktext': ticks
-            # }
-        )
-
-        fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0}, height=600)
+        def choropleth_mapbox_figure():
+            fig = px.choropleth_mapbox(
+                df_state_total,
+                locations="id",
+                geojson=msia_geojson,
+                color="Confirmed",
+                hover_name="State",
+                hover_data={"id": False, "Confirmed": True},
+                color_continuous_scale="YlOrRd",
+                # range_color=(0, max_log),
+                mapbox_style='open-street-map',
+                zoom=4.3,
+                center={'lat': 4.1, 'lon': 109.4},
+                opacity=0.6
+            )
+            fig.update_layout(
+                margin={'r': 0, 't': 0, 'l': 0, 'b': 0},
+                # coloraxis_colorbar={
+                #     'title': 'Confirmed',
+                #     'tickvals': values,
+                #     'ticktext': ticks
+                # }
+            )
+
+            fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0}, height=600)
+            return fig
+
+        fig = cached_figure("choropleth_mapbox", bundle.version,
+                            choropleth_mapbox_figure)
         st.plotly_chart(fig, use_container_width=True)
 
 if (display_one == "Show Animated Map!") or animated_checkbox:
@@ -512,78 +516,15 @@ if (display_one == "Show Animated Map!") or animated_checkbox:
     # Animated Map based on Monthly State Cases
     """)
 
-    df_longState = dfState.resample('M').sum().astype(int)
-    df_longStyle = df_longState.copy()
-    df_longStyle.rename(columns={'WP KUALA LUMPUR': 'KL',
-                                 'WP LABUAN': 'LABUAN',
-                                 'WP PUTRAJAYA': 'PUTRAJAYA',
-                                 'PULAU PINANG': 'PENANG'}, inplace=True)
-    df_longStyle = style_df(df_longStyle, axis=1)
+    # built once per version of the data and stored, see `animated_map.py`
+    animated = load_animated_map(bundle)
+    df_longStyle = style_df(animated.monthly, axis=1)
     st.dataframe(df_longStyle, height=1200)
 
     # st.markdown("""
     # The animated map is shown in another tab to display the entire map clearly.
     # """)
 
-    def preprocess_long(df):
-        df = pd.melt(df, ignore_index=False,
-                     var_name='State', value_name='Confirmed')
-        df['id'] = df.State.map(correct_state_id)
-        df.reset_index(inplace=True)
-        # remove rows with zero cases (not helping)
-        # df = df[df.Confirmed > 0]
-        # Sort it based on dates to possibly speed up the plotting
-        df = df.sort_values('Date', ignore_index=True)
-        # replace every month with first day
-        df.Date = df.Date.dt.strftime("%b, %y")
-        # convert the date to string for the plotly function to work
-        df.Date = df.Date.astype(str)
-        # change the column name to Month
-        df.rename(columns={'Date': 'Month'}, inplace=True)
-        return df
-
-    df_longState = preprocess_long(df_longState.iloc[1:-1])
-
-    def plot_animated_choropleth(df, renderer='browser'):
-        fig = px.choropleth(
-            df,
-            locations="id",
-            geojson=msia_geojson,
-            color="Confirmed",
-            hover_name="State",
-            hover_data={"id": False, "Confirmed": True},
-            # title="Confirmed Cases as of April 15, 2021",
-            color_continuous_scale="Purp",
-            animation_frame="Month"
-        )
-        fig.update_layout(
-            # title_x = 0.5,
-            geo=dict(
-                showframe=False,
-                # showcoastlines = True,
-                # projection_type = 'equirectangular',
-                fitbounds="locations",
-                visible=False
-            ),
-            # coloraxis_showscale=False
-            # for log transformed values
-            # coloraxis_colorbar={
-            #     'title': 'Confirmed',
-            #     'tickvals': values,
-            #     'ticktext': ticks
-            # }
-        )
-        # fig.update_geos()
-        fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0}, height=600)
-
-        if not renderer:
-            fig.show()
-        elif renderer == 'plotly':
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            # show in new tab to reduce the notebook size
-            fig.show(renderer=renderer)
-
-    with st.spinner("Preparing animated map ... This may take awhile ..."):
-        plot_animated_choropleth(df_longState, renderer='plotly')
+    with st.spinner("Preparing animated map ..."):
+        st.plotly_chart(animated.figure, use_container_width=True)
         # st.success("Animated map displayed.")
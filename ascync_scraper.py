@@ -2,13 +2,19 @@ import asyncio
 import os
 import sys
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 
-import pandas as pd
 from aiohttp import ClientSession
-from bs4 import BeautifulSoup
 
-from scrape_covid19_msia import Scraper
+from checkpoint import Checkpoint
+from concurrency import (AdaptiveLimiter, HostRateLimiter, create_connector,
+                         create_timeout, get_with_retries)
+from page_index import index_page
+from row_buffer import RowBuffer
+from scrape_covid19_msia import (PARSER_VERSION, Scraper, column_types,
+                                 extract_page, state_table_column_types)
 
 default_url = "https://kpkesihatan.com/{format1}/kenyataan-akhbar-kpk-{format2}-situasi-semasa-jangkitan-penyakit-coronavirus-2019-covid-19-di-malaysia/"
 
@@ -22,139 +28,376 @@ column_names = ["Date", "Recovered", "Cumulative Recovered", "Imported Case",
 
 
 class AsyncScraper(Scraper):
-    def __init__(self, start_date, end_date):
-        super().__init__(start_date, end_date)
+    def __init__(self, start_date, end_date, page_cache=None, limiter=None,
+                 max_retries=5, rate_per_host=None, url_resolver=None,
+                 max_pending=32, error_journal=None):
+        super().__init__(start_date, end_date, page_cache=page_cache,
+                         url_resolver=url_resolver,
+                         error_journal=error_journal)
         self.verbose = 0
         self.current_response_dict = None
+        # the most pages downloaded or parsed but not extracted yet
+        self.max_pending = max_pending
+
+        # adapts the number of concurrent downloads, instead of a fixed 10
+        self.limiter = limiter or AdaptiveLimiter()
+        self.max_retries = max_retries
+        self.rate_limiter = HostRateLimiter(rate_per_host)
+
+    def create_session(self):
+        return ClientSession(connector=create_connector(),
+                             timeout=create_timeout())
+
+    async def fetch_body(self, session, current_date, url):
+        if url is None:
+            # known to be missing, not worth a request answered by a 404
+            raise self.missing_article(current_date)
+        entry = None
+        if self.page_cache is not None:
+            entry = self.page_cache.get(url)
+            if entry is not None and self.page_cache.is_settled(entry):
+                return entry["body"]
+            if self.page_cache.offline:
+                raise Exception(f"[ERROR] {url} is not cached (offline mode)")
+
+        status, headers, body = await get_with_retries(
+            session, url, self.limiter,
+            headers=self.page_cache.conditional_headers(entry)
+            if self.page_cache is not None else None,
+            max_retries=self.max_retries,
+            rate_limiter=self.rate_limiter)
+
+        if status == 304 and entry is not None:
+            self.page_cache.touch(url, entry)
+            return entry["body"]
+        if status != 200:
+            # not an `assert`, which is removed by `python -O`
+            raise Exception(
+                f"Error {status} accessing page on {current_date}\n{url}")
+        if self.page_cache is not None:
+            self.page_cache.put(url, body, headers)
+        return body
+
+    async def fetch(self, session, current_date, url, with_states=False):
+        html_body = await self.fetch_body(session, current_date, url)
+        # parsed once in a thread (lxml releases the GIL), not in the
+        #   event loop which keeps downloading meanwhile
+        loop = asyncio.get_running_loop()
+        index = await loop.run_in_executor(None, index_page, html_body)
+        result = {"date": current_date,
+                  "index": index,
+                  "url": url}
+        if with_states:
+            # in the order of `state_names`
+            result["state_new"], result["state_cumu"] = \
+                self.extract_table(index.tree)
+        return result
+
+    async def fetch_and_extract(self, session, pool, current_date, url,
+                                with_states=False):
+        """download the page, then extract it in the process pool"""
+        html_body = await self.fetch_body(session, current_date, url)
+        # the download slot is released here to keep downloading while parsing
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, extract_page, current_date,
+                                          url, html_body, with_states)
+
+    async def fetch_date(self, session, pool, resolver_pool, current_date,
+                         with_states=False):
+        """
+        Resolve the URL of the date in `resolver_pool`, then download the
+        page and parse it (or extract it in the process pool `pool`). An
+        error of the resolver is the result of the date, like a download
+        error, to be raised in date order.
+        """
+        loop = asyncio.get_running_loop()
+        current_url = await loop.run_in_executor(resolver_pool, self.get_url,
+                                                 current_date)
+        if self.verbose:
+            print(f"{current_date = }")
+            print(f"{current_url = }")
+        if pool is None:
+            return await self.fetch(session, current_date, current_url,
+                                    with_states=with_states)
+        return await self.fetch_and_extract(session, pool, current_date,
+                                            current_url,
+                                            with_states=with_states)
 
     @staticmethod
-    async def fetch(session, current_date, url):
-        async with session.get(url) as response:
-            assert response.status == 200, f"Error accessing page on {current_date}\n{url}"
-            html_body = await response.read()
-            soup = BeautifulSoup(html_body, "lxml")
-            state_df = pd.read_html(html_body,
-                                    match='JUMLAH KESELURUHAN',
-                                    header=0)[-1]
-            return {"date": current_date,
-                    "soup": soup,
-                    "state_df": state_df,
-                    "url": url}
-
-    async def fetch_with_sem(self, sem, session, current_date, url):
-        async with sem:
-            return await self.fetch(session, current_date, url)
-
-    async def async_scrape(self):
-        print(f"[INFO] Total days: {self.total_days}")
-        tasks = []
-
-        sem = asyncio.Semaphore(10)
-        async with ClientSession() as session:
-            for i in range(self.total_days):
-                self.current_url = default_url.format(
-                    **self.create_date_dict(self.current_date))
-                if self.verbose:
-                    print(f"{self.current_date = }")
-                    print(f"{self.current_url = }")
-                tasks.append(
-                    asyncio.create_task(
-                        self.fetch_with_sem(
-                            sem, session,
-                            current_date=self.current_date,
-                            url=self.current_url
-                        )
-                    )
-                )
-                self.current_date += timedelta(days=1)
-
-            start_time = time.perf_counter()
-            pages_content = await asyncio.gather(*tasks)
-            # [{"body": "...", "current_date": datetime(2020, 1, 21)}]
-            total_time = time.perf_counter() - start_time
-            print(
-                f"\nTime elapsed for scraping responses {total_time:.4f} seconds\n")
-            return pages_content
-
-    async def get_response_dict(self):
-        # need to add this to avoid RuntimeError in Windows
-        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-        scrape_coroutine = self.async_scrape()
+    async def next_result(pending):
+        """the result of the first pending task, or its exception"""
         try:
-            # to check whether running in IPython mode
-            get_ipython
-        except:
-            results = asyncio.run(scrape_coroutine)
+            return await pending.popleft()
+        except Exception as e:
+            return e
+
+    async def iter_pages(self, pool=None, with_states=False):
+        """
+        Download the pages and yield their results in date order, as soon
+        as a page and all the pages before it are done. Without `pool`,
+        each page is parsed into a `PageIndex` in a thread, otherwise each
+        page is extracted by `extract_page` in the process pool. Any
+        exception is yielded in place of the result of its page.
+
+        At most `max_pending` pages are in flight or waiting for the pages
+        before them, so the memory used does not depend on the number of
+        days, and a result is not kept once the next one is asked for.
+        """
+        # from the date to resume from, if any
+        days = (self.end_date - self.current_date).days + 1
+        print(f"[INFO] Total days: {days}")
+        # not `self.current_date`, which is used by the caller meanwhile
+        current_date = self.current_date
+        # the tasks in date order, only the first one is awaited
+        pending = deque()
+        # one thread to resolve the URLs in date order, outside of the event
+        #   loop as the archive may be crawled
+        resolver_pool = ThreadPoolExecutor(max_workers=1)
+        start_time = time.perf_counter()
+
+        async with self.create_session() as session:
+            try:
+                for i in range(days):
+                    coroutine = self.fetch_date(
+                        session, pool, resolver_pool,
+                        current_date=current_date,
+                        with_states=with_states
+                    )
+                    pending.append(asyncio.create_task(coroutine))
+                    current_date += timedelta(days=1)
+                    if len(pending) >= self.max_pending:
+                        yield await self.next_result(pending)
+                while pending:
+                    yield await self.next_result(pending)
+            finally:
+                # when the caller stops early, e.g. on an error
+                for task in pending:
+                    task.cancel()
+                resolver_pool.shutdown(wait=False)
+
+        total_time = time.perf_counter() - start_time
+        print(
+            f"\nTime elapsed for scraping responses {total_time:.4f} seconds")
+        print(f"[INFO] Final concurrency limit: {self.limiter.limit:.1f} "
+              f"({self.limiter.failures} failed requests)\n")
+
+    async def async_scrape(self, pool=None, with_states=False):
+        """all the results of `iter_pages` at once"""
+        return [result async for result in self.iter_pages(
+            pool=pool, with_states=with_states)]
+
+    async def get_response_dict(self, pool=None, with_states=False):
+        return await self.async_scrape(pool=pool, with_states=with_states)
+
+    def get_index(self):
+        return self.current_response_dict['index']
+
+    def create_outputs(self, with_states=False, resume=True):
+        """
+        The buffers of the rows, streamed to `<start>_<end>.csv` (and the
+        state tables with `with_states`) by the checkpoint. Returns the
+        checkpoint, the buffers and the number of days already done.
+        """
+        date_range = f"{self.start_date.date()}_{self.end_date.date()}"
+        output_path = os.path.join(CSV_DIR, f"{date_range}.csv")
+        buffers = {output_path: RowBuffer(column_types)}
+        if with_states:
+            for prefix in ("state_new", "state_cumu"):
+                path = os.path.join(CSV_DIR, f"{prefix}_{date_range}.csv")
+                buffers[path] = RowBuffer(state_table_column_types)
+
+        checkpoint = Checkpoint(output_path, list(buffers)[1:])
+        if resume:
+            days_done = self.restore_checkpoint(checkpoint)
         else:
-            # running in IPython mode
-            results = await scrape_coroutine
-        return results
+            checkpoint.reset()
+            days_done = 0
+        return checkpoint, buffers, days_done
+
+    def fail(self, checkpoint, buffers, state, day_number, error=None):
+        """save the rows done so far to resume, then raise the error"""
+        self.current_date = self.start_date + timedelta(days=day_number)
+        # the URL is not resolved again, which may be what failed
+        self.current_url = None
+        if state is not None:
+            self.validate_rows(buffers, state)
+            self.save_checkpoint(checkpoint, buffers, state)
+        self.error_journal.flush()
+        print("[ERROR] Problem with", self.current_date.date(), error or "")
+        print(f"[INFO] {checkpoint.rows} rows saved in "
+              f"{checkpoint.part_path}, run again to resume.")
+        raise Exception(f"Error on {self.current_date.date()}") from error
 
-    def get_soup(self):
-        return self.current_response_dict['soup']
+    def finish_outputs(self, checkpoint, buffers, state):
+        if state is not None:
+            self.validate_rows(buffers, state)
+            self.save_checkpoint(checkpoint, buffers, state)
+        checkpoint.finish()
+        self.error_journal.flush()
+        for path in buffers:
+            print(f"[INFO] {os.path.basename(path)} created in {CSV_DIR}.")
+
+    async def scrape_all(self, verbose=0, use_processes=False, max_workers=None,
+                         with_states=False, resume=True, checkpoint_every=10):
+        """
+        With `use_processes=True`, the event loop only downloads the pages
+        and the parsing is done by a process pool with `max_workers`
+        processes (default to the number of CPU cores). The state tables
+        are extracted from the same downloaded pages with `with_states`.
+
+        The rows are streamed to the CSV files every `checkpoint_every`
+        dates, and a failed run is resumed from there with `resume=True`.
+        """
+        if use_processes:
+            await self.scrape_all_processes(verbose=verbose,
+                                            max_workers=max_workers,
+                                            with_states=with_states,
+                                            resume=resume,
+                                            checkpoint_every=checkpoint_every)
+            return
 
-    async def scrape_all(self, verbose=0):
         self.verbose = verbose
-        df = pd.DataFrame(columns=column_names)
+        checkpoint, buffers, days_done = self.create_outputs(
+            with_states=with_states, resume=resume)
+        state = None
 
         start_time = time.perf_counter()
-        # get the page contents using asyncio
-        results = await self.get_response_dict()
-
-        print("\n[INFO] Extracting data from the responses ...")
-        for result in results:
-            self.current_response_dict = result
-            self.current_date = result['date']
-            self.current_url = result['url']
-            print(f"\nCurrent date: {self.current_date.date()}\n")
-            try:
-                if self.current_date >= self.new_format_date \
-                        and not self.new_format_flag:
-                    print("[ATTENTION] USING NEW text format "
-                          f"starting from {self.current_date.date()}.")
-                    self.new_format_flag = True
-
-                if self.new_format_flag:
-                    # using new text scraping format method
-                    data_dict = self.scrape_data_new(verbose=verbose)
-                else:
-                    # still in old text format, scrape using old method
-                    data_dict = self.scrape_data(verbose=verbose)
-
-                data_dict["Date"] = self.current_date
-                data_dict["URL"] = self.current_url
-                df = df.append(data_dict, ignore_index=True)
-
-                self.current_date += timedelta(days=1)
-                self.current_date_dict = self.create_date_dict(
-                    self.current_date)
-            except:
-                # save a csv file to check
-                filename = f"{self.start_date.date()}_{self.current_date.date()}.csv"
-                df.to_csv(os.path.join(
-                    CSV_DIR, filename), index=False)
-                print("[ERROR] Problem with", self.current_url)
-                raise Exception(f"Error on {self.current_date.date()}")
-
-        filename = f"{self.start_date.date()}_{self.end_date.date()}.csv"
-        df.to_csv(os.path.join(CSV_DIR, filename), index=False)
-        print(f"\n[INFO] {filename} created in {CSV_DIR}.")
+        # the page contents downloaded using asyncio, extracted one by one
+        #  while the next ones are downloaded
+        results = self.iter_pages(with_states=with_states)
+        day_number = days_done - 1
+        try:
+            async for result in results:
+                day_number += 1
+                state = self.extract_response(result, checkpoint, buffers,
+                                              state, day_number,
+                                              checkpoint_every, verbose)
+        finally:
+            await results.aclose()
+
+        self.finish_outputs(checkpoint, buffers, state)
         print("\n[INFO] CONGRATS! You have scraped until the end date!")
         total_time = time.perf_counter() - start_time
         # 285 seconds
         print(f"Total time elapsed: {total_time:.2f} seconds")
 
+    def extract_response(self, result, checkpoint, buffers, state, day_number,
+                         checkpoint_every=10, verbose=0):
+        """
+        Extract the national data of one result of `iter_pages`, and add
+        the rows of its state tables if the buffers have them.
+        """
+        buffer, *state_buffers = buffers.values()
+        if isinstance(result, BaseException):
+            self.fail(checkpoint, buffers, state, day_number, result)
+
+        self.current_response_dict = result
+        self.current_date = result['date']
+        self.current_url = result['url']
+        print(f"\nCurrent date: {self.current_date.date()}\n")
+        try:
+            if self.current_date >= self.new_format_date \
+                    and not self.new_format_flag:
+                print("[ATTENTION] USING NEW text format "
+                      f"starting from {self.current_date.date()}.")
+                self.new_format_flag = True
+
+            if self.new_format_flag:
+                # using new text scraping format method
+                data_dict = self.scrape_data_new(verbose=verbose)
+            else:
+                # still in old text format, scrape using old method
+                data_dict = self.scrape_data(verbose=verbose)
+
+            data_dict["Date"] = self.current_date
+            data_dict["URL"] = self.current_url
+            buffer.append(data_dict)
+            if state_buffers:
+                for state_buffer, row in zip(state_buffers, self.state_rows(
+                        result['state_new'], result['state_cumu'])):
+                    state_buffer.append(row)
+            state = self.snapshot_state()
+            if len(buffer) >= checkpoint_every:
+                self.validate_rows(buffers, state)
+                self.save_checkpoint(checkpoint, buffers, state)
+
+            self.current_date += timedelta(days=1)
+            self.current_date_dict = self.create_date_dict(
+                self.current_date)
+        except Exception as e:
+            self.fail(checkpoint, buffers, state, day_number, e)
+        finally:
+            # the parsed page is not needed anymore
+            self.current_response_dict = None
+        return state
+
+    def add_extracted(self, result, buffers):
+        """add the rows of one result of `extract_page`, in date order"""
+        buffer, *state_buffers = buffers.values()
+        self.current_date = result['date']
+        self.current_url = result['url']
+        data_dict = result['data']
+        # the errors of the date found in the worker process
+        self.error_journal.clear_date(self.current_date, PARSER_VERSION)
+        self.error_journal.merge(result['errors'])
+        if result['carried_cumu_death']:
+            data_dict['Cumulative Death'] = self.prev_cumu_death or 0
+        elif not result['new_format']:
+            self.prev_cumu_death = data_dict['Cumulative Death']
+        self.new_format_flag = result['new_format']
+
+        buffer.append(data_dict)
+        if state_buffers:
+            state_buffers[0].append(result['state_new'])
+            state_buffers[1].append(result['state_cumu'])
+
+    async def scrape_all_processes(self, verbose=0, max_workers=None,
+                                   with_states=False, resume=True,
+                                   checkpoint_every=10):
+        self.verbose = verbose
+        checkpoint, buffers, days_done = self.create_outputs(
+            with_states=with_states, resume=resume)
+        buffer = buffers[checkpoint.output_path]
+        state = None
+
+        start_time = time.perf_counter()
+        max_workers = max_workers or os.cpu_count()
+        print(f"[INFO] Extracting with {max_workers} processes ...")
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            # in date order, which is needed to fill in the cumulative death
+            #  carried over from the previous date
+            results = self.iter_pages(pool=pool, with_states=with_states)
+            day_number = days_done - 1
+            try:
+                async for result in results:
+                    day_number += 1
+                    if isinstance(result, BaseException):
+                        self.fail(checkpoint, buffers, state, day_number,
+                                  result)
+
+                    self.add_extracted(result, buffers)
+                    state = self.snapshot_state()
+                    if len(buffer) >= checkpoint_every:
+                        self.validate_rows(buffers, state)
+                        self.save_checkpoint(checkpoint, buffers, state)
+            finally:
+                await results.aclose()
+
+        self.finish_outputs(checkpoint, buffers, state)
+        print("\n[INFO] CONGRATS! You have scraped until the end date!")
+        total_time = time.perf_counter() - start_time
+        print(f"Total time elapsed: {total_time:.2f} seconds")
 
 if __name__ == '__main__':
+    if sys.platform == 'win32':
+        # need to add this to avoid RuntimeError in Windows
+        asyncio.set_event_loop_policy(
+            asyncio.WindowsSelectorEventLoopPolicy())
+
     start_date = datetime(2021, 1, 21)
     end_date = datetime(2021, 4, 20)
     scraper = AsyncScraper(start_date, end_date)
     verbose = 0
 
-    try:
-        # check whether running in IPython mode
-        get_ipython
-    except:
-        scraper.scrape_all(verbose=verbose)
-    else:
-        await scraper.scrape_all(verbose=verbose)
+    # in IPython, use `await scraper.scrape_all(verbose=verbose)` instead
+    asyncio.run(scraper.scrape_all(verbose=verbose, use_processes=True))
@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+import ascync_scraper
+import scrape_covid19_msia
+from ascync_scraper import AsyncScraper
+from error_journal import ErrorJournal
+from replay_server import (CORPUS_DIR, ReplayResolver, ReplayServer,
+                           record_corpus)
+from scrape_covid19_msia import Scraper
+
+# both the old and the new text formats (from 2021-01-20)
+BENCH_START = datetime(2021, 1, 6)
+BENCH_END = datetime(2021, 2, 3)
+
+
+class TimedScraper(Scraper):
+    """records the latency of the download of each page"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def download(self, url):
+        start_time = time.perf_counter()
+        try:
+            return super().download(url)
+        finally:
+            self.latencies.append(time.perf_counter() - start_time)
+
+
+class TimedAsyncScraper(AsyncScraper):
+    """records the latency of the download of each page"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    async def fetch_body(self, session, current_date, url):
+        start_time = time.perf_counter()
+        try:
+            return await super().fetch_body(session, current_date, url)
+        finally:
+            self.latencies.append(time.perf_counter() - start_time)
+
+
+def cpu_time():
+    """user + system time of this process and its finished child processes"""
+    times = os.times()
+    return times.user + times.system + times.children_user \
+        + times.children_system
+
+
+def measure(name, scraper, run):
+    """run `run(scraper)` and returns the measurements"""
+    start_cpu = cpu_time()
+    start_time = time.perf_counter()
+    run(scraper)
+    wall_time = time.perf_counter() - start_time
+    cpu = cpu_time() - start_cpu
+
+    latencies = np.array(scraper.latencies) * 1000
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) \
+        if len(latencies) else (np.nan,) * 3
+    return {"name": name,
+            "pages": scraper.total_days,
+            "wall_seconds": round(wall_time, 3),
+            "pages_per_second": round(scraper.total_days / wall_time, 2),
+            "latency_p50_ms": round(float(p50), 1),
+            "latency_p90_ms": round(float(p90), 1),
+            "latency_p99_ms": round(float(p99), 1),
+            "cpu_seconds": round(cpu, 3)}
+
+
+def get_benchmarks(prefetch):
+    """name -> (scraper class, keyword arguments, function to run)"""
+    return {
+        "Scraper.scrape_all": (
+            TimedScraper, {},
+            lambda s: s.scrape_all(resume=False)),
+        f"Scraper.scrape_all(prefetch={prefetch})": (
+            TimedScraper, {"prefetch": prefetch},
+            lambda s: s.scrape_all(resume=False)),
+        "Scraper.scrape_table_2": (
+            TimedScraper, {},
+            lambda s: s.scrape_table_2()),
+        "AsyncScraper.scrape_all": (
+            TimedAsyncScraper, {},
+            lambda s: asyncio.run(s.scrape_all())),
+        "AsyncScraper.scrape_all(use_processes=True)": (
+            TimedAsyncScraper, {},
+            lambda s: asyncio.run(s.scrape_all(use_processes=True))),
+    }
+
+
+def run_benchmarks(start_date=BENCH_START, end_date=BENCH_END,
+                   corpus_dir=CORPUS_DIR, latency=0.0, jitter=0.0,
+                   error_rate=0.0, prefetch=8, only=None, seed=0):
+    """
+    Run every scraper against the replay server of the corpus, writing
+    their CSV files and metrics in a temporary directory and keeping their extraction
+    errors in memory.
+    """
+    results = []
+    server = ReplayServer(corpus_dir, latency=latency, jitter=jitter,
+                          error_rate=error_rate, seed=seed)
+    output_dirs = (scrape_covid19_msia.CSV_DIR,
+                   scrape_covid19_msia.METRICS_DIR, ascync_scraper.CSV_DIR)
+    try:
+        with server, tempfile.TemporaryDirectory() as csv_dir:
+            # to not overwrite the real data
+            scrape_covid19_msia.CSV_DIR = csv_dir
+            scrape_covid19_msia.METRICS_DIR = os.path.join(csv_dir,
+                                                           "metrics")
+            ascync_scraper.CSV_DIR = csv_dir
+            resolver = ReplayResolver(server)
+
+            for name, (scraper_class, kwargs, run) in get_benchmarks(
+                    prefetch).items():
+                if only and not any(text in name for text in only):
+                    continue
+                print(f"\n[INFO] Benchmarking {name} ...")
+                # to not overwrite the real journal of extraction errors
+                scraper = scraper_class(start_date, end_date,
+                                        url_resolver=resolver,
+                                        error_journal=ErrorJournal(path=None),
+                                        **kwargs)
+                try:
+                    results.append(measure(name, scraper, run))
+                except Exception as e:
+                    print(f"[ERROR] {name} failed: {e!r}")
+    finally:
+        (scrape_covid19_msia.CSV_DIR, scrape_covid19_msia.METRICS_DIR,
+         ascync_scraper.CSV_DIR) = output_dirs
+    return results
+
+
+def print_results(results):
+    header = (f"{'benchmark':<45} {'pages/s':>8} {'p50 ms':>8} "
+              f"{'p90 ms':>8} {'p99 ms':>8} {'cpu s':>8} {'wall s':>8}")
+    print(f"\n{header}\n{'-' * len(header)}")
+    for r in results:
+        print(f"{r['name']:<45} {r['pages_per_second']:>8.2f} "
+              f"{r['latency_p50_ms']:>8.1f} {r['latency_p90_ms']:>8.1f} "
+              f"{r['latency_p99_ms']:>8.1f} {r['cpu_seconds']:>8.2f} "
+              f"{r['wall_seconds']:>8.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scrapers against the recorded articles.")
+    parser.add_argument("--record", action="store_true",
+                        help="download the articles into the corpus first")
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    parser.add_argument("--start", default=str(BENCH_START.date()),
+                        help="YYYY-MM-DD")
+    parser.add_argument("--end", default=str(BENCH_END.date()),
+                        help="YYYY-MM-DD")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="up to these extra seconds of random delay")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of the requests answered with 503")
+    parser.add_argument("--prefetch", type=int, default=8)
+    parser.add_argument("--only", nargs="*",
+                        help="only the benchmarks containing these texts")
+    parser.add_argument("--output", help="JSON file to save the results")
+    args = parser.parse_args()
+
+    start_date = datetime.strptime(args.start, "%Y-%m-%d")
+    end_date = datetime.strptime(args.end, "%Y-%m-%d")
+    if args.record:
+        record_corpus(start_date, end_date, args.corpus)
+
+    results = run_benchmarks(start_date, end_date, args.corpus,
+                             latency=args.latency, jitter=args.jitter,
+                             error_rate=args.error_rate,
+                             prefetch=args.prefetch, only=args.only)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n[INFO] Results saved in {args.output}")
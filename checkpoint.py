@@ -0,0 +1,124 @@
+import json
+import os
+import time
+
+
+class Checkpoint:
+    """
+    Manifest to resume an interrupted scraping run.
+
+    The rows are appended to `<output_path>.part` (and the same for each of
+    `other_paths`) as the dates complete, and
+    `<output_path>.checkpoint.json` records the last good date, the state
+    carried over to the next date (e.g. `prev_cumu_death`) and the byte
+    offset of every partial output. On completion the partial outputs are
+    renamed to their final paths, the checkpoint is removed and
+    `<output_path>.manifest.json` is written with the rows and bytes of
+    every output.
+
+    The partial outputs are only appended to, and synced to the disk with
+    every checkpoint (with `fsync=True`), so another process can tail them
+    while scraping and a crash loses at most the rows since the last
+    checkpoint.
+    """
+
+    def __init__(self, output_path, other_paths=(), fsync=True):
+        self.output_path = output_path
+        self.output_paths = [output_path, *other_paths]
+        self.part_path = self.get_part_path(output_path)
+        self.manifest_path = f"{output_path}.checkpoint.json"
+        self.final_manifest_path = f"{output_path}.manifest.json"
+        self.fsync = fsync
+        self.offsets = {path: 0 for path in self.output_paths}
+        # number of rows in the main output
+        self.rows = 0
+
+    @staticmethod
+    def get_part_path(path):
+        return f"{path}.part"
+
+    def sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def sync_dir(self):
+        """to make the renames in the output directory durable"""
+        if not self.fsync or os.name != 'posix':
+            return
+        fd = os.open(os.path.dirname(os.path.abspath(self.output_path)),
+                     os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def load(self):
+        """returns the saved state, or None if there is nothing to resume"""
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, "r") as f:
+            state = json.load(f)
+        if set(state["offsets"]) != set(self.output_paths) \
+                or not all(os.path.exists(self.get_part_path(path))
+                           for path in self.output_paths):
+            return None
+        self.offsets = state["offsets"]
+        self.rows = state["rows"]
+        # drop any row written after the last saved checkpoint
+        for path, offset in self.offsets.items():
+            with open(self.get_part_path(path), "r+b") as f:
+                f.truncate(offset)
+        return state
+
+    def reset(self):
+        """to start a fresh run, discarding any previous partial output"""
+        self.offsets = {path: 0 for path in self.output_paths}
+        self.rows = 0
+        paths = [self.get_part_path(path) for path in self.output_paths]
+        for path in paths + [self.manifest_path, self.final_manifest_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def append(self, df, path=None):
+        """append the rows of the DataFrame to the partial output of `path`"""
+        path = path or self.output_path
+        with open(self.get_part_path(path), "a", newline="") as f:
+            df.to_csv(f, header=(self.offsets[path] == 0), index=False)
+            self.sync(f)
+            self.offsets[path] = f.tell()
+        if path == self.output_path:
+            self.rows += len(df)
+
+    def save(self, **state):
+        state.update(output_paths=self.output_paths,
+                     offsets=self.offsets,
+                     rows=self.rows)
+        self.write_json(self.manifest_path, state)
+
+    def write_json(self, path, content):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(content, f, indent=2)
+            self.sync(f)
+        # atomic to never leave a broken manifest behind
+        os.replace(tmp_path, path)
+
+    def finish(self):
+        outputs = {}
+        for path in self.output_paths:
+            part_path = self.get_part_path(path)
+            if not os.path.exists(part_path):
+                # nothing was scraped, e.g. the range was empty
+                open(part_path, "w").close()
+            with open(part_path, "ab") as f:
+                self.sync(f)
+                outputs[path] = {"bytes": f.tell()}
+            os.replace(part_path, path)
+        outputs[self.output_path]["rows"] = self.rows
+        self.write_json(self.final_manifest_path,
+                        {"outputs": outputs,
+                         "completed_at": time.strftime('%Y-%m-%dT%H:%M:%S')})
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+        self.sync_dir()
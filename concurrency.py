@@ -0,0 +1,160 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from aiohttp import ClientError, ClientTimeout, TCPConnector
+
+# the responses worth retrying, anything else is returned to the caller
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD (additive increase, multiplicative decrease) limit on the number
+    of concurrent requests, used as `async with limiter: ...`.
+
+    The limit grows by about one for every `limit` successful responses
+    while the latency stays within `latency_tolerance` times the lowest
+    latency seen, and is multiplied by `backoff_factor` on a 429, 5xx or
+    timeout (at most once per burst of failures).
+    """
+
+    def __init__(self, initial_limit=10, min_limit=1, max_limit=64,
+                 latency_tolerance=2.0, backoff_factor=0.5):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff_factor = backoff_factor
+
+        self.in_flight = 0
+        self.min_latency = None
+        self.last_decrease = 0.0
+        self.successes = 0
+        self.failures = 0
+        # created in the running event loop
+        self.condition = None
+
+    async def __aenter__(self):
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def record_success(self, latency):
+        self.successes += 1
+        if self.min_latency is None or latency < self.min_latency:
+            self.min_latency = latency
+        if latency <= self.latency_tolerance * self.min_latency:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def record_failure(self):
+        self.failures += 1
+        now = time.monotonic()
+        # the failures of the requests already in flight belong to the
+        #   same burst, no need to decrease again for them
+        if now - self.last_decrease > (self.min_latency or 1.0):
+            self.limit = max(self.min_limit, self.limit * self.backoff_factor)
+            self.last_decrease = now
+
+
+class HostRateLimiter:
+    """allow at most `rate` requests per second to each host"""
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.next_time = {}
+
+    async def wait(self, url):
+        if not self.rate:
+            return
+        host = urlsplit(url).netloc
+        now = time.monotonic()
+        scheduled = max(now, self.next_time.get(host, now))
+        self.next_time[host] = scheduled + 1 / self.rate
+        if scheduled > now:
+            await asyncio.sleep(scheduled - now)
+
+
+def parse_retry_after(value):
+    """the number of seconds to wait from a `Retry-After` header"""
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        retry_time = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_time - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, retry_after=None, base=0.5, cap=30.0):
+    """exponential backoff with full jitter, unless the server says when"""
+    delay = parse_retry_after(retry_after)
+    if delay is not None:
+        return min(delay, cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def create_connector(limit=100, limit_per_host=32, keepalive_timeout=30,
+                     ttl_dns_cache=300):
+    """connection pool for `ClientSession(connector=...)`"""
+    return TCPConnector(limit=limit, limit_per_host=limit_per_host,
+                        keepalive_timeout=keepalive_timeout,
+                        ttl_dns_cache=ttl_dns_cache, use_dns_cache=True)
+
+
+def create_timeout(total=60, connect=15):
+    return ClientTimeout(total=total, connect=connect)
+
+
+async def get_with_retries(session, url, limiter, headers=None,
+                           max_retries=5, rate_limiter=None):
+    """
+    GET the URL within the `limiter`, retrying on 429, 5xx, timeouts and
+    connection errors. Returns `(status, headers, body)` of the final
+    response, the body is only read for a 200 response.
+    """
+    for attempt in range(max_retries + 1):
+        if rate_limiter is not None:
+            await rate_limiter.wait(url)
+
+        retry_after = None
+        async with limiter:
+            start_time = time.perf_counter()
+            try:
+                async with session.get(url, headers=headers) as response:
+                    status = response.status
+                    body = await response.read() if status == 200 else None
+                    response_headers = response.headers
+                    retry_after = response_headers.get("Retry-After")
+            except (asyncio.TimeoutError, ClientError) as e:
+                status = None
+                error = e
+            latency = time.perf_counter() - start_time
+
+            if status is not None and status not in RETRY_STATUSES:
+                limiter.record_success(latency)
+                return status, response_headers, body
+            limiter.record_failure()
+
+        if attempt == max_retries:
+            break
+        delay = backoff_delay(attempt, retry_after)
+        print(f"[WARNING] {status or error.__class__.__name__} for {url}, "
+              f"retrying in {delay:.1f} seconds ...")
+        await asyncio.sleep(delay)
+
+    raise Exception(f"[ERROR] Failed after {max_retries} retries: {url}")
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from page_cache import PageCache
+from scrape_covid19_msia import Scraper, default_url, special_dt, special_urls
+from state_table import state_names
+
+# the first date of the new text format, as `Scraper.new_format_date`
+NEW_FORMAT_DATE = datetime(2021, 1, 20)
+
+# `test_async_scrape.py` is a notebook-style script with a top-level await,
+#   not a test module
+collect_ignore = ["test_async_scrape.py"]
+
+
+def state_table(day):
+    """the state table of a synthetic page, with the cells of the articles"""
+    rows = "".join(f"<tr><td>{name}</td><td>{i + day}</td>"
+                   f"<td>{1000 * (i + 1) + day} ({i})</td></tr>"
+                   for i, name in enumerate(state_names[:-1]))
+    total_new = sum(i + day for i in range(len(state_names) - 1))
+    total_cumu = sum(1000 * (i + 1) + day for i in range(len(state_names) - 1))
+    return ("<table><tr><td>NEGERI</td><td>BILANGAN KES BAHARU</td>"
+            f"<td>BILANGAN KES KUMULATIF</td></tr>{rows}"
+            f"<tr><td>{state_names[-1]}</td><td>{total_new}</td>"
+            f"<td>{total_cumu // 1000},{total_cumu % 1000:03d}</td></tr>"
+            "</table>")
+
+
+def new_format_page(day, no_death=False):
+    death = ("<li>Kes kematian: tiada kes kematian baharu dilaporkan. "
+             "Jumlah kumulatif kes kematian 500 kes</li>") if no_death else \
+        (f"<li>Kes kematian: {day} kes (jumlah kumulatif kes kematian "
+         f"5{day:02d} kes)</li>")
+    return f"""<html><body><nav><ul><li>menu sembuh</li></ul></nav>
+<div class="entry-content"><p>Situasi semasa COVID-19</p><ul>
+<li>Kes sembuh: 2,{day:03d} kes (jumlah kumulatif kes sembuh 130,{day:03d} kes)</li>
+<li>Kes baharu: 3,{day:03d} kes (jumlah kumulatif kes 172,{day:03d} kes)</li>
+<li>Kes import: {day} kes</li><li>Kes tempatan: 3,000 kes</li>
+<li>Kes aktif: 41,{day:03d} kes</li>
+<li>Dirawat di Unit Rawatan Rapi: 2{day:02d} kes</li>
+<li>Bantuan pernafasan: 1{day:02d} kes</li>{death}</ul>{state_table(day)}</div>
+<div class="comments">sembuh 999</div></body></html>"""
+
+
+def old_format_page(day, no_death=False):
+    death = ("Tiada kes kematian baharu dilaporkan pada hari ini."
+             if no_death else
+             f"Sebanyak {day} kes kematian dilaporkan. Jumlah kumulatif kes "
+             f"kematian adalah {100 + day} kes.")
+    # one sentence per line, the old text format is matched by sentence
+    return f"""<html><body><div class="entry-content">
+<p>Kementerian Kesihatan Malaysia (KKM) ingin memaklumkan bahawa {day} kes telah pulih dan dibenarkan discaj pada hari ini. Jumlah kumulatif kes yang telah pulih adalah 9,{day:03d} kes.</p>
+<p>Sehingga 12 tengah hari, terdapat {50 + day} kes baharu yang telah dilaporkan. Jumlah kes positif adalah 5,{day:03d} kes.</p>
+<p>Daripada jumlah kes aktif, {day + 3} kes sedang dirawat di Unit Rawatan Rapi, dan {day + 1} kes memerlukan bantuan pernafasan.</p>
+<p>{death}</p>{state_table(day)}</div></body></html>"""
+
+
+@pytest.fixture
+def page_corpus(tmp_path):
+    """
+    A function building an offline page cache of synthetic articles from
+    `start` to `end`, without any new death on the days of `no_death_days`.
+    """
+    def build(start, end, no_death_days=()):
+        cache = PageCache(str(tmp_path / "corpus"))
+        dt = start
+        while dt <= end:
+            url = special_urls[special_dt.index(dt)] if dt in special_dt \
+                else default_url.format(**Scraper.create_date_dict(dt))
+            page = new_format_page if dt >= NEW_FORMAT_DATE \
+                else old_format_page
+            cache.put(url, page(dt.day, dt.day in no_death_days).encode())
+            dt += timedelta(days=1)
+        return PageCache(str(tmp_path / "corpus"), offline=True)
+    return build
@@ -0,0 +1,189 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from data_store import PROCESSED_DIR, TABLE_NAMES, csv_path, load_tables
+from geo_simplify import LEVELS, level_path, write_levels
+
+ORIG_DIR = "original_data"
+# https://www.igismap.com/download-malaysia-shapefile-area-map-free-country-boundary-state-polygon/
+GEOJSON_PATH = os.path.join(ORIG_DIR,
+                            "malaysia_state_province_boundary.geojson")
+# the simplified maps of `geo_simplify`, instead of the 4 MB original
+MAPS_DIR = os.path.join(PROCESSED_DIR, "maps")
+
+# everything the app needs, loaded once per version of the files:
+#   - national, monthly, state_new, state_cumu: the tables of `data_store`
+#   - maps: the map of each level of `geo_simplify.LEVELS`, with the "id"
+#       of each feature set
+#   - state_ids: the state name of the tables -> the id of its feature
+#   - state_total: the last cumulative cases of each state, with their id
+# all read-only, the bundle is shared by every session
+DataBundle = namedtuple("DataBundle", ["version", "national", "monthly",
+                                       "state_new", "state_cumu", "maps",
+                                       "state_ids", "state_total"])
+
+# the bundles of this process, shared by every session and rerun of the app
+#   (the imported modules are kept by Streamlit, unlike the app script)
+bundles = {}
+bundles_lock = threading.Lock()
+
+
+class ReadOnlyDict(dict):
+    """
+    A dict raising on any change, still a dict for pandas and copied as a
+    plain dict (e.g. by plotly for the maps of its figures).
+    """
+
+    def read_only(self, *args, **kwargs):
+        raise TypeError("The data bundle is shared, copy it to modify it")
+
+    __setitem__ = __delitem__ = __ior__ = read_only
+    clear = pop = popitem = setdefault = update = read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+
+def read_only(value):
+    """the dicts and lists of `value` made read-only, recursively"""
+    if isinstance(value, dict):
+        return ReadOnlyDict((k, read_only(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(read_only(v) for v in value)
+    return value
+
+
+def read_only_frame(df):
+    """the DataFrame with its numpy arrays made read-only, in place"""
+    # pandas has no public way to reach the arrays of its blocks
+    for block in df._mgr.blocks:
+        if isinstance(block.values, np.ndarray):
+            block.values.flags.writeable = False
+    return df
+
+
+def source_paths(processed_dir=PROCESSED_DIR, maps_dir=MAPS_DIR):
+    return [csv_path(name, processed_dir) for name in TABLE_NAMES] \
+        + [level_path(level, maps_dir) for level in LEVELS]
+
+
+def data_version(paths):
+    """
+    A hash of the modification times and sizes of the files, without
+    reading them.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+    return digest.hexdigest()[:12]
+
+
+def read_geojson(geojson_path):
+    with open(geojson_path, 'r') as f:
+        msia_geojson = json.load(f)
+    # the ids used as `locations` of the choropleth maps
+    for i, feature in enumerate(msia_geojson['features']):
+        feature['id'] = i
+    return msia_geojson
+
+
+def get_state_ids(msia_geojson, state_names):
+    """the id of the feature of each state, found by the name in the map"""
+    feature_ids = {feature['properties']['locname']: feature['id']
+                   for feature in msia_geojson['features']}
+    correct_state_id = {}
+    for stateName in state_names:
+        name_to_search = stateName.replace('WP ', '')
+        for k, v in feature_ids.items():
+            if name_to_search.lower() in k.lower():
+                correct_state_id[stateName] = int(v)
+    return correct_state_id
+
+
+def get_state_total(dfStateCumu, correct_state_id):
+    df_state_total = dfStateCumu.iloc[[-1]].T.reset_index()
+    df_state_total.columns = ['State', 'Confirmed']
+    df_state_total['State_spaced'] = df_state_total['State'] + '  '
+    df_state_total['id'] = df_state_total.State.map(correct_state_id)
+    return df_state_total
+
+
+@lru_cache(maxsize=None)
+def read_image(path):
+    """the image decoded once per process"""
+    image = Image.open(path)
+    image.load()
+    return image
+
+
+def check_maps(maps_dir=MAPS_DIR, geojson_path=GEOJSON_PATH):
+    """simplify the original map when any level is missing"""
+    if not all(os.path.exists(level_path(level, maps_dir))
+               for level in LEVELS):
+        print("[INFO] Simplifying the map ...")
+        write_levels(geojson_path, maps_dir)
+
+
+def build_bundle(version, processed_dir=PROCESSED_DIR, maps_dir=MAPS_DIR):
+    df, df_m, dfState, dfStateCumu = load_tables(processed_dir)
+    maps = {level: read_geojson(level_path(level, maps_dir))
+            for level in LEVELS}
+    # the features of every level are in the same order, with the same ids
+    correct_state_id = get_state_ids(maps["fine"], dfStateCumu.columns)
+    df_state_total = get_state_total(dfStateCumu, correct_state_id)
+    df, df_m, dfState, dfStateCumu, df_state_total = map(
+        read_only_frame, (df, df_m, dfState, dfStateCumu, df_state_total))
+    return DataBundle(version, df, df_m, dfState, dfStateCumu,
+                      read_only(maps), read_only(correct_state_id),
+                      df_state_total)
+
+
+def load_bundle(processed_dir=PROCESSED_DIR, maps_dir=MAPS_DIR):
+    """
+    The data bundle, loaded once per process and loaded again only when
+    any of the files has changed. A rerun of the app only checks the
+    modification times of the files.
+
+    The bundle is shared and read-only, the DataFrames and the maps must
+    be copied to be modified.
+    """
+    check_maps(maps_dir)
+    key = (processed_dir, maps_dir)
+    version = data_version(source_paths(processed_dir, maps_dir))
+    bundle = bundles.get(key)
+    if bundle is not None and bundle.version == version:
+        return bundle
+
+    with bundles_lock:
+        # may have been loaded by another session meanwhile
+        bundle = bundles.get(key)
+        if bundle is None or bundle.version != version:
+            print(f"[INFO] Loading the data bundle {version} ...")
+            bundle = build_bundle(version, processed_dir, maps_dir)
+            bundles[key] = bundle
+        return bundle
+
+
+if __name__ == '__main__':
+    import time
+
+    for i in range(2):
+        start_time = time.perf_counter()
+        bundle = load_bundle()
+        total_time = time.perf_counter() - start_time
+        print(f"[INFO] Bundle {bundle.version} ({len(bundle.national)} days, "
+              f"{len(bundle.state_ids)} states) in {1000 * total_time:.2f} ms")
+    print(pd.Series(bundle.state_ids).to_string())
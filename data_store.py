@@ -0,0 +1,97 @@
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+PROCESSED_DIR = "processed_data"
+STORE_DIR = os.path.join(PROCESSED_DIR, "store")
+
+# the tables used by the app, all indexed by "Date"
+TABLE_NAMES = ("cleaned_all", "monthly_sum", "state_all", "state_cumu")
+
+
+def csv_path(name, processed_dir=PROCESSED_DIR):
+    return os.path.join(processed_dir, f"{name}.csv")
+
+
+def store_path(name, store_dir=STORE_DIR):
+    return os.path.join(store_dir, f"{name}.arrow")
+
+
+def read_csv_table(name, processed_dir=PROCESSED_DIR):
+    """parse the CSV file of the table, with the dates as datetime64"""
+    df = pd.read_csv(csv_path(name, processed_dir))
+    df.Date = pd.to_datetime(df.Date, format='%Y-%m-%d')
+    return df.set_index('Date')
+
+
+def temp_path(path):
+    """
+    A new temporary file next to `path`, unique to its writer to be renamed
+    to `path` without clashing with the other processes writing it.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f"{os.path.basename(path)}.", suffix=".tmp",
+        dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    return tmp_path
+
+
+def write_table(df, path):
+    """
+    Write the DataFrame in the Arrow IPC (Feather V2) format, uncompressed
+    to be memory-mapped without decoding.
+    """
+    tmp_path = temp_path(path)
+    try:
+        feather.write_feather(df.reset_index(), tmp_path,
+                              compression='uncompressed')
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def is_stale(name, processed_dir=PROCESSED_DIR, store_dir=STORE_DIR):
+    """whether the stored table is missing or older than its CSV file"""
+    path = store_path(name, store_dir)
+    if not os.path.exists(path):
+        return True
+    source = csv_path(name, processed_dir)
+    return os.path.exists(source) \
+        and os.path.getmtime(source) > os.path.getmtime(path)
+
+
+def build_store(processed_dir=PROCESSED_DIR, store_dir=STORE_DIR, force=False):
+    """convert the CSV files of the tables to the store, to run after preprocessing"""
+    os.makedirs(store_dir, exist_ok=True)
+    for name in TABLE_NAMES:
+        if force or is_stale(name, processed_dir, store_dir):
+            write_table(read_csv_table(name, processed_dir),
+                        store_path(name, store_dir))
+            print(f"[INFO] {store_path(name, store_dir)} created.")
+
+
+def read_table(name, store_dir=STORE_DIR):
+    """
+    Read the stored table through a memory map: the numeric and datetime
+    columns are used straight from the mapped file (shared by all the
+    processes reading it through the OS page cache) instead of parsed.
+    """
+    with pa.memory_map(store_path(name, store_dir), 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    df = table.to_pandas(split_blocks=True)
+    return df.set_index('Date')
+
+
+def load_tables(processed_dir=PROCESSED_DIR, store_dir=STORE_DIR):
+    """all the tables, converting the CSV files first if needed"""
+    if any(is_stale(name, processed_dir, store_dir) for name in TABLE_NAMES):
+        build_store(processed_dir, store_dir)
+    return tuple(read_table(name, store_dir) for name in TABLE_NAMES)
+
+
+if __name__ == '__main__':
+    build_store(force=True)
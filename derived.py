@@ -0,0 +1,334 @@
+import argparse
+import json
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+PROCESSED_DIR = "processed_data"
+STATE_PATH = os.path.join(PROCESSED_DIR, "derived_state.json")
+
+ROLLING_DAY = 7
+# the simple moving averages and their daily column
+SMA_COLUMNS = {"SMA_new": "New Case", "SMA_death": "Death"}
+# the exponential moving averages of "New Case" and their alpha
+EMA_ALPHAS = {"EMA_0.1": 0.1, "EMA_0.3": 0.3}
+# in the order of `cleaned_all.csv`
+DERIVED_COLUMNS = ["SMA_new", "EMA_0.1", "EMA_0.3", "SMA_death"]
+MONTHLY_COLUMNS = ["Recovered", "New Case", "Death", "ICU", "Ventilator"]
+
+
+def preprocess_df(df, date_format='%Y-%m-%d'):
+    """
+    Same as `preprocess_df` in `preprocess.ipynb`. The outputs of
+    `Scraper.scrape_all` have the dates as "YYYY-MM-DD", the old files
+    in `original_data` as "%d-%m-%y".
+    """
+    df = df.drop(columns='URL', errors='ignore')
+    df['Date'] = pd.to_datetime(df['Date'], format=date_format)
+    df['Active Case'] = (df['Cumulative Case'] - df['Cumulative Recovered']
+                         - df['Cumulative Death'])
+    return df.set_index('Date')
+
+
+def derive_all(df):
+    """
+    The full recompute of `preprocess.ipynb` over the whole history,
+    returns (cleaned_all, monthly_sum).
+    """
+    return moving_averages(df), monthly_sum(df)
+
+
+def moving_averages(df):
+    """the daily data with the SMA and EMA columns"""
+    df = df.copy()
+    for col, daily_col in SMA_COLUMNS.items():
+        df[col] = df[daily_col].rolling(ROLLING_DAY, min_periods=1)\
+            .mean().round(2)
+    for col, alpha in EMA_ALPHAS.items():
+        df[col] = df['New Case'].ewm(alpha=alpha).mean().round(2)
+    return df[[col for col in df.columns if col not in DERIVED_COLUMNS]
+              + DERIVED_COLUMNS]
+
+
+def monthly_sum(df):
+    """the sums of each month, dated on the first day of the month"""
+    df_month = df[MONTHLY_COLUMNS].groupby(
+        df.index.to_period('M')).sum()
+    df_month.index = df_month.index.to_timestamp()
+    df_month.index.name = 'Date'
+    return df_month.reset_index()
+
+
+class DerivedState:
+    """
+    The state needed to derive the moving averages and the monthly sums of
+    the appended days only, instead of the whole history:
+        - the last 6 daily values of each SMA (the rest of the window of
+          the next day)
+        - the weighted average and the sum of the weights of each EMA, as
+          `ewm(adjust=True)` weights all the previous days
+        - the partial sums of the current month
+
+    The EMA is updated with the same floating point operations as pandas,
+    and the rounding is done with NumPy, so the appended rows are the same
+    bytes as a full recompute with `derive_all`.
+    """
+
+    def __init__(self):
+        self.last_date = None
+        self.windows = {col: deque(maxlen=ROLLING_DAY - 1)
+                        for col in SMA_COLUMNS}
+        # column -> [weighted average, weight of the previous days, nobs]
+        self.ema = {col: [np.nan, 1., 0] for col in EMA_ALPHAS}
+        self.month = None
+        self.month_sums = {}
+        # the dtypes of the full tables, to write the new rows the same way
+        self.dtypes = {}
+        self.month_dtypes = {}
+        # the sizes of the CSV files after the last update
+        self.file_sizes = {}
+
+    @staticmethod
+    def ewm_alpha(alpha):
+        # pandas converts alpha to the center of mass and back
+        return 1. / (1. + (1. - alpha) / alpha)
+
+    def update_ema(self, col, values):
+        """the loop of pandas' `ewm` with adjust=True and ignore_na=False"""
+        old_wt_factor = 1. - self.ewm_alpha(EMA_ALPHAS[col])
+        new_wt = 1.
+        weighted, old_wt, nobs = self.ema[col]
+        output = np.empty(len(values))
+        for i, cur in enumerate(values):
+            is_observation = cur == cur
+            nobs += is_observation
+            if weighted == weighted:
+                old_wt *= old_wt_factor
+                if is_observation:
+                    # avoid numerical errors on constant series
+                    if weighted != cur:
+                        weighted = old_wt * weighted + new_wt * cur
+                        weighted /= (old_wt + new_wt)
+                    old_wt += new_wt
+            elif is_observation:
+                # the first observation
+                weighted = cur
+            output[i] = weighted if nobs >= 1 else np.nan
+        self.ema[col] = [float(weighted), float(old_wt), int(nobs)]
+        return output
+
+    def update_sma(self, col, values):
+        window = self.windows[col]
+        output = np.empty(len(values))
+        for i, cur in enumerate(values):
+            known = [value for value in window if value == value]
+            if cur == cur:
+                known.append(cur)
+            # the sum of the integer counts is exact, as in `rolling`
+            output[i] = sum(known) / len(known) if known else np.nan
+            window.append(float(cur))
+        return output
+
+    def update(self, df):
+        """
+        Derive the columns of the new days `df` (preprocessed, indexed by
+        date, after `last_date`), returns (the new rows of cleaned_all,
+        the rows of monthly_sum from the current month).
+        """
+        df = df.copy()
+        new_cases = df['New Case'].to_numpy(dtype=float, na_value=np.nan)
+        for col, daily_col in SMA_COLUMNS.items():
+            values = df[daily_col].to_numpy(dtype=float, na_value=np.nan)
+            df[col] = np.round(self.update_sma(col, values), 2)
+        for col in EMA_ALPHAS:
+            df[col] = np.round(self.update_ema(col, new_cases), 2)
+        df = df[[col for col in df.columns if col not in DERIVED_COLUMNS]
+                + DERIVED_COLUMNS]
+        if self.dtypes:
+            df = df.astype(self.dtypes)
+        self.last_date = df.index[-1]
+
+        months = []
+        for month, rows in df[MONTHLY_COLUMNS].groupby(
+                df.index.to_period('M'), sort=True):
+            month = str(month.to_timestamp().date())
+            if month != self.month:
+                self.month = month
+                self.month_sums = {col: 0 for col in MONTHLY_COLUMNS}
+            for col in MONTHLY_COLUMNS:
+                # NaN is skipped as in `sum`
+                total = rows[col].sum()
+                self.month_sums[col] += total.item() \
+                    if hasattr(total, 'item') else total
+            months.append({'Date': month, **self.month_sums})
+        df_month = pd.DataFrame(months, columns=['Date'] + MONTHLY_COLUMNS)
+        if self.month_dtypes:
+            df_month = df_month.astype(self.month_dtypes)
+        return df, df_month
+
+    @classmethod
+    def from_history(cls, df, df_month):
+        """
+        Build the state from the whole cleaned_all and monthly_sum tables,
+        e.g. written by `preprocess.ipynb`. Done once, the EMA weights need
+        all the days.
+        """
+        state = cls()
+        state.update(df[[col for col in df.columns
+                         if col not in DERIVED_COLUMNS]])
+        state.dtypes = {col: str(dtype) for col, dtype in df.dtypes.items()}
+        state.month_dtypes = {col: str(df_month[col].dtype)
+                              for col in MONTHLY_COLUMNS}
+        # the monthly sums as written, in case they were edited by hand
+        last_month = df_month.iloc[-1]
+        state.month = str(pd.Timestamp(last_month['Date']).date())
+        state.month_sums = {col: last_month[col].item()
+                            for col in MONTHLY_COLUMNS}
+        return state
+
+    def to_dict(self):
+        return {"last_date": str(self.last_date.date()),
+                "windows": {col: list(window)
+                            for col, window in self.windows.items()},
+                "ema": self.ema,
+                "month": self.month,
+                "month_sums": self.month_sums,
+                "dtypes": self.dtypes,
+                "month_dtypes": self.month_dtypes,
+                "file_sizes": self.file_sizes}
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.last_date = pd.Timestamp(data["last_date"])
+        for col, values in data["windows"].items():
+            state.windows[col].extend(values)
+        state.ema = {col: list(values) for col, values in data["ema"].items()}
+        state.month = data["month"]
+        state.month_sums = data["month_sums"]
+        state.dtypes = data["dtypes"]
+        state.month_dtypes = data["month_dtypes"]
+        state.file_sizes = data["file_sizes"]
+        return state
+
+    def save(self, path=STATE_PATH):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            # the floats are written with repr, read back exactly
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+
+def read_cleaned_all(processed_dir=PROCESSED_DIR):
+    df = pd.read_csv(os.path.join(processed_dir, "cleaned_all.csv"))
+    df.Date = pd.to_datetime(df.Date, format='%Y-%m-%d')
+    return df.set_index('Date')
+
+
+def read_monthly_sum(processed_dir=PROCESSED_DIR):
+    return pd.read_csv(os.path.join(processed_dir, "monthly_sum.csv"))
+
+
+def truncate_last_line(path):
+    """remove the last line of the file, without reading the whole file"""
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        block = min(end, 4096)
+        f.seek(end - block)
+        tail = f.read(block)
+        # the newline at the end of the last line is not its start
+        start = tail.rfind(b"\n", 0, len(tail) - 1)
+        f.truncate(end - block + start + 1)
+
+
+def load_state(processed_dir=PROCESSED_DIR, state_path=STATE_PATH):
+    """
+    The saved state, built again from the CSV files if missing or if the
+    files were changed since the last update, e.g. by `preprocess.ipynb`.
+    """
+    paths = {name: os.path.join(processed_dir, f"{name}.csv")
+             for name in ("cleaned_all", "monthly_sum")}
+    if os.path.exists(state_path):
+        state = DerivedState.load(state_path)
+        if all(os.path.getsize(path) == state.file_sizes.get(name)
+               for name, path in paths.items()):
+            return state
+    print("[INFO] Building the state of the derived columns "
+          "from the whole history ...")
+    state = DerivedState.from_history(read_cleaned_all(processed_dir),
+                                      read_monthly_sum(processed_dir))
+    state.file_sizes = {name: os.path.getsize(path)
+                        for name, path in paths.items()}
+    return state
+
+
+def append_days(df, processed_dir=PROCESSED_DIR, state_path=STATE_PATH):
+    """
+    Append the new days of the preprocessed `df` to `cleaned_all.csv` and
+    update the current month of `monthly_sum.csv`, the same as running
+    `preprocess.ipynb` again on the whole history. The days already in
+    `cleaned_all.csv` are skipped.
+    """
+    cleaned_path = os.path.join(processed_dir, "cleaned_all.csv")
+    monthly_path = os.path.join(processed_dir, "monthly_sum.csv")
+    state = load_state(processed_dir, state_path)
+    df = df[df.index > state.last_date]
+    if not len(df):
+        print("[INFO] No new days to append.")
+        return
+
+    # a missing value in an integer column turns the whole column into
+    #   floats, which changes every row written before
+    int_columns = [col for col, dtype in state.dtypes.items()
+                   if dtype.startswith('int') and col in df]
+    if df[int_columns].isna().any().any():
+        print("[INFO] Missing values in the new days, recomputing "
+              "the whole history ...")
+        history = read_cleaned_all(processed_dir)
+        history = history[[col for col in history.columns
+                           if col not in DERIVED_COLUMNS]]
+        df_all, df_month = derive_all(pd.concat([history, df]))
+        df_all.to_csv(cleaned_path)
+        df_month.to_csv(monthly_path, index=False)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return
+
+    first_month = str(df.index[0].to_period('M').to_timestamp().date())
+    updates_month = first_month == state.month
+    df_new, df_month = state.update(df)
+
+    df_new.to_csv(cleaned_path, mode='a', header=False)
+    if updates_month:
+        # only the row of the current month is written again
+        truncate_last_line(monthly_path)
+    df_month.to_csv(monthly_path, mode='a', header=False, index=False)
+
+    state.file_sizes = {"cleaned_all": os.path.getsize(cleaned_path),
+                        "monthly_sum": os.path.getsize(monthly_path)}
+    state.save(state_path)
+    print(f"[INFO] {len(df_new)} days appended until "
+          f"{state.last_date.date()}.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Append the new days scraped by `scrape_all` to the "
+                    "processed data.")
+    parser.add_argument("csv_paths", nargs="+",
+                        help="the CSV files of the new days, e.g. "
+                             "all_2021-04-16_2021-04-20.csv")
+    parser.add_argument("--date-format", default='%Y-%m-%d')
+    args = parser.parse_args()
+
+    new_days = pd.concat([preprocess_df(pd.read_csv(path), args.date_format)
+                          for path in args.csv_paths]).sort_index()
+    append_days(new_days[~new_days.index.duplicated(keep='last')])
@@ -0,0 +1,135 @@
+import json
+import os
+import re
+from datetime import datetime
+
+JOURNAL_PATH = os.path.join("processed_data", "extraction_errors.json")
+
+# the lines of the old `txt_error.txt`: "<field> - YYYY-MM-DD", sometimes
+#   written without a newline in between
+LEGACY_LINE_REGEX = re.compile(r"(.+?) - (\d{4}-\d{2}-\d{2})")
+
+
+class ErrorJournal:
+    """
+    Journal of the fields which could not be extracted, indexed by date.
+
+    The errors are kept in memory, deduplicated by (date, field, parser
+    version) with a count of how many times they were seen, and only
+    written to `path` by `flush` once per run. `path=None` keeps the
+    journal in memory only, e.g. in the worker processes.
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        # "YYYY-MM-DD" -> (field, parser version) -> record
+        self.dates = {}
+        self.loaded = False
+        self.dirty = False
+
+    @staticmethod
+    def date_key(dt):
+        return dt if isinstance(dt, str) else str(dt.date())
+
+    def load(self):
+        """read the journal saved before, only when first needed"""
+        if self.loaded:
+            return
+        self.loaded = True
+        if not (self.path and os.path.exists(self.path)):
+            return
+        with open(self.path, "r") as f:
+            records = json.load(f)["records"]
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        date_errors = self.dates.setdefault(record["date"], {})
+        key = (record["field"], record["parser_version"])
+        if key in date_errors:
+            old_record = date_errors[key]
+            old_record["count"] += record["count"]
+            old_record["first_seen"] = min(old_record["first_seen"],
+                                           record["first_seen"])
+            old_record["last_seen"] = max(old_record["last_seen"],
+                                          record["last_seen"])
+            old_record["url"] = record["url"] or old_record["url"]
+        else:
+            date_errors[key] = dict(record)
+
+    def record(self, dt, field, parser_version, url=None, message=None):
+        self.load()
+        now = datetime.now().isoformat(timespec="seconds")
+        self.add({"date": self.date_key(dt),
+                  "field": field,
+                  "parser_version": parser_version,
+                  "url": url,
+                  "message": message,
+                  "count": 1,
+                  "first_seen": now,
+                  "last_seen": now})
+        self.dirty = True
+
+    def clear_date(self, dt, parser_version):
+        """
+        Remove the errors of the date from this parser version, before
+        scraping the date again.
+        """
+        self.load()
+        date_errors = self.dates.get(self.date_key(dt))
+        if not date_errors:
+            return
+        for key in [key for key in date_errors if key[1] == parser_version]:
+            del date_errors[key]
+            self.dirty = True
+        if not date_errors:
+            del self.dates[self.date_key(dt)]
+
+    def errors_on(self, dt):
+        """all the errors of the date"""
+        self.load()
+        return list(self.dates.get(self.date_key(dt), {}).values())
+
+    def has_errors(self, dt, parser_version=None):
+        self.load()
+        date_errors = self.dates.get(self.date_key(dt), {})
+        if parser_version is None:
+            return bool(date_errors)
+        return any(version == parser_version for _, version in date_errors)
+
+    def unresolved_dates(self, parser_version=None):
+        """the dates with any field not extracted"""
+        self.load()
+        return sorted(date for date in self.dates
+                      if self.has_errors(date, parser_version))
+
+    def to_records(self):
+        self.load()
+        return [record for date in sorted(self.dates)
+                for record in self.dates[date].values()]
+
+    def merge(self, records):
+        """add the records from another journal, e.g. of a worker process"""
+        self.load()
+        for record in records:
+            self.add(record)
+            self.dirty = True
+
+    def flush(self):
+        """write the journal if anything has changed"""
+        if not (self.path and self.dirty):
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"records": self.to_records()}, f, indent=1)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def import_legacy(self, txt_path, parser_version="legacy"):
+        """import the errors of the old `txt_error.txt`"""
+        self.load()
+        with open(txt_path, "r") as f:
+            for field, date in LEGACY_LINE_REGEX.findall(f.read()):
+                # the lines written without a newline are joined here
+                self.record(date, field.strip(), parser_version)
@@ -0,0 +1,138 @@
+import re
+import unicodedata
+from collections import namedtuple
+
+import numpy as np
+
+# a sentence found for a field, all positions are indices of the page text
+#   - start, end: the span of the sentence
+#   - txt_start: where the field text is first found in the sentence
+#   - number_idx: the indices of the numbers of the page in the sentence
+Sentence = namedtuple("Sentence", ["start", "end", "txt_start", "number_idx"])
+
+COMMA_SEP_DIGITS = re.compile(r"\d+,\s*\d+")
+KE_NUMBER = re.compile(r"ke-\d+")
+
+DOT, COMMA, NEWLINE = ord('.'), ord(','), ord('\n')
+ZERO, NINE = ord('0'), ord('9')
+
+
+class PageScan:
+    """
+    The positions of all the delimiters and numbers in the normalised text
+    of a page, computed once with NumPy to be shared by every field.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        is_dot_comma = (codes == DOT) | (codes == COMMA)
+        # the delimiters of a sentence: `[.,\n]`
+        self.delimiters = np.flatnonzero(is_dot_comma | (codes == NEWLINE))
+        # the ends of a sentence: `[.,]`
+        self.dot_commas = np.flatnonzero(is_dot_comma)
+
+        # the runs of digits: `\d+`
+        is_digit = np.zeros(len(codes) + 2, dtype=np.int8)
+        is_digit[1:-1] = (codes >= ZERO) & (codes <= NINE)
+        edges = np.diff(is_digit)
+        self.number_starts = np.flatnonzero(edges == 1)
+        self.number_ends = np.flatnonzero(edges == -1)
+
+    def number(self, idx):
+        return int(self.text[self.number_starts[idx]:self.number_ends[idx]])
+
+    def sentence_text(self, sentence):
+        return self.text[sentence.start:sentence.end]
+
+
+class OldFormatExtractor:
+    """
+    Extraction engine for the old text format of the articles (before
+    2021-01-20).
+
+    All the field patterns are compiled once, the page text is normalised
+    in a single pass and scanned once by `PageScan`. Each sentence is then
+    located with span arithmetic, giving the same sentence as the regex
+    `([^.,\\n]*{txt}[^.,]*[,.]+)` used previously, and the nearest number is
+    resolved on the arrays of number positions.
+    """
+
+    def __init__(self, fields):
+        self.patterns = {txt: re.compile(txt) for txt in fields}
+
+    @staticmethod
+    def join_comma_sep_digits(matchObj):
+        return matchObj.group().replace(',', '').replace(' ', '')
+
+    def normalize(self, all_text):
+        # Remove all COVID-19 words to avoid getting number 19 accidentally
+        all_text = all_text.replace('COVID-19', '').replace('covid19', '')
+        # to remove unwanted strings like '\xa0'
+        all_text = unicodedata.normalize('NFKD', all_text)
+        return COMMA_SEP_DIGITS.sub(self.join_comma_sep_digits, all_text)
+
+    @staticmethod
+    def scan(all_text):
+        return PageScan(all_text)
+
+    def find_sentence(self, page, txt, pos=0):
+        """
+        Find the first sentence containing `txt`, starting from `pos`.
+        Returns None if not found.
+        """
+        pattern = self.patterns[txt]
+        txt_found = pattern.search(page.text, pos)
+        if txt_found is None:
+            return None
+        txt_start = txt_found.start()
+
+        # the sentence starts after the last delimiter before the text
+        idx = np.searchsorted(page.delimiters, txt_start) - 1
+        start = max(pos, page.delimiters[idx] + 1) if idx >= 0 else pos
+
+        if txt == 'Unit Rawatan Rapi':
+            # until the last 'Unit Rawatan Rapi' before the next delimiter,
+            #  to avoid taking the numbers for the 'pernafasan'
+            idx = np.searchsorted(page.delimiters, txt_start)
+            clause_end = page.delimiters[idx] if idx < len(page.delimiters) \
+                else len(page.text)
+            end = [found.end() for found in
+                   pattern.finditer(page.text, txt_start, clause_end)][-1]
+        else:
+            # until the next run of '.' or ','
+            idx = np.searchsorted(page.dot_commas, txt_found.end())
+            if idx == len(page.dot_commas):
+                return None
+            end = page.dot_commas[idx]
+            while idx < len(page.dot_commas) and page.dot_commas[idx] == end:
+                idx += 1
+                end += 1
+
+        number_idx = np.arange(np.searchsorted(page.number_starts, start),
+                               np.searchsorted(page.number_starts, end))
+        return Sentence(int(start), int(end), txt_start, number_idx)
+
+    def find_death_sentence(self, page, txt):
+        """
+        The first sentence with `txt`, or the next one if the first has
+        strings like "ke-1234". Raises IndexError if not found.
+        """
+        sentence = self.find_sentence(page, txt)
+        if sentence is None:
+            raise IndexError(f"'{txt}' not found")
+        if KE_NUMBER.search(page.sentence_text(sentence)):
+            # take the next sentence instead
+            sentence = self.find_sentence(page, txt, pos=sentence.end)
+            if sentence is None:
+                raise IndexError(f"second '{txt}' not found")
+        return sentence
+
+    @staticmethod
+    def nearest_number(page, sentence, skip=0):
+        """the number nearest to the field text, `skip` to take the next"""
+        distances = np.abs(page.number_starts[sentence.number_idx]
+                           - sentence.txt_start)
+        # `argmin` takes the first one of the closest numbers
+        min_index = int(np.argmin(distances)) + skip
+        return page.number(sentence.number_idx[min_index])
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+# the memory budget of the figures of a process, measured by the size of
+#   their JSON (what is sent to the browser)
+MAX_MEGABYTES = 64
+
+
+class FigureCache:
+    """
+    The built Plotly figures of this process, shared by every session and
+    rerun of the app, keyed by (figure id, data version, options). Only
+    the first viewer after an update of the data builds a figure.
+
+    The least recently used figures are dropped when the figures are over
+    `max_bytes`, e.g. the figures of an old version of the data.
+
+    The figures are shared, they must not be modified by the caller.
+    """
+
+    def __init__(self, max_bytes=MAX_MEGABYTES * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.figures = OrderedDict()
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # `lock` for the dict, `build_lock` for a figure to be built once
+        #   while the other figures are still returned
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+
+    def lookup(self, key):
+        with self.lock:
+            if key not in self.figures:
+                return None
+            self.figures.move_to_end(key)
+            return self.figures[key][0]
+
+    def get(self, key, build):
+        """the figure of the key, from `build()` when it is not cached"""
+        fig = self.lookup(key)
+        if fig is None:
+            with self.build_lock:
+                # may have been built by another session meanwhile
+                fig = self.lookup(key)
+                if fig is None:
+                    start_time = time.perf_counter()
+                    fig = build()
+                    self.add(key, fig)
+                    total_time = time.perf_counter() - start_time
+                    print(f"[INFO] Figure {key[0]} built in "
+                          f"{1000 * total_time:.2f} ms")
+                    with self.lock:
+                        self.misses += 1
+                    return fig
+        with self.lock:
+            self.hits += 1
+        return fig
+
+    def add(self, key, fig):
+        size = len(fig.to_json())
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.figures:
+                self.n_bytes -= self.figures.pop(key)[1]
+            self.figures[key] = (fig, size)
+            self.n_bytes += size
+            while self.n_bytes > self.max_bytes:
+                _, (_, old_size) = self.figures.popitem(last=False)
+                self.n_bytes -= old_size
+
+    def clear(self):
+        with self.lock:
+            self.figures.clear()
+            self.n_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {"figures": len(self.figures),
+                    "megabytes": round(self.n_bytes / 1024 ** 2, 2),
+                    "hits": self.hits, "misses": self.misses}
+
+
+# the cache of this process (the imported modules are kept by Streamlit,
+#   unlike the app script)
+figure_cache = FigureCache()
+
+
+def cached_figure(figure_id, version, build, *options):
+    """the figure built by `build()` for the version of the data and options"""
+    return figure_cache.get((figure_id, version) + options, build)
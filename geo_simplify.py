@@ -0,0 +1,175 @@
+import json
+import os
+from collections import defaultdict
+
+import numpy as np
+
+from data_store import temp_path
+
+ORIG_DIR = "original_data"
+MAPS_DIR = os.path.join("processed_data", "maps")
+GEOJSON_PATH = os.path.join(ORIG_DIR,
+                            "malaysia_state_province_boundary.geojson")
+
+# the tolerance of each level in degrees (1 degree is about 111 km), and
+#   the decimals the coordinates are rounded to
+LEVELS = {"fine": (0.0005, 4),
+          "medium": (0.002, 3),
+          "coarse": (0.01, 3)}
+# the properties used by the app, the others are dropped
+KEPT_PROPERTIES = ("name", "locname")
+
+
+def level_path(level, maps_dir=MAPS_DIR):
+    return os.path.join(maps_dir, f"states_{level}.geojson")
+
+
+def segment_distances(points, start, end):
+    """the distances of the points to the segment from `start` to `end`"""
+    segment = end - start
+    length2 = segment @ segment
+    if length2 == 0:
+        return np.hypot(*(points - start).T)
+    t = np.clip((points - start) @ segment / length2, 0, 1)
+    return np.hypot(*(points - start - t[:, None] * segment).T)
+
+
+def douglas_peucker(points, tolerance):
+    """the points of the line kept by the Douglas-Peucker algorithm"""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        distances = segment_distances(points[start + 1:end], points[start],
+                                      points[end])
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            i += start + 1
+            keep[i] = True
+            stack += [(start, i), (i, end)]
+    return points[keep]
+
+
+class TopologySimplifier:
+    """
+    Simplify the rings of all the states together, so the borders shared
+    by two states stay the same line (without any gap or overlap).
+
+    Each ring is split into arcs at its junctions, the points where the
+    rings going through have different neighbours, e.g. where a border
+    between two states meets the coast or a third state. Each arc is
+    simplified once with Douglas-Peucker, in the same direction for every
+    ring sharing it, and the junctions are always kept.
+    """
+
+    def __init__(self, features):
+        self.features = features
+        # the rings without the closing point, as tuples of points
+        self.rings = [[[tuple(point) for point in ring[:-1]]
+                       for ring in polygon]
+                      for feature in features
+                      for polygon in feature['geometry']['coordinates']]
+        self.junctions = self.find_junctions()
+
+    def find_junctions(self):
+        neighbours = defaultdict(set)
+        for polygon in self.rings:
+            for ring in polygon:
+                for i, point in enumerate(ring):
+                    neighbours[point].add(frozenset(
+                        (ring[i - 1], ring[(i + 1) % len(ring)])))
+        return {point for point, pairs in neighbours.items()
+                if len(pairs) > 1}
+
+    def split_arcs(self, ring):
+        """the arcs of the ring, each with both of its end points"""
+        starts = [i for i, point in enumerate(ring) if point in self.junctions]
+        if not starts:
+            # a closed arc, from the same point in every ring sharing it
+            first = ring.index(min(ring))
+            ring = ring[first:] + ring[:first]
+            return [ring + ring[:1]]
+        ring = ring[starts[0]:] + ring[:starts[0]]
+        starts = [i - starts[0] for i in starts] + [len(ring)]
+        ring = ring + ring[:1]
+        return [ring[start:end + 1] for start, end in zip(starts, starts[1:])]
+
+    def simplify_ring(self, ring, tolerance, decimals, arcs):
+        points = []
+        for arc in self.split_arcs(ring):
+            arc, reverse = tuple(arc), tuple(arc[::-1])
+            key = min(arc, reverse)
+            if key not in arcs:
+                arcs[key] = douglas_peucker(np.array(key), tolerance)
+            simplified = arcs[key].round(decimals).tolist()
+            if key != arc:
+                simplified = simplified[::-1]
+            # the first point is the last point of the previous arc
+            points += simplified[1:] if points else simplified
+        # the points merged by the rounding
+        points = [point for i, point in enumerate(points)
+                  if i == 0 or point != points[i - 1]]
+        # at least a triangle, closed
+        return points if len(points) >= 4 else None
+
+    def simplify(self, tolerance, decimals):
+        """the features with the simplified MultiPolygon of each state"""
+        # the simplified arcs, shared by all the rings
+        arcs = {}
+        polygons = iter(self.rings)
+        features = []
+        for feature in self.features:
+            coordinates = []
+            for _ in feature['geometry']['coordinates']:
+                exterior, *holes = [
+                    self.simplify_ring(ring, tolerance, decimals, arcs)
+                    for ring in next(polygons)]
+                # the islands and lakes smaller than the tolerance
+                if exterior is not None:
+                    coordinates.append(
+                        [exterior] + [hole for hole in holes if hole])
+            if not coordinates:
+                raise Exception(f"[ERROR] {feature['properties']['name']} "
+                                f"is smaller than the tolerance {tolerance}")
+            features.append({
+                "type": "Feature",
+                "properties": {key: feature['properties'][key]
+                               for key in KEPT_PROPERTIES},
+                "geometry": {"type": "MultiPolygon",
+                             "coordinates": coordinates}})
+        return features
+
+
+def write_levels(geojson_path=GEOJSON_PATH, maps_dir=MAPS_DIR,
+                 levels=LEVELS):
+    """write the simplified map of each level to `maps_dir`"""
+    with open(geojson_path, 'r') as f:
+        features = json.load(f)['features']
+    simplifier = TopologySimplifier(features)
+    os.makedirs(maps_dir, exist_ok=True)
+    for level, (tolerance, decimals) in levels.items():
+        simplified = {"type": "FeatureCollection",
+                      "features": simplifier.simplify(tolerance, decimals)}
+        path = level_path(level, maps_dir)
+        # unique to this writer, the maps may be built by several
+        #   processes of the app at once (see `data_bundle.check_maps`)
+        tmp_path = temp_path(path)
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(simplified, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        n_points = sum(len(ring) for feature in simplified['features']
+                       for polygon in feature['geometry']['coordinates']
+                       for ring in polygon)
+        print(f"[INFO] {path} created: {n_points} points, "
+              f"{os.path.getsize(path) / 1e6:.2f} MB")
+
+
+if __name__ == '__main__':
+    write_levels()
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# the responses worth retrying, as for the async downloads
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def create_session(pool_size=10, max_retries=3, backoff_factor=0.5):
+    """
+    `requests.Session` keeping the connections alive in a pool of
+    `pool_size` connections per host, asking for compressed responses and
+    retrying on 429, 5xx and connection errors.
+    """
+    session = requests.Session()
+    retry = Retry(total=max_retries, backoff_factor=backoff_factor,
+                  status_forcelist=RETRY_STATUSES, allowed_methods=("GET",),
+                  respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate",
+                            "Connection": "keep-alive"})
+    return session
+
+
+class Prefetcher:
+    """
+    Download the pages of the next dates in a thread pool, while the page
+    of the current date is being extracted.
+
+    The URLs are submitted in date order with `submit` and taken back with
+    `get`, which waits for the download if it is not done yet, so the
+    pages are still processed one date after another.
+    """
+
+    def __init__(self, fetch, ahead=4):
+        # function taking a URL and returning the HTML body
+        self.fetch = fetch
+        self.ahead = ahead
+        self.executor = None
+        # URL -> Future of the HTML body
+        self.futures = {}
+
+    def submit(self, urls):
+        """start downloading the URLs which are not requested yet"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.ahead)
+        for url in urls:
+            if url not in self.futures:
+                self.futures[url] = self.executor.submit(self.fetch, url)
+
+    def get(self, url):
+        future = self.futures.pop(url, None)
+        if future is None:
+            return self.fetch(url)
+        # any exception of the download is raised here
+        return future.result()
+
+    def close(self):
+        """cancel the downloads not started yet and stop the threads"""
+        for future in self.futures.values():
+            future.cancel()
+        self.futures = {}
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
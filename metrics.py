@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# the stages of scraping a date, in order
+STAGES = ("url", "network", "parse", "fields", "table", "write")
+
+
+class Metrics:
+    """
+    Durations of the stages and counters of events of a scraping run.
+
+    Each date gets a record of the seconds spent in every stage (URL
+    resolution, waiting for the network, HTML parsing, extraction of the
+    fields and of the state table, writing the output) and of its events
+    (bytes, retries, fallbacks taken), appended to `jsonl_path` as one JSON
+    line when the date is done. The totals of the run are written to
+    `prom_path` in the Prometheus text format by `finish`.
+    """
+
+    def __init__(self, jsonl_path=None, prom_path=None):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+
+        self.stage_seconds = defaultdict(float)
+        self.stage_calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.dates = defaultdict(int)
+        self.start_time = time.perf_counter()
+        # the record of the date being scraped
+        self.record = None
+        # the counters can also be updated by the download threads,
+        #   only the thread scraping the date adds them to its record
+        self.lock = threading.Lock()
+        self.owner_thread = threading.get_ident()
+
+    def start_date(self, dt):
+        self.owner_thread = threading.get_ident()
+        self.record = {"date": str(dt.date()),
+                       "stages": defaultdict(float),
+                       "counters": defaultdict(int)}
+
+    def end_date(self, status="ok", url=None):
+        with self.lock:
+            self.dates[status] += 1
+        if self.record is None:
+            return
+        self.record["status"] = status
+        self.record["url"] = url
+        self.record["seconds"] = round(sum(self.record["stages"].values()), 6)
+        if self.jsonl_path:
+            with open(self.jsonl_path, "a") as f:
+                f.write(json.dumps(self.record) + "\n")
+        self.record = None
+
+    @contextmanager
+    def stage(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_time
+            with self.lock:
+                self.stage_seconds[name] += duration
+                self.stage_calls[name] += 1
+            if self.record is not None \
+                    and threading.get_ident() == self.owner_thread:
+                self.record["stages"][name] += round(duration, 6)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+        if self.record is not None \
+                and threading.get_ident() == self.owner_thread:
+            self.record["counters"][name] += n
+
+    def summary(self):
+        """the seconds and the share of each stage, to print at the end"""
+        total = sum(self.stage_seconds.values()) or 1.0
+        return ", ".join(
+            f"{name} {self.stage_seconds[name]:.2f}s "
+            f"({100 * self.stage_seconds[name] / total:.0f}%)"
+            for name in STAGES if name in self.stage_seconds)
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP scraper_stage_seconds_total Seconds spent in each stage.",
+            "# TYPE scraper_stage_seconds_total counter"]
+        lines += [f'scraper_stage_seconds_total{{stage="{name}"}} {seconds:.6f}'
+                  for name, seconds in sorted(self.stage_seconds.items())]
+        lines += [
+            "# HELP scraper_stage_calls_total Number of times in each stage.",
+            "# TYPE scraper_stage_calls_total counter"]
+        lines += [f'scraper_stage_calls_total{{stage="{name}"}} {calls}'
+                  for name, calls in sorted(self.stage_calls.items())]
+        lines += [
+            "# HELP scraper_events_total Bytes, retries and fallbacks taken.",
+            "# TYPE scraper_events_total counter"]
+        lines += [f'scraper_events_total{{event="{name}"}} {n}'
+                  for name, n in sorted(self.counters.items())]
+        lines += [
+            "# HELP scraper_dates_total Number of dates scraped by status.",
+            "# TYPE scraper_dates_total counter"]
+        lines += [f'scraper_dates_total{{status="{status}"}} {n}'
+                  for status, n in sorted(self.dates.items())]
+        lines += [
+            "# HELP scraper_run_seconds Wall time of the run.",
+            "# TYPE scraper_run_seconds gauge",
+            f"scraper_run_seconds {time.perf_counter() - self.start_time:.6f}"]
+        return "\n".join(lines) + "\n"
+
+    def finish(self):
+        if self.prom_path:
+            with open(self.prom_path, "w") as f:
+                f.write(self.to_prometheus())
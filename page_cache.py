@@ -0,0 +1,171 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from data_store import temp_path
+
+CACHE_DIR = "page_cache"
+
+# pages published or last modified longer than this (in seconds) ago are
+#   treated as final and are served straight from the disk without asking
+#   the server again
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+
+# the date of the article in its URL, e.g. "https://kpkesihatan.com/2020/04/16/..."
+URL_DATE = re.compile(r"/(\d{4})/(\d{2})/(\d{2})/")
+
+
+class PageCache:
+    """
+    On-disk cache for the HTML pages of the press releases.
+
+    Every page is stored in two files named by the SHA-256 of its URL:
+    the gzipped body (`.html.gz`) and the metadata (`.json`) containing
+    the URL, ETag, Last-Modified and the fetch time. The age of a page is
+    counted from the date of the article in its URL and its Last-Modified
+    time, whichever is later. Pages younger than `max_age` are revalidated
+    with a conditional request, older pages are never fetched again. With
+    `offline=True` the cache acts as a corpus and never touches the
+    network.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_age=DEFAULT_MAX_AGE,
+                 offline=False):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.offline = offline
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def body_path(self, url):
+        return os.path.join(self.cache_dir, f"{self.key(url)}.html.gz")
+
+    def meta_path(self, url):
+        return os.path.join(self.cache_dir, f"{self.key(url)}.json")
+
+    def get(self, url):
+        """returns the cached entry with its body, or None if not cached"""
+        try:
+            with open(self.meta_path(url), "r") as f:
+                entry = json.load(f)
+            with gzip.open(self.body_path(url), "rb") as f:
+                entry["body"] = f.read()
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return entry
+
+    def put(self, url, body, headers=None):
+        headers = headers or {}
+        entry = {"url": url,
+                 "etag": headers.get("ETag"),
+                 "last_modified": headers.get("Last-Modified"),
+                 "fetched_at": time.time()}
+        # write to temporary files first to never leave a half-written page
+        tmp_body = temp_path(self.body_path(url))
+        try:
+            with gzip.open(tmp_body, "wb") as f:
+                f.write(body)
+            os.replace(tmp_body, self.body_path(url))
+        except BaseException:
+            os.remove(tmp_body)
+            raise
+        self.write_meta(url, entry)
+        entry["body"] = body
+        return entry
+
+    def write_meta(self, url, entry):
+        meta = {k: v for k, v in entry.items() if k != "body"}
+        tmp_meta = temp_path(self.meta_path(url))
+        try:
+            with open(tmp_meta, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, self.meta_path(url))
+        except BaseException:
+            os.remove(tmp_meta)
+            raise
+
+    def touch(self, url, entry):
+        """
+        To mark the cached page as revalidated after a 304 response, the
+        age of the page is not changed.
+        """
+        entry["revalidated_at"] = time.time()
+        self.write_meta(url, entry)
+        return entry
+
+    @staticmethod
+    def changed_at(entry):
+        """
+        The timestamp of the last change of the page: the later of the date
+        of the article and its Last-Modified time, or the time of its first
+        fetch when neither is known.
+        """
+        times = []
+        match = URL_DATE.search(entry["url"])
+        if match:
+            published = datetime(*map(int, match.groups()),
+                                 tzinfo=timezone.utc)
+            times.append(published.timestamp())
+        if entry.get("last_modified"):
+            try:
+                times.append(
+                    parsedate_to_datetime(entry["last_modified"]).timestamp())
+            except (TypeError, ValueError):
+                pass
+        return max(times) if times else entry["fetched_at"]
+
+    def is_settled(self, entry):
+        """whether the page is old enough to skip revalidation"""
+        if self.offline:
+            return True
+        return (time.time() - self.changed_at(entry)) >= self.max_age
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def fetch(self, url, session=None):
+        """
+        Get the page body for the URL using the cache first, and the
+        `requests` session (or the `requests` module) otherwise.
+        """
+        entry = self.get(url)
+        if entry is not None and self.is_settled(entry):
+            return entry["body"]
+        if self.offline:
+            raise Exception(f"[ERROR] {url} is not cached (offline mode)")
+
+        session = session or requests
+        r = session.get(url, headers=self.conditional_headers(entry))
+        if r.status_code == 304 and entry is not None:
+            self.touch(url, entry)
+            return entry["body"]
+        if r.status_code == 404:
+            raise Exception("Error 404 accessing page!!")
+        r.raise_for_status()
+        return self.put(url, r.content, r.headers)["body"]
+
+    def urls(self):
+        """all the URLs available in the cache, e.g. to re-extract offline"""
+        for filename in sorted(os.listdir(self.cache_dir)):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(self.cache_dir, filename), "r") as f:
+                yield json.load(f)["url"]
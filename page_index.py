@@ -0,0 +1,85 @@
+import unicodedata
+
+from state_table import parse_tree
+
+# only the content of the article is needed, not the navigation,
+#   sidebars and comments of the page: the outermost `entry-content` divs
+ENTRY_CONTENT = 'contains(concat(" ", normalize-space(@class), " "), " entry-content ")'
+ARTICLE_XPATH = f"//div[{ENTRY_CONTENT}][not(ancestor::div[{ENTRY_CONTENT}])]"
+# the texts of the article, without the code of the scripts and styles
+TEXT_XPATH = ".//text()[not(ancestor::script) and not(ancestor::style)]"
+
+# the texts to find in the list of cases of the new text format
+NEW_FORMAT_KEYS = ["sembuh", "baharu", "import", "tempatan", "aktif",
+                   "Unit Rawatan Rapi", "pernafasan", "kematian"]
+
+
+def article_elements(tree):
+    """the article content of the page, or the whole page if not found"""
+    return tree.xpath(ARTICLE_XPATH) or [tree]
+
+
+def index_page(html_body):
+    """parse the page once, for the fields and the state table"""
+    return PageIndex(parse_tree(html_body))
+
+
+class PageIndex:
+    """
+    Index of the `ul`, `li` and `tr` tags of the article of a page parsed
+    by `parse_tree`, with their texts computed once to be reused by every
+    field. The whole `tree` is kept for `extract_state_vectors`.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.articles = article_elements(tree)
+        self.ul_tags = [ul_tag for article in self.articles
+                        for ul_tag in article.iter("ul")]
+        # the text of each child of each `ul`, and the NFKD normalised text
+        #   to remove unwanted strings like '\xa0'
+        self.li_texts = []
+        for ul_tag in self.ul_tags:
+            texts = [child.text_content() for child in ul_tag
+                     if isinstance(child.tag, str)]
+            self.li_texts.append(
+                [(text, unicodedata.normalize('NFKD', text)) for text in texts])
+        self.tr_tags = [tr_tag for article in self.articles
+                        for tr_tag in article.iter("tr")]
+        self.tr_texts = [tr_tag.text_content() for tr_tag in self.tr_tags]
+        self._text = None
+        self._case_list = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = "".join(text for article in self.articles
+                                 for text in article.xpath(TEXT_XPATH))
+        return self._text
+
+    def case_matches(self, li_texts):
+        """the number of the cases found in the texts of a `ul`"""
+        return sum(any(key in text for text, _ in li_texts)
+                   for key in NEW_FORMAT_KEYS)
+
+    def case_list(self):
+        """
+        The texts of the list of cases of the new text format: the first
+        `ul` containing all the cases, or else the `ul` containing the
+        most of them (e.g. a case missing on that date). Empty if no `ul`
+        contains any case.
+        """
+        if self._case_list is None:
+            matches = [self.case_matches(li_texts)
+                       for li_texts in self.li_texts]
+            if matches and max(matches) > 0:
+                # the first of the lists with the most matches
+                self._case_list = self.li_texts[matches.index(max(matches))]
+            else:
+                self._case_list = []
+        return self._case_list
+
+    def last_tr(self, txt):
+        """the last `tr` tag containing `txt`"""
+        return [tr_tag for tr_tag, text in zip(self.tr_tags, self.tr_texts)
+                if txt in text][-1]
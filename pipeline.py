@@ -0,0 +1,317 @@
+import argparse
+import glob
+import hashlib
+import inspect
+import json
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from data_store import PROCESSED_DIR, write_table
+from derived import moving_averages, monthly_sum, preprocess_df
+from geo_simplify import (LEVELS, TopologySimplifier, douglas_peucker,
+                          level_path, segment_distances, write_levels)
+from state_table import STATE_TOTAL
+
+ORIG_DIR = "original_data"
+# the intermediate outputs, only read by the other stages
+WORK_DIR = os.path.join(PROCESSED_DIR, "pipeline")
+CACHE_NAME = "cache.json"
+
+# `func(inputs, outputs)` is called with the lists of file paths, and
+#   `helpers` are the other functions whose code is part of the stage
+Stage = namedtuple("Stage", ["name", "func", "inputs", "outputs", "version",
+                             "helpers"], defaults=(1, ()))
+
+
+def write_csv(df, path, **kwargs):
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, **kwargs)
+    os.replace(tmp_path, path)
+
+
+def date_format(dates):
+    """the outputs of `scrape_all` have "YYYY-MM-DD", the old files "%d-%m-%y" """
+    return '%Y-%m-%d' if re.match(r"\d{4}-", str(dates.iloc[0])) \
+        else '%d-%m-%y'
+
+
+def combine(frames):
+    """
+    The frames of the files in order, the dates scraped again in a later
+    file replace the earlier ones.
+    """
+    df = pd.concat(frames)
+    return df[~df.index.duplicated(keep='last')].sort_index()
+
+
+def preprocess_state(df_state):
+    # drop the unwanted columns
+    df_state = df_state.drop(columns=[STATE_TOTAL, 'URL'], errors='ignore')
+    # to remove digits surrounded by parenthesis, and also commas and space
+    df_state = df_state.replace(r"(\(\d+\)|\,*\s*)", '', regex=True)
+    # to change their dtypes to int to make sure they are valid
+    return df_state.set_index('Date').astype(int)
+
+
+def clean_national(inputs, outputs):
+    frames = []
+    for path in inputs:
+        df = pd.read_csv(path)
+        frames.append(preprocess_df(df, date_format(df['Date'])))
+    write_table(combine(frames), outputs[0])
+
+
+def clean_state(inputs, outputs):
+    write_csv(combine([preprocess_state(pd.read_csv(path))
+                       for path in inputs]), outputs[0])
+
+
+def derive_moving_averages(inputs, outputs):
+    df = pd.read_feather(inputs[0]).set_index('Date')
+    write_csv(moving_averages(df), outputs[0])
+    # the state of `derived.append_days` is built again from the new file
+    state_path = os.path.join(os.path.dirname(outputs[0]),
+                              "derived_state.json")
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+
+def derive_monthly_sum(inputs, outputs):
+    df = pd.read_feather(inputs[0]).set_index('Date')
+    write_csv(monthly_sum(df), outputs[0], index=False)
+
+
+def state_monthly(inputs, outputs):
+    df_state = pd.read_csv(inputs[0])
+    df_state.Date = pd.to_datetime(df_state.Date, format='%Y-%m-%d')
+    df_state = df_state.set_index('Date')
+    df_month = df_state.groupby(df_state.index.to_period('M')).sum()
+    df_month.index = df_month.index.to_timestamp()
+    df_month.index.name = 'Date'
+    write_csv(df_month.reset_index(), outputs[0], index=False)
+
+
+def geo_bundle(inputs, outputs):
+    """
+    The MultiPolygon of each state from `states.json`, which lists the
+    boundary lines of `malaysia_orig.geojson` to join, e.g. "jhrocn,jhrmlk"
+    for the lines of Johor with the ocean and Melaka. A line named the
+    other way round, e.g. "mlkjhr", has its points reversed.
+    """
+    states_path, lines_path = inputs
+    with open(states_path, 'r') as f:
+        states_json = json.load(f)
+    with open(lines_path, 'r') as f:
+        lines = {feature['properties']['name']:
+                 feature['geometry']['coordinates']
+                 for feature in json.load(f)['features']}
+
+    features = []
+    for item in states_json:
+        full_coords = []
+        for polygon in item['geometry']['coordinates']:
+            curr_list = []
+            for keys in polygon:
+                for state_key in keys.split(','):
+                    if state_key in lines:
+                        curr_list.extend(lines[state_key])
+                    else:
+                        reversed_key = state_key[3:] + state_key[:3]
+                        curr_list.extend(reversed(lines[reversed_key]))
+                full_coords.append(curr_list)
+        features.append({'type': 'Feature',
+                         'properties': {'id': int(item['id']),
+                                        'name': item['Name']},
+                         'geometry': {'type': 'MultiPolygon',
+                                      'coordinates': [full_coords]}})
+
+    # through pandas as in the notebook, for the same rounding
+    result = pd.DataFrame(features, columns=['type', 'properties', 'geometry'])\
+        .to_json(orient='records')
+    parsed_geojson = {'type': 'FeatureCollection',
+                      'features': json.loads(result)}
+    tmp_path = f"{outputs[0]}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps(parsed_geojson, indent=2))
+    os.replace(tmp_path, outputs[0])
+
+
+def simplify_maps(inputs, outputs):
+    write_levels(inputs[0], os.path.dirname(outputs[0]))
+
+
+def original_paths(prefix, orig_dir=ORIG_DIR):
+    """all the scraped files of the prefix, in the order of their dates"""
+    return sorted(glob.glob(os.path.join(orig_dir, f"{prefix}_*.csv")))
+
+
+def default_stages(orig_dir=ORIG_DIR, processed_dir=PROCESSED_DIR):
+    """
+    The stages of `preprocess.ipynb` and `preprocess_geojson.ipynb`, and
+    the simplified maps of the app.
+    """
+    work_dir = os.path.join(processed_dir, "pipeline")
+    national_path = os.path.join(work_dir, "national.arrow")
+    state_all_path = os.path.join(processed_dir, "state_all.csv")
+    return [
+        Stage("clean_national", clean_national, original_paths("all", orig_dir),
+              [national_path], helpers=(preprocess_df, date_format, combine)),
+        Stage("clean_state_new", clean_state,
+              original_paths("state_new", orig_dir), [state_all_path],
+              helpers=(preprocess_state, combine)),
+        Stage("clean_state_cumu", clean_state,
+              original_paths("state_cumu", orig_dir),
+              [os.path.join(processed_dir, "state_cumu.csv")],
+              helpers=(preprocess_state, combine)),
+        Stage("moving_averages", derive_moving_averages, [national_path],
+              [os.path.join(processed_dir, "cleaned_all.csv")],
+              helpers=(moving_averages,)),
+        Stage("monthly_sum", derive_monthly_sum, [national_path],
+              [os.path.join(processed_dir, "monthly_sum.csv")],
+              helpers=(monthly_sum,)),
+        Stage("state_monthly", state_monthly, [state_all_path],
+              [os.path.join(processed_dir, "state_monthly.csv")]),
+        Stage("geo_bundle", geo_bundle,
+              [os.path.join(orig_dir, "states.json"),
+               os.path.join(orig_dir, "malaysia_orig.geojson")],
+              [os.path.join(processed_dir, "final_geojson.geojson")]),
+        Stage("simple_maps", simplify_maps,
+              [os.path.join(orig_dir,
+                            "malaysia_state_province_boundary.geojson")],
+              [level_path(level, os.path.join(processed_dir, "maps"))
+               for level in LEVELS],
+              helpers=(write_levels, TopologySimplifier, douglas_peucker,
+                       segment_distances)),
+    ]
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stage_key(stage):
+    """hash of the input files, the code of the stage and its version"""
+    digest = hashlib.sha256(f"{stage.name}:{stage.version}".encode())
+    for func in (stage.func,) + tuple(stage.helpers):
+        digest.update(inspect.getsource(func).encode())
+    for path in stage.inputs:
+        digest.update(f"{path}:{file_hash(path)}".encode())
+    return digest.hexdigest()
+
+
+class Pipeline:
+    """
+    Run the stages in the order of their dependencies (a stage depends on
+    the stages writing its inputs), the independent ones at the same time
+    in `max_workers` processes.
+
+    A stage is skipped when the hash of its inputs and code is the same as
+    in the last run and its outputs were not changed since. A stage run
+    again with the same outputs does not run the stages after it, e.g. a
+    new national CSV file does not touch the state tables and the map.
+    """
+
+    def __init__(self, stages, cache_path=os.path.join(WORK_DIR, CACHE_NAME),
+                 max_workers=None):
+        self.stages = stages
+        self.cache_path = cache_path
+        self.max_workers = max_workers
+        self.cache = {}
+        if os.path.exists(cache_path):
+            with open(cache_path, "r") as f:
+                self.cache = json.load(f)
+
+    def dependencies(self, stage):
+        return [other.name for other in self.stages
+                if set(other.outputs) & set(stage.inputs)]
+
+    def is_cached(self, stage, key):
+        record = self.cache.get(stage.name)
+        return record is not None and record["key"] == key \
+            and all(os.path.exists(path) and file_hash(path) == output_hash
+                    for path, output_hash in record["outputs"].items())
+
+    def save_cache(self):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.cache, f, indent=1)
+        os.replace(tmp_path, self.cache_path)
+
+    def finish_stage(self, stage, key):
+        self.cache[stage.name] = {"key": key,
+                                  "outputs": {path: file_hash(path)
+                                              for path in stage.outputs}}
+        # after each stage, to keep the progress of an interrupted run
+        self.save_cache()
+
+    def run(self, force=False):
+        """returns the names of the stages run, the others were skipped"""
+        start_time = time.perf_counter()
+        waiting = {stage.name: stage for stage in self.stages}
+        running = {}
+        done, ran = set(), []
+        pool = None
+        try:
+            while waiting or running:
+                for name, stage in list(waiting.items()):
+                    if not set(self.dependencies(stage)) <= done:
+                        continue
+                    del waiting[name]
+                    key = stage_key(stage)
+                    if not force and self.is_cached(stage, key):
+                        print(f"[INFO] {name} is up to date.")
+                        done.add(name)
+                        continue
+                    for path in stage.outputs:
+                        os.makedirs(os.path.dirname(path) or ".",
+                                    exist_ok=True)
+                    # only started when there is anything to run
+                    pool = pool or ProcessPoolExecutor(self.max_workers)
+                    future = pool.submit(stage.func, stage.inputs,
+                                         stage.outputs)
+                    running[future] = (stage, key, time.perf_counter())
+                if not running:
+                    # the skipped stages may have made others ready
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, key, stage_start = running.pop(future)
+                    future.result()
+                    self.finish_stage(stage, key)
+                    done.add(stage.name)
+                    ran.append(stage.name)
+                    print(f"[INFO] {stage.name} done in "
+                          f"{time.perf_counter() - stage_start:.2f} seconds.")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        total_time = time.perf_counter() - start_time
+        print(f"[INFO] {len(ran)} of {len(self.stages)} stages run in "
+              f"{total_time:.2f} seconds.")
+        return ran
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Preprocess the scraped data in `original_data` into "
+                    "`processed_data`, only running the stages whose "
+                    "inputs have changed.")
+    parser.add_argument("--force", action="store_true",
+                        help="run all the stages")
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    Pipeline(default_stages(), max_workers=args.max_workers)\
+        .run(force=args.force)
@@ -0,0 +1,188 @@
+import argparse
+import multiprocessing
+import random
+import socket
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from page_cache import PageCache
+from scrape_covid19_msia import Scraper, special_urls
+
+# the recorded articles, in the format of `PageCache`
+CORPUS_DIR = "bench_corpus"
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+
+def record_corpus(start_date, end_date, corpus_dir=CORPUS_DIR):
+    """
+    Download the articles from `start_date` to `end_date` and every URL
+    in `special_urls` into the corpus (skipping those already recorded).
+    """
+    corpus = PageCache(corpus_dir)
+    scraper = Scraper(start_date, end_date, page_cache=corpus)
+    dates = [start_date + timedelta(days=i) for i in range(scraper.total_days)]
+    urls = [scraper.get_url(dt) for dt in dates]
+    urls += [url for url in special_urls if url not in urls]
+
+    for i, url in enumerate(urls):
+        print(f"[INFO] Recording {url} ({i + 1}/{len(urls)}) ...")
+        try:
+            scraper.download(url)
+        except Exception as e:
+            print(f"[WARNING] Not recorded: {e}")
+    print(f"[INFO] {len(urls)} pages recorded in {corpus_dir}.")
+
+
+def load_corpus(corpus_dir=CORPUS_DIR):
+    """URL path -> HTML body of all the recorded articles"""
+    corpus = PageCache(corpus_dir, offline=True)
+    pages = {}
+    for url in corpus.urls():
+        entry = corpus.get(url)
+        if entry is not None:
+            pages[urlsplit(url).path] = entry["body"]
+    return pages
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    # set on the class by `serve`
+    pages = {}
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+
+    def do_GET(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if random.random() < self.error_rate:
+            # like an overloaded server, to exercise the retries
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = self.pages.get(urlsplit(self.path).path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # no log for every request
+        pass
+
+
+def serve(corpus_dir=CORPUS_DIR, host=HOST, port=PORT, latency=0.0,
+          jitter=0.0, error_rate=0.0, seed=None):
+    """
+    Serve the corpus at the same paths as kpkesihatan.com, waiting
+    `latency` plus up to `jitter` seconds before each response, and
+    answering 503 to a fraction `error_rate` of the requests.
+    """
+    random.seed(seed)
+    ReplayHandler.pages = load_corpus(corpus_dir)
+    ReplayHandler.latency = latency
+    ReplayHandler.jitter = jitter
+    ReplayHandler.error_rate = error_rate
+    server = ThreadingHTTPServer((host, port), ReplayHandler)
+    server.daemon_threads = True
+    print(f"[INFO] Serving {len(ReplayHandler.pages)} pages "
+          f"at http://{host}:{port}/")
+    server.serve_forever()
+
+
+class ReplayServer:
+    """
+    The replay server running in another process (to keep its CPU time
+    out of the measurements), as `with ReplayServer(...) as server: ...`.
+    """
+
+    def __init__(self, corpus_dir=CORPUS_DIR, host=HOST, port=PORT,
+                 latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.host = host
+        self.port = port
+        self.kwargs = dict(corpus_dir=corpus_dir, host=host, port=port,
+                           latency=latency, jitter=jitter,
+                           error_rate=error_rate, seed=seed)
+        self.process = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def local_url(self, url):
+        """the URL of the same article on the replay server"""
+        parts = urlsplit(url)
+        return f"{self.base_url}{parts.path}"
+
+    def start(self, timeout=30):
+        self.process = multiprocessing.Process(target=serve,
+                                               kwargs=self.kwargs,
+                                               daemon=True)
+        self.process.start()
+        # wait until the corpus is loaded and the port is open
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection((self.host, self.port), 0.5):
+                    return self
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        raise Exception("[ERROR] The replay server did not start")
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class ReplayResolver:
+    """
+    Takes the place of `URLResolver` to send the scrapers to the replay
+    server instead of kpkesihatan.com.
+    """
+
+    def __init__(self, server):
+        self.server = server
+
+    def is_missing(self, dt):
+        return False
+
+    def resolve(self, dt, preferred_url=None):
+        return self.server.local_url(preferred_url)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Serve the recorded articles locally.")
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="up to these extra seconds of random delay")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of the requests answered with 503")
+    args = parser.parse_args()
+    serve(args.corpus, port=args.port, latency=args.latency,
+          jitter=args.jitter, error_rate=args.error_rate)
@@ -0,0 +1,80 @@
+import math
+from array import array
+
+import numpy as np
+import pandas as pd
+
+
+class RowBuffer:
+    """
+    Columnar accumulator for the scraped rows.
+
+    Each row is appended into one typed array per column instead of
+    calling `DataFrame.append` (which copies the whole DataFrame every
+    time), and a single DataFrame is only created by `to_frame`.
+
+    The type of each column is one of:
+        - 'int': nullable integers (NaN or None is stored as missing)
+        - 'date': datetimes, stored as int64 nanoseconds
+        - 'object': anything else, e.g. the URL or raw table cells
+    """
+
+    def __init__(self, column_types):
+        self.column_types = dict(column_types)
+        self.clear()
+
+    def clear(self):
+        self.size = 0
+        self.values = {}
+        self.masks = {}
+        for col, col_type in self.column_types.items():
+            assert col_type in ('int', 'date', 'object')
+            if col_type == 'object':
+                self.values[col] = []
+            else:
+                self.values[col] = array('q')
+            if col_type == 'int':
+                # 1 for missing values
+                self.masks[col] = bytearray()
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def is_missing(value):
+        return value is None or (isinstance(value, float) and math.isnan(value))
+
+    def append(self, record):
+        """append one row, the columns not found in `record` are missing"""
+        for col, col_type in self.column_types.items():
+            value = record.get(col)
+            if col_type == 'int':
+                missing = self.is_missing(value)
+                self.values[col].append(0 if missing else int(value))
+                self.masks[col].append(missing)
+            elif col_type == 'date':
+                self.values[col].append(pd.Timestamp(value).value)
+            else:
+                self.values[col].append(value)
+        self.size += 1
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def to_frame(self):
+        data = {}
+        for col, col_type in self.column_types.items():
+            if col_type == 'int':
+                values = np.frombuffer(self.values[col], dtype=np.int64).copy()
+                mask = np.frombuffer(self.masks[col], dtype=bool).copy()
+                if mask.any():
+                    data[col] = pd.arrays.IntegerArray(values, mask)
+                else:
+                    data[col] = values
+            elif col_type == 'date':
+                data[col] = np.frombuffer(self.values[col], dtype=np.int64)\
+                    .astype('datetime64[ns]')
+            else:
+                data[col] = pd.array(self.values[col], dtype=object)
+        return pd.DataFrame(data, columns=list(self.column_types))
@@ -7,13 +7,24 @@ import unicodedata
 from datetime import datetime, timedelta
 
 import numpy as np
-import pandas as pd
 import requests
 from aiohttp import ClientSession
 from bs4 import BeautifulSoup
 from IPython.display import display
 
+from checkpoint import Checkpoint
+from error_journal import ErrorJournal
+from extraction import OldFormatExtractor
+from http_session import Prefetcher, create_session
+from metrics import Metrics
+from page_index import index_page
+from row_buffer import RowBuffer
+from state_table import extract_state_vectors, parse_tree, state_names
+from validation import Validator, print_violations
+
 CSV_DIR = "original_data"
+# the per-date JSON lines and the Prometheus snapshot of `scrape_all`
+METRICS_DIR = "metrics"
 
 # translate the months from English to Malay
 month_translation = {"January": "januari",
@@ -43,6 +54,17 @@ column_names = ["Date", "Recovered", "Cumulative Recovered", "Imported Case",
                 "Local Case", "Active Case", "New Case",
                 "Cumulative Case", "ICU", "Ventilator",
                 "Death", "Cumulative Death", "URL"]
+# the types of the columns for `RowBuffer`
+column_types = {col: 'int' for col in column_names}
+column_types.update({"Date": 'date', "URL": 'object'})
+
+state_column_names = ['State', 'New Case', 'Cumulative Case']
+# one row per date for each of the new cases and the cumulative cases
+state_table_column_types = {'Date': 'date'}
+state_table_column_types.update({name: 'int' for name in state_names})
+state_table_column_types['URL'] = 'object'
+state_column_types = {'State': 'object', 'New Case': 'int',
+                      'Cumulative Case': 'int', 'Date': 'date'}
 
 case_name_mapping = {'(pulih|sembuh)': "Recovered",
                      "kumulatif kes (yang telah pulih|sembuh)": "Cumulative Recovered",
@@ -58,6 +80,11 @@ case_name_mapping = {'(pulih|sembuh)': "Recovered",
                      "tempatan": "Local Case", "aktif": "Active Case",
                      "kematian": "Death", "kumulatif_kematian": "Cumulative Death"}
 
+# compiled once to be shared by all the pages of the old text format
+old_format_extractor = OldFormatExtractor(cases_to_extract_old)
+# saved with the extraction errors, increase it when the extraction changes
+PARSER_VERSION = 2
+
 # the default format of the URL used by the website
 default_url = "https://kpkesihatan.com/{format1}/kenyataan-akhbar-kpk-{format2}-situasi-semasa-jangkitan-penyakit-coronavirus-2019-covid-19-di-malaysia/"
 
@@ -74,16 +101,39 @@ special_urls = ["https://kpkesihatan.com/2020/04/16/kenyataan-akhbar-16-april-20
                 "https://kpkesihatan.com/2020/07/16/kenyataan-akhbar-kkm-16-julai-2020-situasi-semasa-jangkitan-penyakit-coronavirus-2019-covid-19-di-malaysia/",
                 "https://kpkesihatan.com/2020/07/26/kenyataan-akhbar-kementerian-kesihatan-malaysia-situasi-semasa-jangkitan-penyakit-coronavirus-2019-covid-19-di-malaysia/",
                 "https://kpkesihatan.com/2020/12/10/kenyataan-akhbar-kpk-9-disember-2020-situasi-semasa-jangkitan-penyakit-coronavirus-2019-covid-19-di-malaysia-2/"]
+# to look up the special URLs without scanning the lists
+special_url_dict = dict(zip(special_dt, special_urls))
 
 
 class Scraper:
-    def __init__(self, start_date, end_date):
+    def __init__(self, start_date, end_date, page_cache=None, url_resolver=None,
+                 session=None, prefetch=0, metrics=None, error_journal=None):
         assert isinstance(start_date, datetime)
         assert isinstance(end_date, datetime)
 
         self.start_date = start_date
         self.end_date = end_date
 
+        # pass `PageCache()` to avoid downloading the same articles again
+        self.page_cache = page_cache
+        # pass `URLResolver()` to find the URLs from the archive of the site
+        #  instead of only `default_url` and `special_urls`
+        self.url_resolver = url_resolver
+        # shared by all the downloads to reuse the connections,
+        #  created when first needed
+        self.session = session
+        # the number of dates to download ahead in other threads, 0 to
+        #  download each page only when it is scraped
+        self.prefetch = prefetch
+        self.prefetcher = Prefetcher(self.download, ahead=prefetch) \
+            if prefetch else None
+        # durations of the stages and counters of the fallbacks taken
+        self.metrics = metrics or Metrics()
+        # the fields not found, saved once at the end of a run
+        self.error_journal = error_journal or ErrorJournal()
+        # checks the consistency of the rows before saving them
+        self.validator = Validator()
+
         self.start_date_dict = self.create_date_dict(self.start_date)
         self.end_date_dict = self.create_date_dict(self.end_date)
         # inclusive of final date
@@ -99,6 +149,8 @@ class Scraper:
         # initialize to keep track of the record of the
         #   cumulative death of the previous day
         self.prev_cumu_death = None
+        # whether the last page had no new death and took `prev_cumu_death`
+        self.cumu_death_carried = False
 
     @staticmethod
     def create_datetime(day, month, year):
@@ -120,91 +172,103 @@ class Scraper:
         date_dict = self.create_date_dict(data_datetime)
         return data_datetime, date_dict
 
+    def get_url(self, dt):
+        """
+        The URL of the article of the date, or None if the date is known
+        to have no article (the negative cache of `url_resolver`), to be
+        reported by `fetch_page` without any request.
+        """
+        known_url = special_url_dict.get(
+            dt, default_url.format(**self.create_date_dict(dt)))
+        if self.url_resolver is not None:
+            # the known URL is taken if there are several articles on the date
+            url = self.url_resolver.resolve(dt, preferred_url=known_url)
+            if url:
+                return url
+            if self.url_resolver.is_missing(dt):
+                return None
+        # not in the archive yet, e.g. published after the last crawl, fall
+        #   back to the known URLs (a 404 is raised when the page is fetched)
+        return known_url
+
+    @staticmethod
+    def missing_article(dt):
+        return Exception(f"[ERROR] No article on {dt.date()} in the archive, "
+                         "not requested")
+
     def setup_current_url(self, day_number):
         print(f"[INFO] Scraping data for {self.current_date.date()} "
               f"({day_number + 1}/{self.total_days}) ...")
         # print(self.current_url)
-        if self.current_date in special_dt:
-            self.current_url = special_urls[special_dt.index(
-                self.current_date)]
-        else:
-            self.current_url = default_url.format(**self.current_date_dict)
-
-    def get_matched_number(self, txt_found, numbers_found,
-                           text_pos='first', number_pos='first',
-                           verbose=0):
-
-        # text_pos & number_pos are the locating positions to find the nearest digits
-        assert text_pos in ('first', 'end')
-        assert number_pos in ('first', 'end')
-
-        distance_list = []
-
-        text_span_idx = 0 if text_pos == 'first' else 1
-        number_span_idx = 0 if number_pos == 'first' else 1
-
-        for number in numbers_found:
-            distance = abs(txt_found.span()[
-                           text_span_idx] - number.span()[number_span_idx])
-
-            distance_list.append(distance)
-
-        # find the minimum distance to find the closest digit
-        min_dist = min(distance_list)
-        min_index = distance_list.index(min_dist)
+        with self.metrics.stage("url"):
+            self.current_url = self.get_url(self.current_date)
+            if self.prefetcher is not None:
+                self.prefetch_ahead()
+
+    def prefetch_ahead(self):
+        """start downloading the pages from the current date onwards"""
+        self.get_session()
+        urls = []
+        for i in range(self.prefetch + 1):
+            dt = self.current_date + timedelta(days=i)
+            if dt > self.end_date:
+                break
+            try:
+                url = self.get_url(dt)
+            except Exception:
+                # the error is raised when the date is scraped
+                break
+            # the dates without any article are not requested
+            if url is not None:
+                urls.append(url)
+        self.prefetcher.submit(urls)
+
+    def close_prefetch(self):
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+
+    def get_matched_number(self, page, sentence, verbose=0):
         if self.current_txt == 'jumlah kes positif':
             # skipping once to get the correct value for cumulative
-            min_index += 1
-        matched_number = int(numbers_found[min_index].group())
+            skip = 1
+        else:
+            skip = 0
+        matched_number = old_format_extractor.nearest_number(
+            page, sentence, skip=skip)
 
         if verbose:
-            print(f'Numbers found so far: \
-                {[number.group() for number in numbers_found[:len(distance_list)]]}')
-            print(f'Distance list: {distance_list}\n')
+            numbers_found = [page.number(idx) for idx in sentence.number_idx]
+            print(f'Numbers found so far: {numbers_found}')
 
         return matched_number
 
-    def find_text_and_numbers(self, txt, all_text):
-        if self.current_txt == 'Unit Rawatan Rapi':
-            # to avoid taking the numbers for the 'pernafasan'
-            regex_text = rf"([^.,\n]*(?:Unit Rawatan Rapi))"
-        else:
-            regex_text = rf"([^.,\n]*{txt}[^.,]*[,.]+)"
-
+    def find_text_and_numbers(self, txt, page):
+        """
+        Find the sentence of `txt` in the scanned page. Returns None if
+        not found, or if 'tiada' is found without any digit.
+        """
         if self.current_txt == 'kes kematian':
-            sentence_list = list(re.finditer(regex_text, all_text))
-
             # to avoid sentence with strings like "ke-1234"
-            first_sentence = sentence_list[0].group()
-            if re.search(r'ke-\d+', first_sentence):
-                # take the next sentence instead
-                sentence_idx = 1
-            else:
-                sentence_idx = 0
-            sentenceObj = sentence_list[sentence_idx]
+            sentence = old_format_extractor.find_death_sentence(page, txt)
         else:
-            # straight away take the first found sentence using `re.search`
-            sentenceObj = re.search(regex_text, all_text)
+            # straight away take the first found sentence
+            sentence = old_format_extractor.find_sentence(page, txt)
 
-        if not sentenceObj:
+        if not sentence:
             # raise Exception(f"[ERROR] {txt} not found!")
             print(f"[ERROR] {txt} not found! Set to 0 for now.")
-            print("Saving to 'txt_error.txt' to check later.\n")
-            error_text = f"{txt} - {self.current_date.date()}\n"
-            with open('processed_data//txt_error.txt', 'a') as f:
-                f.write(error_text)
-            return None, None
-        else:
-            # get the proper `span` (location) of the text in the sentence to
-            #  calculate the correct distance with numbers in the sentence
-            sentence = sentenceObj.group()
-            txt_found = re.search(txt, sentence)
-            numbers_found = list(re.finditer('\d+', sentence))
+            self.metrics.count("field_not_found")
+            print("Saving to the error journal to check later.\n")
+            self.error_journal.record(self.current_date, txt, PARSER_VERSION,
+                                      url=self.current_url,
+                                      message="not found")
+            return None
 
-            if 'tiada' in sentence.lower() and not numbers_found:
-                return None, None
+        if 'tiada' in page.sentence_text(sentence).lower() \
+                and not len(sentence.number_idx):
+            return None
 
-            return txt_found, numbers_found
+        return sentence
 
     @staticmethod
     def replace_comma_sep_digits(matchObj):
@@ -212,14 +276,13 @@ class Scraper:
         new_number = comma_sep_digits.replace(',', '').replace(' ', '')
         return new_number
 
-    def find_number_new(self, soup, txt, number_idx):
-        all_case_ul = soup.find_all("ul")[1]
-        for li_tag in all_case_ul:
-            if txt in li_tag.text:
-                sentence = unicodedata.normalize('NFKD', li_tag.text)
+    def find_number_new(self, index, txt, number_idx):
+        for li_text, sentence in index.case_list():
+            if txt in li_text:
 
                 if 'tiada' in sentence.lower():
                     # 0 case found
+                    self.metrics.count("zero_fill")
                     return 0
 
                 sentence_comma_removed = re.sub(
@@ -229,29 +292,75 @@ class Scraper:
                 return matched_number
         return 'error'
 
-    def get_soup(self):
-        r = requests.get(self.current_url)
+    def get_session(self):
+        if self.session is None:
+            self.session = create_session(pool_size=max(10, self.prefetch))
+            self.session.hooks["response"].append(self.count_response)
+        return self.session
+
+    def count_response(self, r, *args, **kwargs):
+        """response hook of the session to count the retries"""
+        retries = getattr(r.raw, "retries", None)
+        if retries is not None and retries.history:
+            self.metrics.count("http_retries", len(retries.history))
+        self.metrics.count(f"http_{r.status_code}")
+
+    def download(self, url):
+        """get the HTML body of the URL, from the page cache if available"""
+        session = self.get_session()
+        if self.page_cache is not None:
+            return self.page_cache.fetch(url, session=session)
+        r = session.get(url)
         if r.status_code == 404:
             raise Exception("Error 404 accessing page!!")
-        soup = BeautifulSoup(r.content, "lxml")
-        return soup
-
-    def scrape_data(self, verbose=0):
-        soup = self.get_soup()
-        all_text = soup.get_text()
-        # Remove all COVID-19 words to avoid getting number 19 accidentally
-        all_text = all_text.replace('COVID-19', '')\
-            .replace('covid19', '')
-        # to remove unwanted strings like '\xa0'
-        all_text = unicodedata.normalize('NFKD', all_text)
-        all_text = re.sub(
-            r"\d+,\s*\d+", self.replace_comma_sep_digits, all_text)
+        r.raise_for_status()
+        return r.content
+
+    def fetch_page(self, url=None):
+        """the HTML body of the URL, downloaded ahead if prefetching"""
+        url = url or self.current_url
+        if url is None:
+            # known to be missing, not worth a request answered by a 404
+            raise self.missing_article(self.current_date)
+        if self.prefetcher is not None:
+            return self.prefetcher.get(url)
+        return self.download(url)
+
+    def get_index(self):
+        """the index of the current page, parsed once"""
+        return index_page(self.fetch_page())
+
+    def extract_table(self, tree):
+        """
+        The new cases and the cumulative cases of the states, in the order
+        of `state_names`, from the page already parsed by `parse_tree`.
+        """
+        return extract_state_vectors(tree)
+
+    def state_rows(self, new_cases, cumu_cases):
+        """the rows of the state tables of the current date, as int counts"""
+        rows = []
+        for values in (new_cases, cumu_cases):
+            row = dict(zip(state_names, values.tolist()))
+            row['Date'] = self.current_date
+            row['URL'] = self.current_url
+            rows.append(row)
+        return rows
+
+    def scrape_data(self, verbose=0, index=None):
+        index = index or self.get_index()
+        all_text = old_format_extractor.normalize(index.text)
 
         if self.current_date == datetime(2020, 10, 1):
             all_text = all_text.replace(' 5 angka, ', ' ')
+        # locate all the delimiters and numbers once for all the fields
+        page = old_format_extractor.scan(all_text)
 
         data_dict = {}
         txt_to_skip = []
+        self.cumu_death_carried = False
+        # the errors of the date are recorded again if still not found
+        self.error_journal.clear_date(self.current_date, PARSER_VERSION)
 
         for txt in cases_to_extract_old:
             self.current_txt = txt
@@ -278,6 +387,7 @@ class Scraper:
                 if self.current_date == datetime(2020, 11, 2)\
                         and txt == "kumulatif kes (yang telah pulih|sembuh)":
                     matched_number = 23120
+                    self.metrics.count("fixed_value")
                     correct_col_name = case_name_mapping[txt]
                     data_dict[correct_col_name] = matched_number
                     continue
@@ -286,12 +396,11 @@ class Scraper:
                     txt_to_search = "JUMLAH KESELURUHAN"
                     # the correct index for the number
                     number_idx = 1 if txt == "kes baharu" else 2
-                    # find all table rows
-                    sentence_tag = [tags for tags in soup.find_all(
-                        "tr") if txt_to_search in tags.text][-1]
+                    # find the last table row with the text
+                    sentence_tag = index.last_tr(txt_to_search)
                     # find the table data with the correct index
-                    matched_number_str = sentence_tag.find_all("td")[
-                        number_idx].text
+                    matched_number_str = list(sentence_tag.iter("td"))[
+                        number_idx].text_content()
                     # replace any comma separating the digits
                     matched_number_str = matched_number_str.replace(',', '')\
                         .replace(' ', '')
@@ -299,33 +408,36 @@ class Scraper:
                     matched_number_str = re.sub(
                         r'\(.+\)', ' ', matched_number_str)
                 else:
-                    txt_found, numbers_found = self.find_text_and_numbers(
-                        txt, all_text)
+                    sentence = self.find_text_and_numbers(txt, page)
 
                 if txt in ('kes baharu', 'jumlah kes positif'):
                     matched_number = int(matched_number_str)
-                elif not txt_found and not numbers_found:
+                elif not sentence:
                     print("[INFO] 'tiada' and no digit found "
                           f"in the sentence with '{txt}'")
 
                     matched_number = 0
+                    self.metrics.count("zero_fill")
 
                     if txt == 'kes kematian':
                         txt_to_skip.append('kumulatif kes kematian')
                         correct_col_name = case_name_mapping['kumulatif kes kematian']
                         # to avoid issue with not obtaining the attribute yet
                         data_dict[correct_col_name] = self.prev_cumu_death or 0
+                        self.cumu_death_carried = True
+                        self.metrics.count("cumu_death_carried")
 
                     elif txt == 'pernafasan':
                         # set to same with ICU number
                         matched_number = data_dict['ICU']
+                        self.metrics.count("ventilator_from_icu")
 
-                elif txt_found and not numbers_found:
+                elif not len(sentence.number_idx):
                     print("[WARNING] 'tiada' is not found but no digit "
                           f"is found in the sentence with '{txt}'\n")
                     matched_number = 0
                 else:
-                    matched_number = self.get_matched_number(txt_found, numbers_found,
+                    matched_number = self.get_matched_number(page, sentence,
                                                              verbose=verbose)
 
                 # save the cumulative death to use it for the next row
@@ -333,8 +445,8 @@ class Scraper:
                 if txt == 'kumulatif kes kematian':
                     self.prev_cumu_death = matched_number
 
-                if verbose:
-                    print(f"Text found: {txt_found}\n")
+                if verbose and sentence:
+                    print(f"Text found: {page.sentence_text(sentence)}\n")
 
             except Exception as e:
                 print(f"\nError obtaining {txt} !!")
@@ -348,10 +460,12 @@ class Scraper:
 
         return data_dict
 
-    def scrape_data_new(self, verbose=0):
-        soup = self.get_soup()
+    def scrape_data_new(self, verbose=0, index=None):
+        index = index or self.get_index()
 
         data_dict = {}
+        # the errors of the date are recorded again if still not found
+        self.error_journal.clear_date(self.current_date, PARSER_VERSION)
 
         for txt in cases_to_extract_new:
             if verbose:
@@ -363,11 +477,11 @@ class Scraper:
                     # get the name to search: one of ('sembuh', 'baharu', 'kematian')
                     txt_to_search = txt.split("_")[1]
                     matched_number = self.find_number_new(
-                        soup, txt_to_search, number_idx)
+                        index, txt_to_search, number_idx)
                 else:
                     number_idx = 0
                     matched_number = self.find_number_new(
-                        soup, txt, number_idx)
+                        index, txt, number_idx)
                     # li_text_list = [li_tag.text for li_tag in all_case_ul if txt in li_tag.text]
             except Exception as e:
                 print(f"\nError obtaining {txt} !!")
@@ -383,14 +497,129 @@ class Scraper:
 
         return data_dict
 
-    def scrape_all(self, verbose=0):
-        df = pd.DataFrame(columns=column_names)
+    def restore_checkpoint(self, checkpoint):
+        """restore the state saved in the checkpoint, returns the days done"""
+        state = checkpoint.load()
+        if state is None:
+            checkpoint.reset()
+            return 0
+
+        last_good_date = datetime.strptime(state["last_good_date"], '%Y-%m-%d')
+        self.current_date = last_good_date + timedelta(days=1)
+        self.current_date_dict = self.create_date_dict(self.current_date)
+        self.prev_cumu_death = state["prev_cumu_death"]
+        self.new_format_flag = state["new_format_flag"]
+        self.validator.set_state(state.get("validator"))
+        print(f"[INFO] Resuming from {self.current_date.date()} "
+              f"({checkpoint.rows} rows already scraped) ...")
+        return (self.current_date - self.start_date).days
+
+    def snapshot_state(self):
+        """the state needed to resume after the current date"""
+        return dict(start_date=str(self.start_date.date()),
+                    end_date=str(self.end_date.date()),
+                    last_good_date=str(self.current_date.date()),
+                    prev_cumu_death=self.prev_cumu_death,
+                    new_format_flag=self.new_format_flag)
+
+    def validate_rows(self, buffers, state=None):
+        """
+        Check the rows not saved yet (national data first, then the state
+        tables if any), and keep the state of the validator to resume.
+        """
+        frames = [buffer.to_frame() for buffer in buffers.values()]
+        violations = self.validator.validate(*frames)
+        print_violations(violations)
+        for v in violations:
+            self.error_journal.record(
+                v.date, v.check, PARSER_VERSION,
+                message=f"expected {v.expected}, found {v.actual}")
+        if state is not None:
+            state["validator"] = self.validator.get_state()
+
+    @staticmethod
+    def save_checkpoint(checkpoint, buffers, state):
+        """write the buffered rows to the partial outputs and save the state"""
+        for path, buffer in buffers.items():
+            if len(buffer):
+                checkpoint.append(buffer.to_frame(), path)
+                buffer.clear()
+        checkpoint.save(**state)
+
+    def scrape_page(self, verbose=0, with_states=False):
+        """
+        Parse the current page once to get the national data, and the
+        rows of the state table if `with_states`.
+        """
+        with self.metrics.stage("network"):
+            html_body = self.fetch_page()
+        self.metrics.count("page_bytes", len(html_body))
+        with self.metrics.stage("parse"):
+            # once for the fields and the state table
+            index = index_page(html_body)
+
+        with self.metrics.stage("fields"):
+            if self.new_format_flag:
+                # using new text scraping format method
+                data_dict = self.scrape_data_new(verbose=verbose, index=index)
+            else:
+                # still in old text format, scrape using old method
+                data_dict = self.scrape_data(verbose=verbose, index=index)
+        data_dict["Date"] = self.current_date
+        data_dict["URL"] = self.current_url
+
+        if not with_states:
+            return data_dict, None, None
+        with self.metrics.stage("table"):
+            # from the tree of the fields, without parsing the page again
+            state_new, state_cumu = self.state_rows(
+                *self.extract_table(index.tree))
+        return data_dict, state_new, state_cumu
+
+    def scrape_all(self, verbose=0, resume=True, checkpoint_every=10,
+                   with_states=False):
+        """
+        Scrape the national data into `all_<start>_<end>.csv`. With
+        `with_states=True`, the state tables are also extracted from the
+        same parsed pages into `state_new_<start>_<end>.csv` and
+        `state_cumu_<start>_<end>.csv`, so each page is only downloaded
+        and parsed once. The time spent in each stage is saved in
+        `METRICS_DIR` unless other paths are given to `Metrics`.
+        """
+        date_range = f"{self.start_date.date()}_{self.end_date.date()}"
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        if self.metrics.jsonl_path is None:
+            self.metrics.jsonl_path = os.path.join(
+                METRICS_DIR, f"metrics_{date_range}.jsonl")
+        if self.metrics.prom_path is None:
+            self.metrics.prom_path = os.path.join(
+                METRICS_DIR, f"metrics_{date_range}.prom")
+        output_path = os.path.join(CSV_DIR, f"all_{date_range}.csv")
+        buffers = {output_path: RowBuffer(column_types)}
+        if with_states:
+            state_new_path = os.path.join(CSV_DIR, f"state_new_{date_range}.csv")
+            state_cumu_path = os.path.join(CSV_DIR, f"state_cumu_{date_range}.csv")
+            buffers[state_new_path] = RowBuffer(state_table_column_types)
+            buffers[state_cumu_path] = RowBuffer(state_table_column_types)
+
+        checkpoint = Checkpoint(output_path, list(buffers)[1:])
+        if resume:
+            days_done = self.restore_checkpoint(checkpoint)
+        else:
+            checkpoint.reset()
+            days_done = 0
+
+        state = None
 
         start_time = time.time()
-        for day_number in range(self.total_days):
-            self.setup_current_url(day_number)
+        for day_number in range(days_done, self.total_days):
+            self.metrics.start_date(self.current_date)
 
             try:
+                # inside the `try` to save the checkpoint if resolving the
+                #   URL fails, e.g. while crawling the archive
+                self.setup_current_url(day_number)
+
                 # This were used to detect which date the new text format started
                 # if not self.new_format_flag:
                 #     # still in old text format, scrape using old method
@@ -410,39 +639,57 @@ class Scraper:
                           f"starting from {self.current_date.date()}.")
                     self.new_format_flag = True
 
-                if self.new_format_flag:
-                    # using new text scraping format method
-                    data_dict = self.scrape_data_new(verbose=verbose)
-                else:
-                    # still in old text format, scrape using old method
-                    data_dict = self.scrape_data(verbose=verbose)
-
+                data_dict, state_new, state_cumu = self.scrape_page(
+                    verbose=verbose, with_states=with_states)
                 # print(data_dict)
 
-                # df.loc[current_date] = data_dict
-                data_dict["Date"] = self.current_date
-                data_dict["URL"] = self.current_url
-                df = df.append(data_dict, ignore_index=True)
+                buffers[output_path].append(data_dict)
+                if with_states:
+                    buffers[state_new_path].append(state_new)
+                    buffers[state_cumu_path].append(state_cumu)
+                state = self.snapshot_state()
+                if len(buffers[output_path]) >= checkpoint_every:
+                    self.validate_rows(buffers, state)
+                    with self.metrics.stage("write"):
+                        self.save_checkpoint(checkpoint, buffers, state)
+                self.metrics.end_date("ok", url=self.current_url)
 
                 self.current_date += timedelta(days=1)
                 self.current_date_dict = self.create_date_dict(
                     self.current_date)
             except:
-                # save a csv file to check
-                filename = f"{self.start_date.date()}_{self.current_date.date()}.csv"
-                df.to_csv(os.path.join(
-                    CSV_DIR, filename), index=False)
+                self.close_prefetch()
+                self.metrics.end_date("error", url=self.current_url)
+                # keep the dates completed so far to resume from here
+                if state is not None:
+                    self.validate_rows(buffers, state)
+                    self.save_checkpoint(checkpoint, buffers, state)
+                self.metrics.finish()
+                self.error_journal.flush()
                 print("[ERROR] Problem with", self.current_url)
+                print(f"[INFO] {checkpoint.rows} rows saved in "
+                      f"{checkpoint.part_path}, run again to resume.")
                 raise Exception(f"Error on {self.current_date.date()}")
 
-        filename = f"{self.start_date.date()}_{self.end_date.date()}.csv"
-        df.to_csv(os.path.join(CSV_DIR, filename), index=False)
+        self.close_prefetch()
+        if state is not None:
+            self.validate_rows(buffers, state)
+        with self.metrics.stage("write"):
+            if state is not None:
+                self.save_checkpoint(checkpoint, buffers, state)
+            checkpoint.finish()
+        self.metrics.finish()
+        self.error_journal.flush()
         print("\n[INFO] CONGRATS! You have scraped until the end date!")
         total_time = time.time() - start_time
         # 285 seconds
         print(f"Total time elapsed: {total_time:.2f} seconds")
+        print(f"[INFO] Time per stage: {self.metrics.summary()}")
 
     def tables_to_csv(self):
+        self.df_all_new = self.new_buffer.to_frame().set_index('Date')
+        self.df_all_cumu = self.cumu_buffer.to_frame().set_index('Date')
+
         filename = (f"state_new_{self.start_date.date()}"
                     f"_{self.end_date.date()}.csv")
         self.df_all_new.to_csv(os.path.join(CSV_DIR, filename))
@@ -451,75 +698,37 @@ class Scraper:
                     f"_{self.end_date.date()}.csv")
         self.df_all_cumu.to_csv(os.path.join(CSV_DIR, filename))
 
-    def extract_table(self, html_body):
-        return pd.read_html(html_body,
-                            match='JUMLAH KESELURUHAN',
-                            header=0)[-1]
-
     def scrape_table(self):
         start_time = time.time()
-        self.df_all_new = pd.DataFrame()
-        self.df_all_cumu = pd.DataFrame()
-
-        # def replace_unk_name(matchObj):
-        #     # a function used for `re.sub()` to rename column names
-        #     return ' '.join(['WP', matchObj.group(3)]).strip()
+        self.new_buffer = RowBuffer(state_table_column_types)
+        self.cumu_buffer = RowBuffer(state_table_column_types)
 
         for day_number in range(self.total_days):
             self.setup_current_url(day_number)
 
-            r = requests.get(self.current_url)
-            if r.status_code == 404:
-                raise Exception("Error 404 accessing page!!")
-
             try:
-                # extract the last table containing JUMLAH KESELURUHAN to be exact
-                df = self.extract_table(r.content)
-
-                # Setup the df into the proper format with one row for each date
-                df = df.set_index('NEGERI')
-                df = df.T
-                df['Date'] = self.current_date
-                df["URL"] = self.current_url
-                df.set_index('Date', inplace=True)
-
-                # to fix weird column names containing "\xa0"
-                #  or extra spaces in between "WP" and state name
-                # new_col_names = []
-                # for col_name in df.columns:
-                #     corrected_name = re.sub(r'(WP|W.P.)(\xa0|[\s]+)(\w+)',
-                #                             replace_unk_name,
-                #                             col_name)
-                #     new_col_names.append(corrected_name)
-                # df.columns = new_col_names
-
-                # simpler method
-                df.columns = df.columns.str.replace(
-                    '\xa0', ' ').str.replace('.', '', regex=False)
-
-                # save the order of the column names to make sure they align
-                if day_number == 0:
-                    col_name_order = df.columns.values
-
-                df = df[col_name_order]
-
-                df_new_case = df.iloc[[0], :]
-                df_cumul_case = df.iloc[[1], :]
-
-                self.df_all_new = self.df_all_new.append(df_new_case)
-                self.df_all_cumu = self.df_all_cumu.append(df_cumul_case)
+                # inside the `try` to close the prefetcher on a download error
+                html_body = self.fetch_page()
+                # extract the last table containing JUMLAH KESELURUHAN to be exact,
+                #  always in the order of `state_names`
+                state_new, state_cumu = self.state_rows(
+                    *self.extract_table(parse_tree(html_body)))
+                self.new_buffer.append(state_new)
+                self.cumu_buffer.append(state_cumu)
 
                 self.current_date += timedelta(days=1)
                 self.current_date_dict = self.create_date_dict(
                     self.current_date)
 
             except:
+                self.close_prefetch()
                 # save a csv file to check
                 self.tables_to_csv()
 
                 print("[ERROR] Problem with", self.current_url)
                 raise Exception(f"Error on {self.current_date.date()}")
 
+        self.close_prefetch()
         self.tables_to_csv()
         print("\n[INFO] CONGRATS! You have scraped until the end date!")
         total_time = time.time() - start_time
@@ -535,9 +744,7 @@ class Scraper:
         start_time = time.perf_counter()
 
         def finalize_df():
-            # Replace wrong names
-            self.state_df.State = self.state_df.State.str.replace(
-                '\xa0', ' ').str.replace('.', '', regex=False)
+            self.state_df = self.state_buffer.to_frame()
 
             new_df = self.state_df.pivot_table(index='Date',
                                                columns='State',
@@ -557,35 +764,33 @@ class Scraper:
                         f"_{self.end_date.date()}.csv")
             cumu_df.to_csv(os.path.join(CSV_DIR, filename))
 
-        state_column_names = ['State', 'New Case', 'Cumulative Case']
-        self.state_df = pd.DataFrame(columns=state_column_names)
+        self.state_buffer = RowBuffer(state_column_types)
 
         for day_number in range(self.total_days):
             self.setup_current_url(day_number)
 
-            r = requests.get(self.current_url)
-            if r.status_code == 404:
-                raise Exception("Error 404 accessing page!!")
-
             try:
+                # inside the `try` to close the prefetcher on a download error
+                html_body = self.fetch_page()
                 # extract the last table containing JUMLAH KESELURUHAN to be exact
-                df = pd.read_html(r.content,
-                                  match='JUMLAH KESELURUHAN',
-                                  header=0)[-1]
-                df.columns = state_column_names
-                df['Date'] = self.current_date
-
-                self.state_df = self.state_df.append(df)
+                new_cases, cumu_cases = self.extract_table(
+                    parse_tree(html_body))
+                self.state_buffer.extend(
+                    dict(zip(state_column_names, row), Date=self.current_date)
+                    for row in zip(state_names, new_cases.tolist(),
+                                   cumu_cases.tolist()))
 
                 self.current_date += timedelta(days=1)
                 self.current_date_dict = self.create_date_dict(
                     self.current_date)
             except:
+                self.close_prefetch()
                 # save a csv file to check
                 # self.tables_to_csv()
                 print("[ERROR] Problem with", self.current_url)
                 raise Exception(f"Error on {self.current_date.date()}")
 
+        self.close_prefetch()
         # handle and save the df
         finalize_df()
         print("\n[INFO] CONGRATS! You have scraped until the end date!")
@@ -594,24 +799,60 @@ class Scraper:
         print(f"Total time elapsed: {total_time:.2f} seconds")
 
     def test_scrape_first_day(self, verbose=0):
-        self.current_url = default_url.format(**self.start_date_dict)
-        r = requests.get(self.current_url)
-        if r.status_code == 404:
-            raise Exception("Error 404 accessing page!!")
+        self.current_url = self.get_url(self.start_date)
 
         if not self.current_date >= self.new_format_date:
             data_dict = self.scrape_data(verbose=verbose)
         else:
             data_dict = self.scrape_data_new(verbose=verbose)
+        self.error_journal.flush()
         print(self.current_url)
         display(data_dict)
         return data_dict
 
     def continue_scraping(self, verbose=0):
-        self.start_date = self.current_date
-        self.start_date_dict = self.current_date
-        self.total_days = (self.end_date - self.current_date).days + 1
-        self.scrape(verbose=verbose)
+        """resume `scrape_all` from the checkpoint of a failed run"""
+        self.scrape_all(verbose=verbose, resume=True)
+
+
+class PageScraper(Scraper):
+    """
+    Scraper for a single page which has already been downloaded,
+    e.g. to run the extraction in another process.
+    """
+
+    def __init__(self, current_date, url, html_body):
+        # the errors are returned to the main process to be saved
+        super().__init__(current_date, current_date,
+                         error_journal=ErrorJournal(path=None))
+        self.current_url = url
+        self.html_body = html_body
+        self.new_format_flag = self.current_date >= self.new_format_date
+
+    def fetch_page(self, url=None):
+        return self.html_body
+
+
+def extract_page(current_date, url, html_body, with_states=False):
+    """
+    Extract the data of one page. Defined at the module level to be
+    picklable for `ProcessPoolExecutor`.
+
+    The cumulative death of a page without any new death depends on the
+    previous date, which is not known here, so it is flagged with
+    "carried_cumu_death" to be filled in by the caller in date order.
+    """
+    scraper = PageScraper(current_date, url, html_body)
+    data_dict, state_new, state_cumu = scraper.scrape_page(
+        with_states=with_states)
+    return {"date": current_date,
+            "url": url,
+            "data": data_dict,
+            "state_new": state_new,
+            "state_cumu": state_cumu,
+            "new_format": scraper.new_format_flag,
+            "carried_cumu_death": scraper.cumu_death_carried,
+            "errors": scraper.error_journal.to_records()}
 
 
 if __name__ == '__main__':
@@ -630,6 +871,8 @@ if __name__ == '__main__':
 
     # scraper = Scraper(first_date, end_date)
     scraper = Scraper(start_date, end_date)
+    # download the next 4 dates in other threads while scraping
+    # scraper = Scraper(start_date, end_date, prefetch=4)
     # scraper = Scraper(start_date, final_date)
 
     # scrape all days
@@ -0,0 +1,222 @@
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import scrape_covid19_msia
+from error_journal import ErrorJournal
+from page_cache import PageCache
+from scrape_covid19_msia import (PARSER_VERSION, Scraper, column_types,
+                                 state_table_column_types)
+from validation import Validator, print_violations
+
+# the outputs of `scrape_all`, with their column types
+OUTPUT_PREFIXES = {"all": column_types,
+                   "state_new": state_table_column_types,
+                   "state_cumu": state_table_column_types}
+
+
+class ShardScraper(Scraper):
+    """
+    Scraper of one shard, keeping the dates where the cumulative death was
+    carried over from the previous date, which may be in another shard.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.carried_dates = []
+
+    def scrape_page(self, verbose=0, with_states=False):
+        result = super().scrape_page(verbose=verbose, with_states=with_states)
+        if self.cumu_death_carried:
+            self.carried_dates.append(str(self.current_date.date()))
+        return result
+
+    def restore_checkpoint(self, checkpoint):
+        days_done = super().restore_checkpoint(checkpoint)
+        if days_done:
+            self.carried_dates = checkpoint.load()["carried_dates"]
+        return days_done
+
+    def snapshot_state(self):
+        state = super().snapshot_state()
+        state["carried_dates"] = list(self.carried_dates)
+        return state
+
+    def validate_rows(self, buffers, state=None):
+        # the rows at the start of the shard are not complete yet,
+        #   validated after merging the shards instead
+        pass
+
+
+def scrape_shard(start_date, end_date, shard_dir, with_states=False,
+                 resume=True, page_cache=None, prefetch=0):
+    """
+    Scrape one shard into its own output fragments in `shard_dir`. Defined
+    at the module level to be picklable for `ProcessPoolExecutor`.
+    """
+    date_range = f"{start_date.date()}_{end_date.date()}"
+    summary_path = os.path.join(shard_dir, f"shard_{date_range}.json")
+    if resume and os.path.exists(summary_path):
+        # done in a previous run
+        with open(summary_path, "r") as f:
+            return json.load(f)
+
+    # the outputs of this process only go to the shard directory
+    scrape_covid19_msia.CSV_DIR = shard_dir
+    # the errors are saved by the main process, to not overwrite each other
+    scraper = ShardScraper(start_date, end_date, page_cache=page_cache,
+                           prefetch=prefetch,
+                           error_journal=ErrorJournal(path=None))
+    scraper.scrape_all(resume=resume, with_states=with_states)
+
+    summary = {"start_date": str(start_date.date()),
+               "end_date": str(end_date.date()),
+               "carried_dates": scraper.carried_dates,
+               "errors": scraper.error_journal.to_records()}
+    tmp_path = f"{summary_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(summary, f)
+    os.replace(tmp_path, summary_path)
+    return summary
+
+
+def read_fragment(path, types):
+    """read an output of `scrape_all` back with the same column types"""
+    int_columns = [col for col, col_type in types.items() if col_type == 'int']
+    dtype = {col: ('Int64' if col_type == 'int' else str)
+             for col, col_type in types.items() if col_type != 'date'}
+    return pd.read_csv(path, dtype=dtype, keep_default_na=False,
+                       na_values={col: [""] for col in int_columns},
+                       parse_dates=[col for col, col_type in types.items()
+                                    if col_type == 'date'])
+
+
+class ShardedScraper:
+    """
+    Scrape a large date range with `Scraper.scrape_all` in several
+    processes, one shard of consecutive dates per task, each with its own
+    session and output fragments in `shard_dir`. The fragments are then
+    merged in date order into the same CSV files as `scrape_all`.
+
+    The cumulative death of a date without new death is carried over
+    from the previous date, so it is derived again during the merge for
+    the dates at the start of a shard.
+    """
+
+    def __init__(self, start_date, end_date, n_shards=None, max_workers=None,
+                 page_cache=None, prefetch=0, error_journal=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.total_days = (end_date - start_date).days + 1
+        self.max_workers = max_workers or os.cpu_count()
+        self.n_shards = min(n_shards or self.max_workers, self.total_days)
+        # pass `PageCache()` to share the downloaded pages with all the
+        #  processes, and between the runs
+        self.page_cache = page_cache
+        self.prefetch = prefetch
+        self.error_journal = error_journal or ErrorJournal()
+
+        self.date_range = f"{start_date.date()}_{end_date.date()}"
+        self.shard_dir = os.path.join(scrape_covid19_msia.CSV_DIR,
+                                      f"shards_{self.date_range}")
+        # the date where the articles start using a new writing format
+        self.new_format_date = datetime(2021, 1, 20)
+
+    def split_shards(self):
+        """consecutive (start_date, end_date) of about the same number of days"""
+        shards = []
+        shard_start = self.start_date
+        for i in range(self.n_shards):
+            days = self.total_days // self.n_shards \
+                + (i < self.total_days % self.n_shards)
+            shard_end = shard_start + timedelta(days=days - 1)
+            shards.append((shard_start, shard_end))
+            shard_start = shard_end + timedelta(days=1)
+        return shards
+
+    def scrape_all(self, with_states=False, resume=True, keep_shards=False):
+        start_time = time.perf_counter()
+        os.makedirs(self.shard_dir, exist_ok=True)
+        shards = self.split_shards()
+        print(f"[INFO] Scraping {self.total_days} days in {len(shards)} "
+              f"shards with {self.max_workers} processes ...")
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(scrape_shard, shard_start, shard_end,
+                                   self.shard_dir, with_states, resume,
+                                   self.page_cache, self.prefetch)
+                       for shard_start, shard_end in shards]
+            # in the order of the shards, whichever finishes first
+            summaries = [future.result() for future in futures]
+
+        self.merge(summaries, with_states=with_states)
+        if not keep_shards:
+            shutil.rmtree(self.shard_dir)
+        print("\n[INFO] CONGRATS! You have scraped until the end date!")
+        total_time = time.perf_counter() - start_time
+        print(f"Total time elapsed: {total_time:.2f} seconds")
+
+    def fragment_paths(self, prefix, summaries):
+        return [os.path.join(self.shard_dir,
+                             f"{prefix}_{s['start_date']}_{s['end_date']}.csv")
+                for s in summaries]
+
+    def fill_carried_cumu_death(self, df, carried_dates):
+        """
+        Set the cumulative death of the dates without new death to the
+        one of the previous date in the old text format, as `scrape_data`
+        does when scraping the whole range in order.
+        """
+        carried = df['Date'].dt.strftime('%Y-%m-%d').isin(carried_dates)
+        old_format = df['Date'] < self.new_format_date
+        cumu_death = df['Cumulative Death'].where(old_format & ~carried)
+        filled = cumu_death.ffill().fillna(0).astype('Int64')
+        df.loc[carried, 'Cumulative Death'] = filled[carried]
+        return df
+
+    def merge(self, summaries, with_states=False):
+        """merge the fragments of the shards into the final CSV files"""
+        prefixes = list(OUTPUT_PREFIXES) if with_states else ["all"]
+        carried_dates = [date for s in summaries for date in s["carried_dates"]]
+        frames = []
+
+        for prefix in prefixes:
+            df = pd.concat([read_fragment(path, OUTPUT_PREFIXES[prefix])
+                            for path in self.fragment_paths(prefix, summaries)],
+                           ignore_index=True)
+            if prefix == "all":
+                df = self.fill_carried_cumu_death(df, carried_dates)
+            output_path = os.path.join(scrape_covid19_msia.CSV_DIR,
+                                       f"{prefix}_{self.date_range}.csv")
+            tmp_path = f"{output_path}.tmp"
+            df.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, output_path)
+            frames.append(df)
+            print(f"[INFO] {output_path} created from {len(summaries)} shards.")
+
+        for s in summaries:
+            for date in pd.date_range(s["start_date"], s["end_date"]):
+                self.error_journal.clear_date(date, PARSER_VERSION)
+            self.error_journal.merge(s["errors"])
+
+        # the whole range at once, with the carried values filled in
+        violations = Validator().validate(*frames)
+        print_violations(violations)
+        for v in violations:
+            self.error_journal.record(
+                v.date, v.check, PARSER_VERSION,
+                message=f"expected {v.expected}, found {v.actual}")
+        self.error_journal.flush()
+
+
+if __name__ == '__main__':
+    start_date = Scraper.create_datetime(day=27, month=3, year=2020)
+    end_date = Scraper.create_datetime(day=20, month=4, year=2021)
+
+    scraper = ShardedScraper(start_date, end_date, page_cache=PageCache())
+    scraper.scrape_all(with_states=False)
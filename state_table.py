@@ -0,0 +1,81 @@
+import re
+
+import numpy as np
+from lxml import html
+
+# the total row of the state table, not a state
+STATE_TOTAL = "JUMLAH KESELURUHAN"
+
+# the rows of the state table in the articles, in the order of the table
+state_names = ["PERLIS", "KEDAH", "PULAU PINANG", "PERAK", "SELANGOR",
+               "NEGERI SEMBILAN", "MELAKA", "JOHOR", "PAHANG", "TERENGGANU",
+               "KELANTAN", "SABAH", "SARAWAK", "WP KUALA LUMPUR",
+               "WP PUTRAJAYA", "WP LABUAN", STATE_TOTAL]
+STATE_INDEX = {name: i for i, name in enumerate(state_names)}
+
+# the last table containing JUMLAH KESELURUHAN, the same table as
+#   `pd.read_html(html_body, match='JUMLAH KESELURUHAN')[-1]`
+STATE_TABLE_XPATH = f'(//table[contains(., "{STATE_TOTAL}")])[last()]'
+
+# the parts of a cell which are not the number, e.g. in "28, 640" or
+#   "1,234 (12)", as removed by `preprocess.ipynb`
+CELL_JUNK = re.compile(r"\(\d+\)|[,\s]")
+
+# the pages are UTF-8, also when they do not declare it, as lxml would
+#   decode them as Latin-1 (e.g. "\xa0" in the names as "Â\xa0")
+UTF8_PARSER = html.HTMLParser(encoding='utf-8')
+
+
+def parse_tree(html_body):
+    """
+    Parse the page once with lxml, the tree to be given to
+    `extract_state_vectors` (and `page_index.PageIndex`).
+    """
+    if isinstance(html_body, str):
+        # lxml does not accept a str with an encoding declaration
+        html_body = html_body.encode('utf-8')
+    return html.fromstring(html_body, parser=UTF8_PARSER)
+
+
+def normalize_state_name(name):
+    # to fix weird names containing "\xa0" or "W.P."
+    name = name.replace('\xa0', ' ').replace('.', '')
+    return ' '.join(name.split()).upper()
+
+
+def parse_count(text):
+    return int(CELL_JUNK.sub('', text))
+
+
+def extract_state_vectors(tree):
+    """
+    The new cases and the cumulative cases of each state in the parsed
+    page `tree`, as two int64 arrays in the order of `state_names`.
+
+    Only the rows of the table are read, without building a DataFrame of
+    every table or cleaning the cells afterwards.
+    """
+    tables = tree.xpath(STATE_TABLE_XPATH)
+    if not tables:
+        raise Exception(f"[ERROR] No table containing {STATE_TOTAL}")
+    new_cases = np.zeros(len(state_names), dtype=np.int64)
+    cumu_cases = np.zeros(len(state_names), dtype=np.int64)
+    found = np.zeros(len(state_names), dtype=bool)
+
+    for tr_tag in tables[0].iter('tr'):
+        cells = tr_tag.xpath('td|th')
+        if len(cells) < 3:
+            continue
+        i = STATE_INDEX.get(normalize_state_name(cells[0].text_content()))
+        # skip the header row
+        if i is None:
+            continue
+        new_cases[i] = parse_count(cells[1].text_content())
+        cumu_cases[i] = parse_count(cells[2].text_content())
+        found[i] = True
+
+    if not found.all():
+        missing_states = [name for name, is_found in zip(state_names, found)
+                          if not is_found]
+        raise Exception(f"[ERROR] States not found: {missing_states}")
+    return new_cases, cumu_cases
@@ -0,0 +1,52 @@
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from animated_map import (artefact_paths, build_animated_map, monthly_state,
+                          read_animated_map)
+from data_store import PROCESSED_DIR, read_csv_table
+
+# the fields of `data_bundle.DataBundle` used by the animated map
+Bundle = namedtuple("Bundle", ["version", "state_new", "state_ids", "maps"])
+
+
+def test_monthly_state_is_the_resampled_sum():
+    dfState = read_csv_table("state_all", PROCESSED_DIR)
+    df_month = monthly_state(dfState)
+    # the months built directly, the resampling aliases differ between
+    #   the versions of pandas
+    months = sorted({(dt.year, dt.month) for dt in dfState.index})
+    expected = np.array([
+        dfState[(dfState.index.year == year)
+                & (dfState.index.month == month)].sum().values
+        for year, month in months])
+    assert [(dt.year, dt.month) for dt in df_month.index] == months
+    assert (df_month.values == expected).all()
+
+
+def test_build_keeps_the_temporary_files_of_other_writers(tmp_path):
+    dfState = read_csv_table("state_all", PROCESSED_DIR)
+    names = list(dfState.columns)
+    maps = {"coarse": {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "id": i, "properties": {},
+         "geometry": {"type": "Polygon",
+                      "coordinates": [[[i, 0], [i + 1, 0], [i, 1], [i, 0]]]}}
+        for i in range(len(names))]}}
+    bundle = Bundle("v1", dfState, dict(zip(names, range(len(names)))), maps)
+
+    old_paths = artefact_paths("v0", str(tmp_path))
+    other_tmp = str(tmp_path / "animated_v1_v1.json.other.tmp")
+    for path in old_paths + (other_tmp,):
+        open(path, 'w').close()
+
+    animated = build_animated_map(bundle, str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [os.path.basename(path) for path in artefact_paths("v1", str(tmp_path))]
+        + [os.path.basename(other_tmp)])
+
+    stored = read_animated_map("v1", str(tmp_path))
+    pd.testing.assert_frame_equal(stored.monthly, animated.monthly,
+                                  check_freq=False)
+    assert len(stored.figure.frames) == len(animated.figure.frames)
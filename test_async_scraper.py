@@ -0,0 +1,54 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+
+import ascync_scraper
+import scrape_covid19_msia
+from ascync_scraper import AsyncScraper
+from error_journal import ErrorJournal
+from scrape_covid19_msia import Scraper
+
+START, END = datetime(2021, 1, 10), datetime(2021, 1, 30)
+DATE_RANGE = "2021-01-10_2021-01-30"
+
+
+def read_outputs(csv_dir, national_prefix):
+    outputs = {}
+    for prefix, name in (("all", f"{national_prefix}{DATE_RANGE}.csv"),
+                         ("state_new", f"state_new_{DATE_RANGE}.csv"),
+                         ("state_cumu", f"state_cumu_{DATE_RANGE}.csv")):
+        with open(os.path.join(csv_dir, name), "rb") as f:
+            outputs[prefix] = f.read()
+    return outputs
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_outputs_do_not_depend_on_max_pending(tmp_path, monkeypatch,
+                                              page_corpus, use_processes):
+    """
+    The results are streamed in date order whatever the number of pages in
+    flight, the same bytes as `Scraper.scrape_all` one page at a time.
+    """
+    page_cache = page_corpus(START, END, no_death_days=(12, 20))
+    monkeypatch.chdir(tmp_path)
+
+    os.makedirs("single")
+    monkeypatch.setattr(scrape_covid19_msia, "CSV_DIR", "single")
+    Scraper(START, END, page_cache=page_cache,
+            error_journal=ErrorJournal(path=None)).scrape_all(
+        resume=False, with_states=True)
+    expected = read_outputs("single", "all_")
+
+    for max_pending in (1, 3, 32):
+        csv_dir = f"pending_{max_pending}"
+        os.makedirs(csv_dir)
+        monkeypatch.setattr(ascync_scraper, "CSV_DIR", csv_dir)
+        scraper = AsyncScraper(START, END, page_cache=page_cache,
+                               max_pending=max_pending)
+        scraper.error_journal = ErrorJournal(path=None)
+        asyncio.run(scraper.scrape_all(use_processes=use_processes,
+                                       max_workers=2, with_states=True,
+                                       resume=False))
+        assert read_outputs(csv_dir, "") == expected, max_pending
@@ -0,0 +1,49 @@
+import os
+from datetime import datetime
+
+import pytest
+
+import ascync_scraper
+import benchmark
+import scrape_covid19_msia
+from benchmark import run_benchmarks
+
+START = datetime(2021, 1, 15)
+END = datetime(2021, 1, 24)
+
+
+@pytest.fixture
+def corpus_dir(page_corpus, tmp_path, monkeypatch):
+    page_corpus(START, END, no_death_days=(17,))
+    # to find anything written in the working directory
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / "corpus")
+
+
+def test_every_scraper_is_measured(corpus_dir, tmp_path):
+    results = run_benchmarks(START, END, corpus_dir)
+    assert [r["name"] for r in results] == \
+        list(benchmark.get_benchmarks(8))
+    for r in results:
+        assert r["pages"] == 10
+        assert r["pages_per_second"] > 0
+        assert r["latency_p50_ms"] <= r["latency_p99_ms"]
+
+    # neither the CSV files, the metrics nor the journal of extraction errors
+    assert os.listdir(tmp_path) == ["corpus"]
+    assert scrape_covid19_msia.CSV_DIR == "original_data"
+    assert scrape_covid19_msia.METRICS_DIR == "metrics"
+    assert ascync_scraper.CSV_DIR == "test_data"
+
+
+def test_csv_dirs_restored_when_interrupted(corpus_dir, monkeypatch):
+    def interrupt(scraper):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(benchmark, "get_benchmarks", lambda prefetch: {
+        "interrupted": (benchmark.TimedScraper, {}, interrupt)})
+    with pytest.raises(KeyboardInterrupt):
+        run_benchmarks(START, END, corpus_dir)
+    assert scrape_covid19_msia.CSV_DIR == "original_data"
+    assert scrape_covid19_msia.METRICS_DIR == "metrics"
+    assert ascync_scraper.CSV_DIR == "test_data"
@@ -0,0 +1,93 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+
+import ascync_scraper
+import scrape_covid19_msia
+from ascync_scraper import AsyncScraper
+from error_journal import ErrorJournal
+from scrape_covid19_msia import Scraper
+
+START, END = datetime(2021, 1, 10), datetime(2021, 1, 24)
+DATE_RANGE = "2021-01-10_2021-01-24"
+# the last page downloaded when the first run fails
+LAST_CACHED = datetime(2021, 1, 15)
+
+
+def read_outputs(csv_dir, national_prefix="all_"):
+    outputs = {}
+    for prefix, name in (("all", f"{national_prefix}{DATE_RANGE}.csv"),
+                         ("state_new", f"state_new_{DATE_RANGE}.csv"),
+                         ("state_cumu", f"state_cumu_{DATE_RANGE}.csv")):
+        with open(os.path.join(csv_dir, name), "rb") as f:
+            outputs[prefix] = f.read()
+    return outputs
+
+
+def scrape(page_cache, **kwargs):
+    Scraper(START, END, page_cache=page_cache,
+            error_journal=ErrorJournal(path=None)).scrape_all(
+        with_states=True, checkpoint_every=3, **kwargs)
+
+
+def test_resumed_run_is_the_same_as_one_run(tmp_path, monkeypatch, capsys,
+                                            page_corpus):
+    """
+    A run failing on a page is resumed from its checkpoint to the same
+    bytes as a run without failure, with the cumulative death of the old
+    text format carried over the failed date, and across the new text
+    format (the 20th).
+    """
+    monkeypatch.chdir(tmp_path)
+    for name in ("single", "resumed"):
+        os.makedirs(name)
+
+    monkeypatch.setattr(scrape_covid19_msia, "CSV_DIR", "resumed")
+    page_cache = page_corpus(START, LAST_CACHED,
+                             no_death_days=(15,))
+    with pytest.raises(Exception, match="2021-01-16"):
+        scrape(page_cache, resume=False)
+    assert not os.path.exists(os.path.join("resumed",
+                                           f"all_{DATE_RANGE}.csv"))
+    page_cache = page_corpus(START, END, no_death_days=(15, 16))
+    capsys.readouterr()
+    scrape(page_cache, resume=True)
+    assert "Resuming from 2021-01-16" in capsys.readouterr().out
+
+    monkeypatch.setattr(scrape_covid19_msia, "CSV_DIR", "single")
+    scrape(page_cache, resume=False)
+    assert read_outputs("resumed") == read_outputs("single")
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_resumed_async_run_is_the_same_as_one_run(tmp_path, monkeypatch,
+                                                  capsys, page_corpus,
+                                                  use_processes):
+    """the same with both paths of `AsyncScraper.scrape_all`"""
+    monkeypatch.chdir(tmp_path)
+    for name in ("single", "resumed"):
+        os.makedirs(name)
+
+    def scrape_async(page_cache, resume):
+        scraper = AsyncScraper(START, END, page_cache=page_cache,
+                               max_pending=4)
+        scraper.error_journal = ErrorJournal(path=None)
+        asyncio.run(scraper.scrape_all(use_processes=use_processes,
+                                       max_workers=2, with_states=True,
+                                       resume=resume, checkpoint_every=3))
+
+    monkeypatch.setattr(ascync_scraper, "CSV_DIR", "resumed")
+    page_cache = page_corpus(START, LAST_CACHED, no_death_days=(15,))
+    with pytest.raises(Exception, match="2021-01-16"):
+        scrape_async(page_cache, resume=False)
+    page_cache = page_corpus(START, END, no_death_days=(15, 16))
+    capsys.readouterr()
+    scrape_async(page_cache, resume=True)
+    assert "Resuming from 2021-01-16" in capsys.readouterr().out
+
+    monkeypatch.setattr(scrape_covid19_msia, "CSV_DIR", "single")
+    scrape(page_cache, resume=False)
+    assert read_outputs("resumed", national_prefix="") \
+        == read_outputs("single")
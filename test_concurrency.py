@@ -0,0 +1,169 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import concurrency
+from ascync_scraper import AsyncScraper
+from concurrency import (AdaptiveLimiter, backoff_delay, get_with_retries,
+                         parse_retry_after)
+from error_journal import ErrorJournal
+
+URL = "https://kpkesihatan.com/2021/03/01/page/"
+
+
+class Response:
+    def __init__(self, status, headers=None, body=b"page"):
+        self.status = status
+        self.headers = headers or {}
+        self.body = body
+
+    async def read(self):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class Session:
+    """answers the requests in turn, a response or an exception to raise"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requested = 0
+
+    def get(self, url, headers=None):
+        self.requested += 1
+        response = self.responses.pop(0)
+        if isinstance(response, BaseException):
+            raise response
+        return response
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """the delays slept by `get_with_retries`, without sleeping"""
+    slept = []
+
+    async def sleep(delay):
+        slept.append(delay)
+
+    monkeypatch.setattr(concurrency.asyncio, "sleep", sleep)
+    return slept
+
+
+def get(session, limiter=None, max_retries=5):
+    return asyncio.run(get_with_retries(session, URL,
+                                        limiter or AdaptiveLimiter(),
+                                        max_retries=max_retries))
+
+
+def test_429_waits_for_retry_after(delays):
+    session = Session(Response(429, {"Retry-After": "3"}), Response(200))
+    limiter = AdaptiveLimiter()
+    status, _, body = get(session, limiter)
+    assert (status, body) == (200, b"page")
+    assert delays == [3.0]
+    assert session.requested == 2
+    assert (limiter.failures, limiter.successes) == (1, 1)
+
+
+def test_5xx_and_timeouts_back_off_exponentially(delays):
+    session = Session(Response(503), asyncio.TimeoutError(), Response(502),
+                      Response(200))
+    status, _, _ = get(session)
+    assert status == 200
+    assert len(delays) == 3
+    # full jitter within 0.5 * 2 ** attempt seconds
+    assert all(0 <= delay <= 0.5 * 2 ** attempt
+               for attempt, delay in enumerate(delays))
+
+
+def test_other_statuses_are_not_retried(delays):
+    session = Session(Response(404, body=b"not found"))
+    status, _, body = get(session)
+    # the body is only read for a 200 response
+    assert (status, body) == (404, None)
+    assert session.requested == 1 and delays == []
+
+
+def test_error_raised_when_retries_run_out(delays):
+    session = Session(*[Response(500) for _ in range(3)])
+    with pytest.raises(Exception, match="Failed after 2 retries"):
+        get(session, max_retries=2)
+    assert session.requested == 3
+    assert len(delays) == 2
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    later = datetime.now(timezone.utc) + timedelta(seconds=60)
+    assert 55 <= parse_retry_after(format_datetime(later, usegmt=True)) <= 60
+    earlier = datetime.now(timezone.utc) - timedelta(seconds=60)
+    assert parse_retry_after(format_datetime(earlier, usegmt=True)) == 0.0
+    # capped, whatever the server says
+    assert backoff_delay(0, "600", cap=30.0) == 30.0
+    assert 0 <= backoff_delay(10, cap=30.0) <= 30.0
+
+
+def test_limit_shrinks_on_failure_and_grows_on_success():
+    limiter = AdaptiveLimiter(initial_limit=8, min_limit=1, max_limit=9)
+    limiter.record_success(0.1)
+    assert limiter.limit == pytest.approx(8 + 1 / 8)
+    # too slow compared to the lowest latency, not grown
+    limiter.record_success(0.5)
+    assert limiter.limit == pytest.approx(8 + 1 / 8)
+
+    limiter.record_failure()
+    assert limiter.limit == pytest.approx((8 + 1 / 8) / 2)
+    # the same burst of failures
+    limiter.record_failure()
+    assert limiter.limit == pytest.approx((8 + 1 / 8) / 2)
+    # a later burst
+    limiter.last_decrease -= 1
+    limiter.record_failure()
+    assert limiter.limit == pytest.approx((8 + 1 / 8) / 4)
+    for _ in range(5):
+        limiter.last_decrease -= 1
+        limiter.record_failure()
+    assert limiter.limit == 1
+
+    for _ in range(200):
+        limiter.record_success(0.1)
+    assert limiter.limit == 9
+
+
+def test_limit_bounds_the_requests_in_flight():
+    limiter = AdaptiveLimiter(initial_limit=3)
+    in_flight = []
+
+    async def request():
+        async with limiter:
+            in_flight.append(limiter.in_flight)
+            await asyncio.sleep(0.001)
+
+    async def main():
+        await asyncio.gather(*(request() for _ in range(20)))
+
+    asyncio.run(main())
+    assert max(in_flight) == 3
+    assert limiter.in_flight == 0
+
+
+def test_fetch_body_raises_on_an_error_status(monkeypatch):
+    async def get_with_retries(*args, **kwargs):
+        return 403, {}, None
+
+    monkeypatch.setattr("ascync_scraper.get_with_retries", get_with_retries)
+    dt = datetime(2021, 3, 1)
+    scraper = AsyncScraper(dt, dt)
+    scraper.error_journal = ErrorJournal(path=None)
+    with pytest.raises(Exception, match="Error 403") as e:
+        asyncio.run(scraper.fetch_body(None, dt, URL))
+    assert not isinstance(e.value, AssertionError)
@@ -0,0 +1,64 @@
+import copy
+import json
+
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+
+from data_bundle import (MAPS_DIR, build_bundle, get_state_ids,
+                         get_state_total, read_geojson)
+from data_store import PROCESSED_DIR, load_tables
+from geo_simplify import LEVELS, level_path
+
+
+@pytest.fixture(scope="module")
+def bundle():
+    return build_bundle("v1")
+
+
+def test_tables_are_read_only(bundle):
+    for df in (bundle.national, bundle.monthly, bundle.state_new,
+               bundle.state_cumu, bundle.state_total):
+        with pytest.raises(ValueError, match="read-only"):
+            df.iloc[0, -1] = -1
+    # the copies can be modified
+    df = bundle.state_total.copy()
+    df.iloc[0, -1] = -1
+
+
+def test_tables_are_unchanged(bundle):
+    df, df_m, dfState, dfStateCumu = load_tables(PROCESSED_DIR)
+    pd.testing.assert_frame_equal(bundle.national, df)
+    pd.testing.assert_frame_equal(bundle.monthly, df_m)
+    pd.testing.assert_frame_equal(bundle.state_new, dfState)
+    pd.testing.assert_frame_equal(bundle.state_cumu, dfStateCumu)
+    fine = read_geojson(level_path("fine", MAPS_DIR))
+    state_ids = get_state_ids(fine, dfStateCumu.columns)
+    assert bundle.state_ids == state_ids
+    pd.testing.assert_frame_equal(bundle.state_total,
+                                  get_state_total(dfStateCumu, state_ids))
+    for level in LEVELS:
+        assert json.dumps(bundle.maps[level]) == json.dumps(
+            read_geojson(level_path(level, MAPS_DIR)))
+
+
+def test_maps_and_ids_are_read_only(bundle):
+    feature = bundle.maps["fine"]["features"][0]
+    for change in (lambda: bundle.state_ids.update(Johor=-1),
+                   lambda: bundle.maps.pop("fine"),
+                   lambda: feature.__setitem__("id", -1),
+                   lambda: feature["properties"].clear()):
+        with pytest.raises(TypeError, match="shared"):
+            change()
+    with pytest.raises(AttributeError):
+        bundle.maps["fine"]["features"].append(feature)
+
+    # copied as plain dicts, by the caller or by plotly
+    coarse = copy.deepcopy(bundle.maps["coarse"])
+    coarse["features"][0]["id"] = -1
+    assert bundle.maps["coarse"]["features"][0]["id"] == 0
+    fig = go.Figure(go.Choropleth(geojson=bundle.maps["coarse"],
+                                  locations=[0], z=[1]))
+    assert json.loads(fig.to_json())["data"][0]["geojson"] == json.loads(
+        json.dumps(bundle.maps["coarse"]))
+    assert pd.Series(bundle.state_ids).to_dict() == bundle.state_ids
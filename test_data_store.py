@@ -0,0 +1,47 @@
+import os
+import shutil
+
+import pandas as pd
+
+from data_store import (PROCESSED_DIR, TABLE_NAMES, csv_path, load_tables,
+                        store_path, temp_path, write_table)
+
+
+def read_csv_as_before(name, processed_dir):
+    """the parsing of `read_all_csv` in the app before the store"""
+    df = pd.read_csv(csv_path(name, processed_dir))
+    df.Date = pd.to_datetime(df.Date)
+    return df.set_index('Date')
+
+
+def test_stored_tables_are_the_parsed_csv(tmp_path):
+    processed_dir = tmp_path / "processed_data"
+    processed_dir.mkdir()
+    for name in TABLE_NAMES:
+        shutil.copy(csv_path(name, PROCESSED_DIR), processed_dir)
+    store_dir = str(tmp_path / "store")
+
+    tables = load_tables(str(processed_dir), store_dir)
+    for name, df in zip(TABLE_NAMES, tables):
+        assert os.path.exists(store_path(name, store_dir))
+        pd.testing.assert_frame_equal(
+            df, read_csv_as_before(name, str(processed_dir)))
+
+    # read again from the store, without the CSV files
+    for name in TABLE_NAMES:
+        (processed_dir / f"{name}.csv").unlink()
+    for df, stored in zip(tables, load_tables(str(processed_dir),
+                                              store_dir)):
+        pd.testing.assert_frame_equal(stored, df)
+
+
+def test_writers_do_not_share_the_temporary_file(tmp_path):
+    path = str(tmp_path / "table.arrow")
+    first, second = temp_path(path), temp_path(path)
+    assert first != second
+    assert os.path.dirname(first) == str(tmp_path)
+
+    df = pd.DataFrame({'Date': pd.to_datetime(['2021-01-01']), 'a': [1]})
+    write_table(df.set_index('Date'), path)
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        ["table.arrow", os.path.basename(first), os.path.basename(second)])
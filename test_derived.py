@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from derived import (DERIVED_COLUMNS, append_days, derive_all,
+                     read_cleaned_all)
+
+
+def daily_columns(df):
+    return df[[col for col in df.columns if col not in DERIVED_COLUMNS]]
+
+
+def write_derived(df, processed_dir):
+    """write the tables of a full recompute as `preprocess.ipynb`"""
+    df_all, df_month = derive_all(df)
+    df_all.to_csv(processed_dir / "cleaned_all.csv")
+    df_month.to_csv(processed_dir / "monthly_sum.csv", index=False)
+
+
+@pytest.mark.parametrize("chunks", [
+    # one day at a time within a month, then across the end of the month
+    [1] * 20,
+    # several months at once, after a day in the middle of a month
+    [1, 75, 3],
+])
+def test_appended_days_are_the_full_recompute(tmp_path, chunks):
+    df = daily_columns(read_cleaned_all())
+    start = len(df) - sum(chunks)
+
+    expected_dir = tmp_path / "expected"
+    expected_dir.mkdir()
+    write_derived(df, expected_dir)
+
+    processed_dir = tmp_path / "processed_data"
+    processed_dir.mkdir()
+    write_derived(df.iloc[:start], processed_dir)
+    state_path = str(processed_dir / "derived_state.json")
+    for size in chunks:
+        # the state is saved and loaded again between the updates
+        append_days(df.iloc[start:start + size], str(processed_dir),
+                    state_path)
+        start += size
+
+    for name in ("cleaned_all.csv", "monthly_sum.csv"):
+        assert (processed_dir / name).read_bytes() \
+            == (expected_dir / name).read_bytes()
+
+
+def test_missing_values_recompute_the_whole_history(tmp_path):
+    df = daily_columns(read_cleaned_all())
+    df_new = df.iloc[-3:].copy()
+    df_new.loc[df_new.index[1], 'ICU'] = None
+
+    expected_dir = tmp_path / "expected"
+    expected_dir.mkdir()
+    write_derived(pd.concat([df.iloc[:-3], df_new]), expected_dir)
+
+    processed_dir = tmp_path / "processed_data"
+    processed_dir.mkdir()
+    write_derived(df.iloc[:-3], processed_dir)
+    append_days(df_new, str(processed_dir),
+                str(processed_dir / "derived_state.json"))
+
+    for name in ("cleaned_all.csv", "monthly_sum.csv"):
+        assert (processed_dir / name).read_bytes() \
+            == (expected_dir / name).read_bytes()
@@ -0,0 +1,91 @@
+import json
+from datetime import datetime
+
+from error_journal import ErrorJournal
+
+DAY = datetime(2021, 1, 20)
+URL = "https://kpkesihatan.com/2021/01/20/kenyataan-akhbar-kpk/"
+
+
+def test_record_is_deduplicated_and_saved(tmp_path):
+    path = str(tmp_path / "errors.json")
+    journal = ErrorJournal(path)
+    journal.record(DAY, "Death", 2, url=URL)
+    journal.record("2021-01-20", "Death", 2)
+    journal.record(DAY, "ICU", 2, url=URL)
+    [death, icu] = journal.errors_on(DAY)
+    assert (death["field"], death["count"], death["url"]) == ("Death", 2, URL)
+    assert (icu["field"], icu["count"]) == ("ICU", 1)
+
+    journal.flush()
+    with open(path) as f:
+        assert json.load(f)["records"] == journal.to_records()
+    assert ErrorJournal(path).to_records() == journal.to_records()
+    assert not journal.dirty
+
+
+def test_clear_date_of_the_parser_version(tmp_path):
+    path = str(tmp_path / "errors.json")
+    journal = ErrorJournal(path)
+    journal.record(DAY, "Death", 1)
+    journal.record(DAY, "ICU", 2)
+    journal.record(datetime(2021, 1, 21), "ICU", 2)
+    journal.flush()
+
+    journal = ErrorJournal(path)
+    journal.clear_date(DAY, 2)
+    assert [r["field"] for r in journal.errors_on(DAY)] == ["Death"]
+    journal.clear_date(DAY, 1)
+    assert journal.errors_on(DAY) == []
+    assert journal.unresolved_dates() == ["2021-01-21"]
+    journal.flush()
+    assert ErrorJournal(path).unresolved_dates() == ["2021-01-21"]
+
+
+def test_merge_adds_the_counts(tmp_path):
+    journal = ErrorJournal(str(tmp_path / "errors.json"))
+    journal.record(DAY, "Death", 2, url=URL)
+    # e.g. the journal of a worker process
+    worker = ErrorJournal(path=None)
+    worker.record(DAY, "Death", 2)
+    worker.record(DAY, "ICU", 2, url=URL)
+    journal.merge(worker.to_records())
+
+    [death, icu] = journal.errors_on(DAY)
+    assert (death["count"], death["url"]) == (2, URL)
+    assert death["first_seen"] <= death["last_seen"]
+    assert (icu["count"], icu["url"]) == (1, URL)
+    assert journal.dirty
+
+
+def test_new_parser_version_ignores_the_old_errors(tmp_path):
+    path = str(tmp_path / "errors.json")
+    journal = ErrorJournal(path)
+    journal.record(DAY, "Death", 2)
+    journal.flush()
+
+    # after a bump of the parser version
+    journal = ErrorJournal(path)
+    assert journal.has_errors(DAY, 2)
+    assert not journal.has_errors(DAY, 3)
+    assert journal.unresolved_dates(3) == []
+    journal.clear_date(DAY, 3)
+    assert not journal.dirty
+    journal.record(DAY, "ICU", 3)
+    assert journal.unresolved_dates(3) == ["2021-01-20"]
+    # the old errors are kept until their date is scraped by their version
+    assert [(r["field"], r["parser_version"])
+            for r in journal.errors_on(DAY)] == [("Death", 2), ("ICU", 3)]
+
+
+def test_import_legacy(tmp_path):
+    txt_path = tmp_path / "txt_error.txt"
+    # lines sometimes written without a newline
+    txt_path.write_text("Death - 2021-01-20ICU - 2021-01-20\n"
+                        "Death - 2021-01-21\n")
+    journal = ErrorJournal(path=None)
+    journal.import_legacy(str(txt_path))
+    assert [(r["date"], r["field"], r["parser_version"])
+            for r in journal.to_records()] == [
+        ("2021-01-20", "Death", "legacy"), ("2021-01-20", "ICU", "legacy"),
+        ("2021-01-21", "Death", "legacy")]
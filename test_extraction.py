@@ -0,0 +1,99 @@
+import random
+import re
+
+import pytest
+
+from extraction import OldFormatExtractor
+from scrape_covid19_msia import cases_to_extract_old
+
+WORDS = ["pulih", "sembuh", "kumulatif kes yang telah pulih",
+         "kumulatif kes sembuh", "kes baharu", "jumlah kes positif",
+         "Unit Rawatan Rapi", "pernafasan", "kes kematian",
+         "kumulatif kes kematian", "tiada", "ke-", "dan", "adalah",
+         "sebanyak", "kes", ".", ",", "\n", ", ", ". ", ".."]
+
+
+def random_text(rng):
+    tokens = []
+    for _ in range(rng.randint(1, 40)):
+        if rng.random() < 0.3:
+            tokens.append(str(rng.randint(0, 20000)))
+        else:
+            tokens.append(rng.choice(WORDS))
+    separators = ["", " ", " "]
+    return "".join(token + rng.choice(separators) for token in tokens)
+
+
+def old_sentence(txt, all_text):
+    """the sentence of the previous regex implementation, or None"""
+    if txt == 'Unit Rawatan Rapi':
+        regex_text = r"([^.,\n]*(?:Unit Rawatan Rapi))"
+    else:
+        regex_text = rf"([^.,\n]*{txt}[^.,]*[,.]+)"
+    if txt == 'kes kematian':
+        sentence_list = list(re.finditer(regex_text, all_text))
+        if not sentence_list:
+            return None
+        sentence_idx = 1 if re.search(r'ke-\d+', sentence_list[0].group()) \
+            else 0
+        if sentence_idx >= len(sentence_list):
+            return None
+        return sentence_list[sentence_idx]
+    return re.search(regex_text, all_text)
+
+
+def old_values(txt, sentence_obj):
+    sentence = sentence_obj.group()
+    txt_found = re.search(txt, sentence)
+    numbers_found = list(re.finditer(r'\d+', sentence))
+    matched_number = None
+    if numbers_found:
+        distances = [abs(txt_found.start() - number.start())
+                     for number in numbers_found]
+        min_index = distances.index(min(distances))
+        if txt == 'jumlah kes positif':
+            min_index += 1
+        if min_index < len(numbers_found):
+            matched_number = int(numbers_found[min_index].group())
+    return (sentence, txt_found.start(),
+            [int(number.group()) for number in numbers_found], matched_number)
+
+
+def new_values(extractor, page, txt):
+    if txt == 'kes kematian':
+        try:
+            sentence = extractor.find_death_sentence(page, txt)
+        except IndexError:
+            return None
+    else:
+        sentence = extractor.find_sentence(page, txt)
+        if sentence is None:
+            return None
+    numbers = [page.number(i) for i in sentence.number_idx]
+    matched_number = None
+    if numbers:
+        skip = 1 if txt == 'jumlah kes positif' else 0
+        try:
+            matched_number = extractor.nearest_number(page, sentence, skip)
+        except IndexError:
+            pass
+    return (page.sentence_text(sentence), sentence.txt_start - sentence.start,
+            numbers, matched_number)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_same_sentences_as_the_regex(seed):
+    """
+    The sentences, numbers and nearest numbers of the scan are the same as
+    the regex `([^.,\\n]*{txt}[^.,]*[,.]+)` used before, on random texts.
+    """
+    rng = random.Random(seed)
+    extractor = OldFormatExtractor(cases_to_extract_old)
+    for _ in range(3000):
+        text = random_text(rng)
+        page = extractor.scan(text)
+        for txt in cases_to_extract_old:
+            sentence_obj = old_sentence(txt, text)
+            expected = None if sentence_obj is None \
+                else old_values(txt, sentence_obj)
+            assert new_values(extractor, page, txt) == expected, (txt, text)
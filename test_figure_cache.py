@@ -0,0 +1,107 @@
+import os
+import threading
+
+import plotly.graph_objects as go
+import pytest
+
+import figure_cache
+from data_bundle import data_version
+from figure_cache import FigureCache, cached_figure
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = FigureCache()
+    monkeypatch.setattr(figure_cache, "figure_cache", cache)
+    return cache
+
+
+class Builder:
+    """builds a new bar figure on every call"""
+
+    def __init__(self, n_bars=3):
+        self.n_bars = n_bars
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return go.Figure(go.Bar(x=[f"day {i}" for i in range(self.n_bars)],
+                                y=list(range(self.n_bars))))
+
+
+def test_figure_built_once_per_version(cache, tmp_path):
+    path = tmp_path / "national.csv"
+    path.write_text("Date,new_cases\n2021-01-01,1\n")
+    version = data_version([str(path)])
+    build = Builder()
+    fig = cached_figure("daily_cases", version, build)
+    assert cached_figure("daily_cases", version, build) is fig
+    assert build.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # after an update of the data
+    path.write_text("Date,new_cases\n2021-01-01,1\n2021-01-02,2\n")
+    new_version = data_version([str(path)])
+    assert new_version != version
+    assert cached_figure("daily_cases", new_version, build) is not fig
+    assert build.calls == 2
+    # the options are a part of the key
+    cached_figure("daily_cases", new_version, build, "log")
+    cached_figure("daily_cases", new_version, build, "log")
+    assert build.calls == 3
+    assert (cache.hits, cache.misses) == (2, 3)
+    assert cache.stats()["figures"] == 3
+
+
+def test_version_from_the_modification_time(tmp_path):
+    path = tmp_path / "national.csv"
+    path.write_text("a")
+    version = data_version([str(path)])
+    assert data_version([str(path)]) == version
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert data_version([str(path)]) != version
+
+
+def test_least_recently_used_figures_dropped():
+    size = len(Builder()().to_json())
+    cache = FigureCache(max_bytes=2 * size)
+    build = Builder()
+    for figure_id in ("a", "b"):
+        cache.get((figure_id, "v1"), build)
+    # "a" used more recently than "b"
+    cache.get(("a", "v1"), build)
+    cache.get(("c", "v1"), build)
+    assert list(cache.figures) == [("a", "v1"), ("c", "v1")]
+    assert cache.n_bytes == 2 * size
+
+    # a figure over the budget is returned but not cached
+    large = Builder(n_bars=1000)
+    cache.get(("large", "v1"), large)
+    cache.get(("large", "v1"), large)
+    assert large.calls == 2
+    assert list(cache.figures) == [("a", "v1"), ("c", "v1")]
+
+
+def test_figure_built_once_by_concurrent_sessions(cache):
+    started = threading.Event()
+    release = threading.Event()
+    build = Builder()
+
+    def slow_build():
+        started.set()
+        release.wait(5)
+        return build()
+
+    figures = []
+    threads = [threading.Thread(target=lambda: figures.append(
+        cached_figure("state_daily", "v1", slow_build))) for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert build.calls == 1
+    assert len(figures) == 4 and all(fig is figures[0] for fig in figures)
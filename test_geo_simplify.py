@@ -0,0 +1,106 @@
+import json
+from collections import defaultdict
+from itertools import combinations
+
+import pytest
+
+from geo_simplify import (GEOJSON_PATH, LEVELS, MAPS_DIR, TopologySimplifier,
+                          level_path, write_levels)
+
+
+@pytest.fixture(scope="module")
+def features():
+    with open(GEOJSON_PATH, 'r') as f:
+        return json.load(f)['features']
+
+
+@pytest.fixture(scope="module")
+def simplifier(features):
+    return TopologySimplifier(features)
+
+
+def edges(feature):
+    """the segments of the rings of the state, in either direction"""
+    segments = set()
+    for polygon in feature['geometry']['coordinates']:
+        for ring in polygon:
+            points = [tuple(point) for point in ring]
+            segments.update(frozenset(segment)
+                            for segment in zip(points, points[1:]))
+    return segments
+
+
+def points(feature):
+    return {tuple(point) for polygon in feature['geometry']['coordinates']
+            for ring in polygon for point in ring}
+
+
+def shared_borders(features):
+    """(state, state) -> the segments in the rings of both states"""
+    segments = [edges(feature) for feature in features]
+    borders = {}
+    for i, j in combinations(range(len(features)), 2):
+        if segments[i] & segments[j]:
+            borders[i, j] = segments[i] & segments[j]
+    return borders
+
+
+def lines(segments):
+    """the points of each connected line, and the ends of the line"""
+    neighbours = defaultdict(set)
+    for a, b in segments:
+        neighbours[a].add(b)
+        neighbours[b].add(a)
+    found = []
+    seen = set()
+    for start in neighbours:
+        if start in seen:
+            continue
+        line, stack = set(), [start]
+        while stack:
+            point = stack.pop()
+            if point not in line:
+                line.add(point)
+                stack += neighbours[point]
+        seen |= line
+        found.append((line, [p for p in line if len(neighbours[p]) == 1]))
+    return found
+
+
+@pytest.mark.parametrize("level", LEVELS)
+def test_shared_borders_stay_shared(features, simplifier, level):
+    """
+    Every border of two states in the original map is still a line in the
+    rings of both states after the simplification, from the same ends, so
+    there is no gap or overlap between them.
+    """
+    tolerance, decimals = LEVELS[level]
+    simplified = simplifier.simplify(tolerance, decimals)
+    original_borders = shared_borders(features)
+    borders = shared_borders(simplified)
+    # no new border
+    assert set(borders) <= set(original_borders)
+
+    for pair, segments in original_borders.items():
+        simplified_lines = lines(borders.get(pair, ()))
+        kept_points = [points(simplified[i]) for i in pair]
+        for _, ends in lines(segments):
+            ends = {tuple(round(x, decimals) for x in point)
+                    for point in ends}
+            if len(ends) < 2:
+                # a closed border or shorter than the rounding
+                continue
+            if not all(ends <= kept for kept in kept_points):
+                # the ends are junctions, always kept unless their island
+                #   is smaller than the tolerance (e.g. of Labuan)
+                continue
+            assert any(ends <= line for line, _ in simplified_lines), \
+                (level, [simplified[i]['properties']['name'] for i in pair])
+
+
+def test_committed_maps_are_up_to_date(tmp_path):
+    write_levels(maps_dir=str(tmp_path))
+    for level in LEVELS:
+        with open(level_path(level, str(tmp_path)), 'rb') as f, \
+                open(level_path(level, MAPS_DIR), 'rb') as committed:
+            assert f.read() == committed.read()
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from http_session import Prefetcher
+
+URLS = [f"https://kpkesihatan.com/2021/01/{day:02d}/" for day in range(1, 9)]
+
+
+def test_pages_are_returned_in_order():
+    finished = []
+
+    def fetch(url):
+        # the later dates are downloaded first
+        time.sleep(0.01 * (len(URLS) - URLS.index(url)))
+        finished.append(url)
+        return f"<html>{url}</html>"
+
+    prefetcher = Prefetcher(fetch, ahead=len(URLS))
+    prefetcher.submit(URLS)
+    assert [prefetcher.get(url) for url in URLS] \
+        == [f"<html>{url}</html>" for url in URLS]
+    assert finished != URLS
+    assert prefetcher.futures == {}
+    prefetcher.close()
+
+
+def test_each_page_is_fetched_once_in_the_threads():
+    fetched = []
+    main_thread = threading.current_thread()
+
+    def fetch(url):
+        fetched.append((url, threading.current_thread() is main_thread))
+        return url
+
+    prefetcher = Prefetcher(fetch, ahead=2)
+    prefetcher.submit(URLS[:4])
+    prefetcher.submit(URLS[:5])
+    assert [prefetcher.get(url) for url in URLS] == URLS
+    prefetcher.close()
+    # the URLs not submitted are fetched by the caller
+    assert sorted(fetched) == sorted([(url, False) for url in URLS[:5]]
+                                     + [(url, True) for url in URLS[5:]])
+
+
+def test_exception_of_a_download_reaches_the_caller():
+    def fetch(url):
+        if url == URLS[2]:
+            raise ConnectionError(f"Error accessing {url}")
+        return url
+
+    prefetcher = Prefetcher(fetch, ahead=4)
+    prefetcher.submit(URLS)
+    assert [prefetcher.get(url) for url in URLS[:2]] == URLS[:2]
+    with pytest.raises(ConnectionError, match=URLS[2]):
+        prefetcher.get(URLS[2])
+    # the other pages are not lost
+    assert [prefetcher.get(url) for url in URLS[3:]] == URLS[3:]
+    prefetcher.close()
+
+
+def test_close_cancels_the_downloads_not_started():
+    started = []
+    release = threading.Event()
+
+    def fetch(url):
+        started.append(url)
+        release.wait(5)
+        return url
+
+    prefetcher = Prefetcher(fetch, ahead=1)
+    prefetcher.submit(URLS)
+    futures = list(prefetcher.futures.values())
+    while not started:
+        time.sleep(0.001)
+    # the first download finishes while `close` waits for the threads
+    threading.Timer(0.05, release.set).start()
+    prefetcher.close()
+    assert started == URLS[:1]
+    assert [future.cancelled() for future in futures] \
+        == [False] + [True] * (len(URLS) - 1)
+    assert prefetcher.executor is None
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import scrape_covid19_msia
+from error_journal import ErrorJournal
+from metrics import Metrics
+from scrape_covid19_msia import Scraper
+
+
+class Clock:
+    """`time.perf_counter` advancing by `step` seconds on every call"""
+
+    def __init__(self, step):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+def read_prometheus(path):
+    """metric{labels} -> value"""
+    with open(path) as f:
+        return {line.split(" ")[0]: float(line.split(" ")[1])
+                for line in f.read().splitlines()
+                if not line.startswith("#")}
+
+
+def test_records_and_totals(tmp_path, monkeypatch):
+    monkeypatch.setattr("metrics.time.perf_counter", Clock(0.25))
+    jsonl_path, prom_path = tmp_path / "run.jsonl", tmp_path / "run.prom"
+    metrics = Metrics(str(jsonl_path), str(prom_path))
+
+    metrics.start_date(datetime(2021, 1, 20))
+    with metrics.stage("network"):
+        metrics.count("bytes", 1000)
+    for _ in range(2):
+        with metrics.stage("parse"):
+            pass
+    metrics.count("http_200")
+    # counted in the totals, not in the record of the date
+    thread = threading.Thread(target=metrics.count, args=("http_retries",))
+    thread.start()
+    thread.join()
+    metrics.end_date("ok", url="https://kpkesihatan.com/a/")
+    metrics.start_date(datetime(2021, 1, 21))
+    with metrics.stage("network"):
+        metrics.count("http_retries", 2)
+    metrics.end_date("error", url="https://kpkesihatan.com/b/")
+    metrics.finish()
+
+    with open(jsonl_path) as f:
+        records = [json.loads(line) for line in f]
+    assert records == [
+        {"date": "2021-01-20", "stages": {"network": 0.25, "parse": 0.5},
+         "counters": {"bytes": 1000, "http_200": 1}, "status": "ok",
+         "url": "https://kpkesihatan.com/a/", "seconds": 0.75},
+        {"date": "2021-01-21", "stages": {"network": 0.25},
+         "counters": {"http_retries": 2}, "status": "error",
+         "url": "https://kpkesihatan.com/b/", "seconds": 0.25}]
+
+    totals = read_prometheus(prom_path)
+    run_seconds = totals.pop("scraper_run_seconds")
+    assert run_seconds > 0
+    assert totals == {
+        'scraper_stage_seconds_total{stage="network"}': 0.5,
+        'scraper_stage_seconds_total{stage="parse"}': 0.5,
+        'scraper_stage_calls_total{stage="network"}': 2,
+        'scraper_stage_calls_total{stage="parse"}': 2,
+        'scraper_events_total{event="bytes"}': 1000,
+        'scraper_events_total{event="http_200"}': 1,
+        'scraper_events_total{event="http_retries"}': 3,
+        'scraper_dates_total{status="error"}': 1,
+        'scraper_dates_total{status="ok"}': 1}
+    assert metrics.summary() == "network 0.50s (50%), parse 0.50s (50%)"
+
+
+def test_scrape_all_writes_a_record_per_date(tmp_path, monkeypatch,
+                                             page_corpus):
+    start, end = datetime(2021, 1, 15), datetime(2021, 1, 24)
+    page_cache = page_corpus(start, end)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scrape_covid19_msia, "CSV_DIR", str(tmp_path))
+    monkeypatch.setattr(scrape_covid19_msia, "METRICS_DIR", "metrics")
+    Scraper(start, end, page_cache=page_cache,
+            error_journal=ErrorJournal(path=None)).scrape_all()
+
+    date_range = "2021-01-15_2021-01-24"
+    with open(os.path.join("metrics", f"metrics_{date_range}.jsonl")) as f:
+        records = [json.loads(line) for line in f]
+    assert [r["date"] for r in records] \
+        == [f"2021-01-{day}" for day in range(15, 25)]
+    assert all(r["status"] == "ok" for r in records)
+
+    totals = read_prometheus(
+        os.path.join("metrics", f"metrics_{date_range}.prom"))
+    assert totals['scraper_dates_total{status="ok"}'] == 10
+    # the records of the dates add up to the totals of the run
+    for stage in ("url", "parse", "fields", "write"):
+        assert totals[f'scraper_stage_calls_total{{stage="{stage}"}}'] > 0
+    assert all(r["counters"]["page_bytes"] > 0 for r in records)
+    for name in {name for r in records for name in r["counters"]}:
+        assert totals[f'scraper_events_total{{event="{name}"}}'] \
+            == sum(r["counters"].get(name, 0) for r in records)
@@ -0,0 +1,84 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+
+from page_cache import PageCache
+
+OLD_URL = "https://kpkesihatan.com/2021/01/25/kenyataan-akhbar-kpk-25-januari-2021/"
+RECENT_URL = "https://kpkesihatan.com/{}/kenyataan-akhbar-kpk/".format(
+    time.strftime("%Y/%m/%d", time.gmtime()))
+
+
+class Response:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+class Session:
+    """returns the responses in order and records the requests"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append((url, headers))
+        return self.responses.pop(0)
+
+
+def test_old_article_is_not_revalidated(tmp_path):
+    cache = PageCache(str(tmp_path))
+    session = Session(Response(200, b"<html>old</html>"))
+    assert cache.fetch(OLD_URL, session) == b"<html>old</html>"
+    # settled by the date of the article, although it was just fetched
+    assert cache.fetch(OLD_URL, session) == b"<html>old</html>"
+    assert len(session.requests) == 1
+
+
+def test_not_modified_does_not_reset_the_age(tmp_path):
+    cache = PageCache(str(tmp_path), max_age=60)
+    url = "https://kpkesihatan.com/kenyataan-akhbar/"
+    modified = formatdate(time.time() - 30, usegmt=True)
+    session = Session(Response(200, b"body", {"ETag": '"a"',
+                                              "Last-Modified": modified}),
+                      Response(304))
+    cache.fetch(url, session)
+    cache.fetch(url, session)
+    assert session.requests[1][1]["If-None-Match"] == '"a"'
+
+    entry = cache.get(url)
+    changed_at = cache.changed_at(entry)
+    assert abs(changed_at - (time.time() - 30)) < 2
+    # 30 more seconds later the page is settled, the 304 did not count
+    cache.max_age = 25
+    assert cache.is_settled(entry)
+
+
+def test_recent_article_is_revalidated(tmp_path):
+    cache = PageCache(str(tmp_path))
+    session = Session(Response(200, b"new"), Response(304), Response(304))
+    for _ in range(3):
+        assert cache.fetch(RECENT_URL, session) == b"new"
+    assert len(session.requests) == 3
+
+
+def test_writers_of_the_same_page_do_not_clash(tmp_path):
+    cache = PageCache(str(tmp_path))
+    bodies = [f"<html>{i}</html>".encode() * 1000 for i in range(8)]
+
+    def put(body):
+        for _ in range(50):
+            cache.put(OLD_URL, body, {"ETag": body[:10].decode()})
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(put, bodies))
+    assert cache.get(OLD_URL)["body"] in bodies
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [os.path.basename(cache.body_path(OLD_URL)),
+         os.path.basename(cache.meta_path(OLD_URL))])
@@ -0,0 +1,108 @@
+import asyncio
+from datetime import timedelta
+
+import bs4
+import lxml.html
+
+import page_index
+from ascync_scraper import AsyncScraper
+from conftest import NEW_FORMAT_DATE, new_format_page, old_format_page
+from page_index import index_page
+from scrape_covid19_msia import extract_page
+
+CASES = ["Kes sembuh: 2 kes", "Kes baharu: 3 kes", "Kes import: 1 kes",
+         "Kes tempatan: 2 kes", "Kes aktif: 10 kes",
+         "Dirawat di Unit Rawatan Rapi: 4 kes", "Bantuan pernafasan: 1 kes",
+         "Kes kematian: tiada"]
+
+
+def page(*lists, nav=True):
+    uls = "".join("<ul>" + "".join(f"<li>{text}</li>" for text in texts)
+                  + "</ul>" for texts in lists)
+    nav_ul = "<nav><ul><li>Menu</li></ul></nav>" if nav else ""
+    return (f"<html><body>{nav_ul}<div class='entry-content'>{uls}</div>"
+            "</body></html>").encode()
+
+
+def case_texts(index):
+    return [text for text, _ in index.case_list()]
+
+
+def test_single_list_in_the_article():
+    index = index_page(page(CASES))
+    assert case_texts(index) == CASES
+
+
+def test_list_with_a_missing_case():
+    other = ["Nota: kenyataan akhbar", "Sila rujuk laman web"]
+    index = index_page(page(other, CASES[:-1]))
+    assert case_texts(index) == CASES[:-1]
+
+
+def test_whole_page_without_the_article():
+    html_body = (b"<html><body><nav><ul><li>Menu</li></ul></nav>"
+                 + b"<ul>" + "".join(f"<li>{text}</li>" for text in CASES)
+                 .encode() + b"</ul></body></html>")
+    index = index_page(html_body)
+    assert case_texts(index) == CASES
+
+
+def test_no_case_list():
+    index = index_page(page(["Menu"]))
+    assert index.case_list() == []
+
+
+def test_article_gives_the_data_of_the_whole_page(monkeypatch):
+    """the same rows as parsing the whole page, before and after the new format"""
+    dates = [NEW_FORMAT_DATE + timedelta(days=i) for i in range(-3, 3)]
+    pages = {dt: (new_format_page if dt >= NEW_FORMAT_DATE
+                  else old_format_page)(dt.day, no_death=dt.day == 18)
+             .encode() for dt in dates}
+    url = "https://example.com/"
+
+    def extract_all():
+        return [extract_page(dt, url, pages[dt], with_states=True)
+                for dt in dates]
+
+    results = extract_all()
+    monkeypatch.setattr(page_index, "article_elements", lambda tree: [tree])
+    assert extract_all() == results
+    # every field was found, in both formats
+    assert not any(result["errors"] for result in results)
+    assert results[0]["data"]["Cumulative Recovered"] == 9017
+    assert results[-1]["data"]["Cumulative Recovered"] == 130022
+
+
+def test_each_page_is_parsed_once(monkeypatch, page_corpus):
+    """the fields and the state table of a page share a single parse"""
+    parses = []
+    fromstring = lxml.html.fromstring
+
+    def counted_fromstring(*args, **kwargs):
+        parses.append("lxml")
+        return fromstring(*args, **kwargs)
+
+    def counted_soup(*args, **kwargs):
+        parses.append("bs4")
+        raise AssertionError("parsed by BeautifulSoup")
+
+    monkeypatch.setattr(lxml.html, "fromstring", counted_fromstring)
+    monkeypatch.setattr(bs4.BeautifulSoup, "__init__", counted_soup)
+    dt = NEW_FORMAT_DATE
+    html_body = new_format_page(dt.day).encode()
+
+    extract_page(dt, "https://example.com/", html_body, with_states=True)
+    assert parses == ["lxml"]
+
+    parses.clear()
+    page_cache = page_corpus(dt, dt)
+    scraper = AsyncScraper(dt, dt, page_cache=page_cache)
+    url = scraper.get_url(dt)
+
+    async def fetch():
+        async with scraper.create_session() as session:
+            return await scraper.fetch(session, dt, url, with_states=True)
+
+    result = asyncio.run(fetch())
+    assert parses == ["lxml"]
+    assert result["index"].tree is not None
@@ -0,0 +1,46 @@
+import os
+import shutil
+
+import pandas as pd
+
+from pipeline import ORIG_DIR, Pipeline, default_stages
+
+PROCESSED_DIR = "processed_data"
+
+
+def test_stages_write_the_committed_files(tmp_path):
+    processed_dir = str(tmp_path / "processed_data")
+    stages = default_stages(ORIG_DIR, processed_dir)
+    pipeline = Pipeline(stages, os.path.join(processed_dir, "pipeline",
+                                             "cache.json"), max_workers=2)
+    assert sorted(pipeline.run()) == sorted(stage.name for stage in stages)
+
+    for stage in stages:
+        for path in stage.outputs:
+            relative = os.path.relpath(path, processed_dir)
+            if relative.startswith("pipeline"):
+                # the intermediate outputs are not committed
+                continue
+            with open(path, "rb") as f, \
+                    open(os.path.join(PROCESSED_DIR, relative), "rb") as g:
+                assert f.read() == g.read(), relative
+
+    # nothing to run again, with the same inputs
+    pipeline = Pipeline(stages, pipeline.cache_path, max_workers=2)
+    assert pipeline.run() == []
+
+
+def test_new_national_file_runs_the_national_stages(tmp_path):
+    orig_dir = tmp_path / "original_data"
+    shutil.copytree(ORIG_DIR, orig_dir)
+    processed_dir = str(tmp_path / "processed_data")
+    cache_path = os.path.join(processed_dir, "pipeline", "cache.json")
+    Pipeline(default_stages(str(orig_dir), processed_dir), cache_path).run()
+
+    # the last day scraped again, with a corrected count
+    df = pd.read_csv(orig_dir / "all_2020-03-27_2021-04-15.csv").tail(1)
+    df['Recovered'] += 1
+    df.to_csv(orig_dir / "all_2021-04-15_2021-04-15.csv", index=False)
+    ran = Pipeline(default_stages(str(orig_dir), processed_dir),
+                   cache_path).run()
+    assert sorted(ran) == ["clean_national", "monthly_sum", "moving_averages"]
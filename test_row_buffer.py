@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from row_buffer import RowBuffer
+from scrape_covid19_msia import column_types
+
+
+def random_records(rng, n):
+    records = []
+    for i in range(n):
+        record = {"Date": datetime(2021, 1, 1) + timedelta(days=i),
+                  "URL": f"https://example.com/{i}/"}
+        for col, col_type in column_types.items():
+            if col_type != 'int' or rng.random() < 0.1:
+                # missing from the row
+                continue
+            record[col] = np.nan if rng.random() < 0.1 \
+                else int(rng.integers(0, 10 ** 6))
+        records.append(record)
+    return records
+
+
+def appended_frame(records):
+    """the rows as `DataFrame.append` gave them, one by one in object columns"""
+    df = pd.DataFrame(columns=list(column_types), dtype=object)
+    for i, record in enumerate(records):
+        df.loc[i] = [record.get(col, np.nan) for col in column_types]
+    return df
+
+
+def test_frame_has_the_values_of_the_appended_rows():
+    rng = np.random.default_rng(0)
+    records = random_records(rng, 200)
+    buffer = RowBuffer(column_types)
+    buffer.extend(records[:50])
+    buffer.clear()
+    buffer.extend(records)
+    df = buffer.to_frame()
+    assert len(buffer) == len(df) == len(records)
+    assert list(df.columns) == list(column_types)
+
+    expected = appended_frame(records)
+    for col, col_type in column_types.items():
+        if col_type == 'int':
+            assert str(df[col].dtype) in ('int64', 'Int64')
+            assert df[col].isna().tolist() == expected[col].isna().tolist()
+            assert df[col].dropna().tolist() \
+                == expected[col].dropna().tolist()
+        elif col_type == 'date':
+            assert df[col].dtype == 'datetime64[ns]'
+            assert df[col].tolist() == pd.to_datetime(expected[col]).tolist()
+        else:
+            assert df[col].tolist() == expected[col].tolist()
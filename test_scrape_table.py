@@ -0,0 +1,71 @@
+import os
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from error_journal import ErrorJournal
+from scrape_covid19_msia import Scraper
+from state_table import state_names
+
+
+class FailingScraper(Scraper):
+    """every download fails, e.g. with a 404"""
+
+    def download(self, url):
+        raise Exception("Error 404 accessing page!!")
+
+
+@pytest.mark.parametrize("method", ["scrape_table", "scrape_table_2"])
+def test_download_error_closes_the_prefetcher(tmp_path, monkeypatch, method):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("original_data")
+    scraper = FailingScraper(datetime(2021, 3, 1), datetime(2021, 3, 5),
+                             prefetch=2, error_journal=ErrorJournal(path=None))
+    with pytest.raises(Exception, match="Error on 2021-03-01"):
+        getattr(scraper, method)()
+    assert scraper.prefetcher.executor is None
+    assert scraper.prefetcher.futures == {}
+    if method == "scrape_table":
+        # the rows done so far are saved to check
+        assert os.path.exists(
+            "original_data/state_new_2021-03-01_2021-03-05.csv")
+
+
+def test_single_parse_gives_the_tables_of_scrape_table(tmp_path, monkeypatch,
+                                                       page_corpus):
+    """
+    The state tables of `scrape_all(with_states=True)` are the same bytes as
+    `scrape_table`, and the same counts as `scrape_table_2`.
+    """
+    start, end = datetime(2021, 1, 15), datetime(2021, 1, 24)
+    date_range = "2021-01-15_2021-01-24"
+    page_cache = page_corpus(start, end)
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("original_data")
+
+    def scraper():
+        return Scraper(start, end, page_cache=page_cache,
+                       error_journal=ErrorJournal(path=None))
+
+    scraper().scrape_all(with_states=True, resume=False)
+    tables = {}
+    for prefix in ("state_new", "state_cumu"):
+        path = f"original_data/{prefix}_{date_range}.csv"
+        with open(path, "rb") as f:
+            tables[prefix] = f.read()
+        os.remove(path)
+
+    scraper().scrape_table()
+    for prefix, table in tables.items():
+        with open(f"original_data/{prefix}_{date_range}.csv", "rb") as f:
+            assert f.read() == table
+
+    scraper().scrape_table_2()
+    for prefix in tables:
+        df = pd.read_csv(f"original_data/{prefix}_{date_range}.csv",
+                         index_col="Date")
+        df_2 = pd.read_csv(f"original_data/2_{prefix}_{date_range}.csv",
+                           index_col="Date")
+        assert sorted(df_2.columns) == sorted(state_names)
+        pd.testing.assert_frame_equal(df_2, df[df_2.columns])
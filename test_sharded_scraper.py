@@ -0,0 +1,50 @@
+import os
+from datetime import datetime
+
+import scrape_covid19_msia
+from error_journal import ErrorJournal
+from scrape_covid19_msia import Scraper
+from sharded_scraper import ShardedScraper
+
+START, END = datetime(2021, 1, 3), datetime(2021, 1, 26)
+DATE_RANGE = "2021-01-03_2021-01-26"
+
+
+def read_outputs(csv_dir):
+    outputs = {}
+    for prefix in ("all", "state_new", "state_cumu"):
+        with open(os.path.join(csv_dir, f"{prefix}_{DATE_RANGE}.csv"),
+                  "rb") as f:
+            outputs[prefix] = f.read()
+    return outputs
+
+
+def test_merged_shards_are_the_same_as_one_run(tmp_path, monkeypatch,
+                                               page_corpus):
+    """
+    The merge gives the same bytes as `Scraper.scrape_all`, with the
+    cumulative death carried over at the start of the shards (the 9th and
+    the 15th) and within a shard (the 4th and the 5th).
+    """
+    page_cache = page_corpus(START, END, no_death_days=(4, 5, 9, 15))
+    monkeypatch.chdir(tmp_path)
+    for name in ("single", "sharded"):
+        os.makedirs(name)
+
+    monkeypatch.setattr(scrape_covid19_msia, "CSV_DIR", "single")
+    Scraper(START, END, page_cache=page_cache,
+            error_journal=ErrorJournal(path=None)).scrape_all(
+        resume=False, with_states=True)
+
+    monkeypatch.setattr(scrape_covid19_msia, "CSV_DIR", "sharded")
+    sharded = ShardedScraper(START, END, n_shards=4, max_workers=2,
+                             page_cache=page_cache,
+                             error_journal=ErrorJournal(path=None))
+    assert [str(start.date()) for start, _ in sharded.split_shards()] == \
+        ["2021-01-03", "2021-01-09", "2021-01-15", "2021-01-21"]
+    sharded.scrape_all(with_states=True, resume=False)
+
+    single = read_outputs("single")
+    assert read_outputs("sharded") == single
+    # the carried values are really there
+    assert b"2021-01-09" in single["all"]
@@ -0,0 +1,119 @@
+from datetime import datetime
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from scrape_covid19_msia import extract_page
+from state_table import (STATE_TOTAL, extract_state_vectors, parse_tree,
+                         state_names)
+
+STATE_ROWS = state_names[:-1]
+
+
+def state_table(new_cells, cumu_cells):
+    rows = "".join(f"<tr><td>{name}</td><td>{new}</td><td>{cumu}</td></tr>"
+                   for name, new, cumu in zip(state_names, new_cells,
+                                              cumu_cells))
+    return ("<table><tr><th>NEGERI</th><th>KES BAHARU</th>"
+            f"<th>KES KUMULATIF</th></tr>{rows}</table>")
+
+
+def new_format_page(table):
+    return f"""<html><body><div class="entry-content">
+<ul><li>Kes sembuh: 2,500 kes (jumlah kumulatif kes sembuh 130,500 kes)</li>
+<li>Kes baharu: 3,100 kes (jumlah kumulatif kes 172,100 kes)</li>
+<li>Kes import: 10 kes</li><li>Kes tempatan: 3,090 kes</li>
+<li>Kes aktif: 41,000 kes</li>
+<li>Dirawat di Unit Rawatan Rapi: 200 kes</li>
+<li>Bantuan pernafasan: 100 kes</li>
+<li>Kes kematian: 5 kes (jumlah kumulatif kes kematian 600 kes)</li></ul>
+{table}</div></body></html>""".encode()
+
+
+def test_cells_with_separators_and_notes():
+    new_cells = ["1,234 (12)"] + ["5"] * (len(STATE_ROWS) - 1) + ["1,309"]
+    cumu_cells = ["28, 640"] + ["1 000"] * (len(STATE_ROWS) - 1) + ["43,640"]
+    new_cases, cumu_cases = extract_state_vectors(
+        parse_tree(state_table(new_cells, cumu_cells)))
+    assert new_cases.dtype == np.int64
+    assert new_cases[0] == 1234 and cumu_cases[0] == 28640
+    assert cumu_cases[1] == 1000 and cumu_cases[-1] == 43640
+
+
+def test_extract_page_writes_int_state_rows():
+    new_cells = [f"{i}" for i in range(len(STATE_ROWS))] + ["120"]
+    cumu_cells = [f"{i},000 ({i})" for i in range(len(STATE_ROWS))] + ["120,000"]
+    html_body = new_format_page(state_table(new_cells, cumu_cells))
+    result = extract_page(datetime(2021, 3, 1), "https://example.com/",
+                          html_body, with_states=True)
+    assert result["data"]["Cumulative Case"] == 172100
+    assert result["state_new"]["KEDAH"] == 1
+    assert result["state_cumu"]["KEDAH"] == 1000
+    assert all(isinstance(result["state_cumu"][name], int)
+               for name in state_names)
+
+
+def read_html_vectors(html_body):
+    """the state table as read by `pd.read_html` and `preprocess.ipynb` before"""
+    df = pd.read_html(StringIO(html_body), match=STATE_TOTAL, header=0)[-1]
+    df = df.set_index('NEGERI').T
+    df.columns = df.columns.str.replace('\xa0', ' ')\
+        .str.replace('.', '', regex=False)
+    df = df[state_names].replace(r"(\(\d+\)|\,*\s*)", '', regex=True)\
+        .astype(int)
+    return df.iloc[0].to_numpy(), df.iloc[1].to_numpy()
+
+
+def random_cell(rng):
+    count = int(rng.integers(0, 200000))
+    cell = f"{count:,}" if rng.random() < 0.5 else str(count)
+    if count >= 1000 and rng.random() < 0.2:
+        cell = f"{count // 1000}, {count % 1000:03d}"
+    if rng.random() < 0.2:
+        cell += f" ({rng.integers(0, 100)})"
+    return cell
+
+
+def random_name(name, rng):
+    if name.startswith("WP ") and rng.random() < 0.5:
+        name = "W.P." + name[2:]
+    # not the total, matched as is by `pd.read_html` as well
+    if name != STATE_TOTAL and rng.random() < 0.3:
+        name = name.replace(' ', '\xa0')
+    return name
+
+
+def test_vectors_are_the_cleaned_read_html_table():
+    rng = np.random.default_rng(0)
+    head = '<head><meta charset="utf-8"></head>'
+    for _ in range(50):
+        rows = "".join(
+            f"<tr><td>{random_name(name, rng)}</td><td>{random_cell(rng)}</td>"
+            f"<td>{random_cell(rng)}</td></tr>" for name in state_names)
+        # an earlier table with the total, not the state table
+        html_body = (
+            f"<html>{head if rng.random() < 0.5 else ''}<body>"
+            "<table><tr><th>A</th></tr>"
+            f"<tr><td>{STATE_TOTAL}</td></tr></table>"
+            "<table><tr><th>NEGERI</th><th>KES BAHARU</th>"
+            f"<th>KES KUMULATIF</th></tr>{rows}</table></body></html>")
+        expected_new, expected_cumu = read_html_vectors(html_body)
+        # the downloaded bytes, declaring their encoding or not, or the
+        #   decoded page
+        for page in (html_body.encode('utf-8'), html_body):
+            new_cases, cumu_cases = extract_state_vectors(parse_tree(page))
+            assert (new_cases == expected_new).all()
+            assert (cumu_cases == expected_cumu).all()
+
+
+def test_bytes_without_charset_are_utf8():
+    new_cells = ["1"] * len(STATE_ROWS) + [str(len(STATE_ROWS))]
+    cumu_cells = ["1\xa0000"] * len(STATE_ROWS) + [f"{len(STATE_ROWS)},000"]
+    table = state_table(new_cells, cumu_cells).replace(
+        "WP KUALA LUMPUR", "W.P.\xa0KUALA\xa0LUMPUR")
+    html_body = f"<html><body>{table}</body></html>".encode('utf-8')
+    tree = parse_tree(html_body)
+    assert "W.P.\xa0KUALA" in tree.text_content()
+    new_cases, cumu_cases = extract_state_vectors(tree)
+    assert cumu_cases.tolist()[:-1] == [1000] * len(STATE_ROWS)
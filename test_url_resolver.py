@@ -0,0 +1,196 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import ascync_scraper
+import scrape_covid19_msia
+from ascync_scraper import AsyncScraper
+
+from error_journal import ErrorJournal
+from scrape_covid19_msia import Scraper, default_url
+from url_resolver import URLResolver
+
+
+def article_url(day):
+    return (f"https://kpkesihatan.com/2021/03/{day:02d}/kenyataan-akhbar-kpk-"
+            f"{day}-mac-2021-situasi-semasa-jangkitan-penyakit-coronavirus-"
+            "2019-covid-19-di-malaysia/")
+
+
+def archive_page(links, next_page=True):
+    body = "".join(f'<article><a href="{link}">post</a></article>'
+                   for link in links)
+    if next_page:
+        body += '<a class="next page-numbers" href="/2021/03/page/9/">Next</a>'
+    return f"<html><body>{body}</body></html>".encode()
+
+
+class Response:
+    def __init__(self, status_code, content=b""):
+        self.status_code = status_code
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class Session:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def get(self, url):
+        self.requested.append(url)
+        if url not in self.pages:
+            return Response(404)
+        return Response(200, self.pages[url])
+
+
+OTHER_POSTS = [f"https://kpkesihatan.com/2021/03/{day:02d}/kenyataan-akhbar-"
+               "program-imunisasi/" for day in (10, 11)]
+PAGES = {
+    "https://kpkesihatan.com/2021/03/":
+        archive_page([article_url(31), article_url(30)]),
+    # only the other press releases of the site
+    "https://kpkesihatan.com/2021/03/page/2/": archive_page(OTHER_POSTS),
+    "https://kpkesihatan.com/2021/03/page/3/":
+        archive_page([article_url(2), article_url(1)], next_page=False),
+}
+
+
+def test_archive_pages_without_articles_are_crawled_through():
+    session = Session(PAGES)
+    resolver = URLResolver(index_path=None, session=session)
+    links = resolver.get_archive_links(2021, 3)
+    assert links == [article_url(31), article_url(30),
+                     article_url(2), article_url(1)]
+    # stopped without a next page, not at the 404 of page 4
+    assert len(session.requested) == 3
+
+
+def test_archive_stops_at_a_page_without_posts():
+    pages = {"https://kpkesihatan.com/2021/03/":
+             archive_page([article_url(31)]),
+             "https://kpkesihatan.com/2021/03/page/2/": archive_page([])}
+    session = Session(pages)
+    resolver = URLResolver(index_path=None, session=session)
+    assert resolver.get_archive_links(2021, 3) == [article_url(31)]
+    assert len(session.requested) == 2
+
+
+def corpus_resolver(start, end, missing_date):
+    """a resolver of the synthetic corpus, without the article of a date"""
+    resolver = URLResolver(index_path=None, session=Session({}))
+    scraper = Scraper(start, end, error_journal=ErrorJournal(path=None))
+    dt = start
+    while dt <= end:
+        resolver.urls[str(dt.date())] = [scraper.get_url(dt)]
+        dt += timedelta(days=1)
+    del resolver.urls[str(missing_date.date())]
+    resolver.missing.add(str(missing_date.date()))
+    resolver.crawled_months = {"2021-01": "2021-02-01T00:00:00"}
+    return resolver
+
+
+def test_missing_date_is_not_requested():
+    resolver = URLResolver(index_path=None, session=Session(PAGES))
+    resolver.crawl_month(2021, 3)
+    dt = datetime(2021, 3, 15)
+    assert resolver.is_missing(dt)
+    assert resolver.resolve(datetime(2021, 3, 2)) == article_url(2)
+
+    scraper = Scraper(dt, dt, url_resolver=resolver,
+                      error_journal=ErrorJournal(path=None))
+    scraper.session = Session({})
+    assert scraper.get_url(dt) is None
+    scraper.current_url = scraper.get_url(dt)
+    with pytest.raises(Exception, match="No article on 2021-03-15"):
+        scraper.fetch_page()
+    assert scraper.session.requested == []
+
+
+def test_unresolved_date_falls_back_to_the_known_url():
+    """a date not past when its month was crawled, e.g. today"""
+    today = datetime.combine(date.today(), datetime.min.time())
+    resolver = URLResolver(index_path=None, session=Session({}))
+    scraper = Scraper(today, today, url_resolver=resolver,
+                      error_journal=ErrorJournal(path=None))
+    assert scraper.get_url(today) == \
+        default_url.format(**Scraper.create_date_dict(today))
+    assert not resolver.is_missing(today)
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_async_missing_date_is_not_requested(tmp_path, monkeypatch,
+                                             page_corpus, use_processes):
+    """
+    The pages are fetched from the offline corpus, the missing date is
+    reported without any request and the dates before it are saved.
+    """
+    start, end = datetime(2021, 1, 10), datetime(2021, 1, 20)
+    missing_date = datetime(2021, 1, 16)
+    page_cache = page_corpus(start, end)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ascync_scraper, "CSV_DIR", ".")
+    requested = []
+
+    async def get_with_retries(session, url, *args, **kwargs):
+        requested.append(url)
+        raise AssertionError(f"{url} requested")
+
+    monkeypatch.setattr(ascync_scraper, "get_with_retries", get_with_retries)
+    scraper = AsyncScraper(start, end, page_cache=page_cache,
+                           url_resolver=corpus_resolver(start, end,
+                                                        missing_date))
+    scraper.error_journal = ErrorJournal(path=None)
+    with pytest.raises(Exception, match="Error on 2021-01-16") as e:
+        asyncio.run(scraper.scrape_all(use_processes=use_processes,
+                                       max_workers=2, resume=False,
+                                       checkpoint_every=2))
+    assert "No article on 2021-01-16" in str(e.value.__cause__)
+    assert requested == []
+    with open("2021-01-10_2021-01-20.csv.part") as f:
+        assert len(f.readlines()) == 1 + 6
+
+
+def test_async_resolver_error_saves_the_checkpoint(tmp_path, monkeypatch,
+                                                   page_corpus):
+    """an error resolving a URL is raised in date order, after the saved rows"""
+    start, end = datetime(2021, 1, 10), datetime(2021, 1, 20)
+    page_cache = page_corpus(start, end)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ascync_scraper, "CSV_DIR", ".")
+    resolver = corpus_resolver(start, end, datetime(2021, 1, 20))
+    resolve = resolver.resolve
+
+    def failing_resolve(dt, preferred_url=None):
+        if dt == datetime(2021, 1, 14):
+            raise Exception("[ERROR] crawl failed")
+        return resolve(dt, preferred_url)
+
+    resolver.resolve = failing_resolve
+    scraper = AsyncScraper(start, end, page_cache=page_cache,
+                           url_resolver=resolver)
+    scraper.error_journal = ErrorJournal(path=None)
+    with pytest.raises(Exception, match="Error on 2021-01-14"):
+        asyncio.run(scraper.scrape_all(resume=False, checkpoint_every=10))
+    with open("2021-01-10_2021-01-20.csv.part") as f:
+        assert len(f.readlines()) == 1 + 4
+
+
+def test_missing_date_saves_the_checkpoint(tmp_path, monkeypatch, page_corpus):
+    start, end = datetime(2021, 1, 10), datetime(2021, 1, 20)
+    page_cache = page_corpus(start, end)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scrape_covid19_msia, "CSV_DIR", ".")
+    scraper = Scraper(start, end, page_cache=page_cache,
+                      url_resolver=corpus_resolver(start, end,
+                                                   datetime(2021, 1, 16)),
+                      error_journal=ErrorJournal(path=None))
+    scraper.session = Session({})
+    with pytest.raises(Exception, match="Error on 2021-01-16"):
+        scraper.scrape_all(resume=False, checkpoint_every=10)
+    assert scraper.session.requested == []
+    with open("all_2021-01-10_2021-01-20.csv.part") as f:
+        assert len(f.readlines()) == 1 + 6
@@ -0,0 +1,86 @@
+import json
+
+import pandas as pd
+import pytest
+
+from data_store import read_csv_table
+from validation import Validator
+
+DATES = pd.date_range("2021-03-01", periods=2, name="Date")
+
+
+def national(new_cases, cumu_cases):
+    return pd.DataFrame({"New Case": new_cases,
+                         "Cumulative Case": cumu_cases}, index=DATES)
+
+
+@pytest.mark.parametrize("dtype", [object, "string"])
+def test_state_cells_are_cleaned_whatever_the_dtype(dtype):
+    state_cumu = pd.DataFrame({"SELANGOR": ["28, 640", "28, 700"],
+                               "JOHOR": ["1,234 (5)", "1,300 (2)"]},
+                              index=DATES).astype(dtype)
+    array = Validator.to_array(state_cumu, "SELANGOR")
+    assert array.tolist() == [28640.0, 28700.0]
+    assert Validator.to_array(state_cumu, "JOHOR").tolist() == [1234.0, 1300.0]
+
+    # the sum of the states matches on the first date only
+    df = national([100, 226], [29874, 30100])
+    violations = Validator().validate(df, state_cumu=state_cumu)
+    assert [(v.date, v.check, v.expected, v.actual) for v in violations] == \
+        [(DATES[1], "state_cumu", 30100, 30000)]
+
+
+def test_missing_state_cells_are_skipped():
+    state_new = pd.DataFrame({"SELANGOR": ["50", None],
+                              "JOHOR": ["50 (1)", "2"]}, index=DATES)
+    df = national([100, 7], [1000, 1007])
+    assert Validator().validate(df, state_new=state_new) == []
+
+
+def test_committed_data_in_batches_is_the_whole_history():
+    """
+    The violations of batches of rows, with the state saved in between as
+    in the checkpoint, are those of the whole history at once.
+    """
+    df = read_csv_table("cleaned_all")
+    state_new = read_csv_table("state_all")
+    state_cumu = read_csv_table("state_cumu")
+    violations = Validator().validate(df, state_new, state_cumu)
+    assert [(str(v.date.date()), v.check) for v in violations] == [
+        ("2020-08-12", "state_cumu"), ("2020-08-13", "state_cumu"),
+        ("2020-09-17", "state_cumu"), ("2020-12-28", "state_cumu"),
+        ("2021-01-07", "state_cumu")]
+
+    # a bad count on the first row of a batch, checked against the last
+    #   counts of the batch before
+    df = df.copy()
+    df.iloc[20, df.columns.get_loc("Cumulative Recovered")] += 5
+    violations = Validator().validate(df, state_new, state_cumu)
+    assert df.index[20] in [v.date for v in violations]
+
+    batches, state = [], None
+    for start in range(0, len(df), 10):
+        validator = Validator()
+        validator.set_state(state)
+        rows = slice(start, start + 10)
+        batches += validator.validate(df.iloc[rows], state_new.iloc[rows],
+                                      state_cumu.iloc[rows])
+        state = json.loads(json.dumps(validator.get_state()))
+    assert batches == violations
+
+
+def test_cumulative_counts_never_decrease():
+    # the daily count is missing, the tally can not be checked
+    df = national([100, None], [1000, 990])
+    assert [(v.date, v.check, v.expected, v.actual)
+            for v in Validator().validate(df)] == \
+        [(DATES[1], "monotonic: Cumulative Case", 1000, 990)]
+
+    # across a missing cumulative count, and against the previous batch
+    validator = Validator()
+    assert validator.validate(national([100, 0], [1000, None])) == []
+    df = national([None, None], [990, 1200]).set_axis(
+        pd.date_range("2021-03-03", periods=2, name="Date"))
+    assert [(str(v.date.date()), v.check, v.expected, v.actual)
+            for v in validator.validate(df)] == \
+        [("2021-03-03", "monotonic: Cumulative Case", 1000, 990)]
@@ -0,0 +1,164 @@
+import json
+import os
+import re
+from datetime import datetime
+
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+
+URL_INDEX_PATH = os.path.join("original_data", "url_index.json")
+
+# the listing of all the articles published in a month
+ARCHIVE_URL = "https://kpkesihatan.com/{year}/{month:02d}/"
+ARCHIVE_PAGE_URL = "https://kpkesihatan.com/{year}/{month:02d}/page/{page}/"
+
+# the articles about the current situation of COVID-19 in Malaysia
+ARTICLE_REGEX = re.compile(
+    r"^https://kpkesihatan\.com/(\d{4})/(\d{2})/(\d{2})/"
+    r"[^/]*situasi-semasa-jangkitan-penyakit-coronavirus-2019-covid-19"
+    r"-di-malaysia[^/]*/?$")
+# any post of the site, e.g. the other press releases listed in the archive
+POST_REGEX = re.compile(r"^https://kpkesihatan\.com/\d{4}/\d{2}/\d{2}/[^/]+/?$")
+
+
+class URLResolver:
+    """
+    Persistent index of the URL of the article of each date.
+
+    The index is built by crawling the date-archive listing of the site
+    (e.g. https://kpkesihatan.com/2021/04/) once per month, and saved to
+    `index_path` together with the dates known to have no article
+    (negative cache), so that no request is wasted on a 404.
+    """
+
+    def __init__(self, index_path=URL_INDEX_PATH, session=None):
+        self.index_path = index_path
+        self.session = session or requests.Session()
+        # "YYYY-MM-DD" -> URLs of the articles of the date, oldest first
+        self.urls = {}
+        # "YYYY-MM-DD" of the dates without any article
+        self.missing = set()
+        # "YYYY-MM" -> the time when the month was crawled
+        self.crawled_months = {}
+        self.load()
+
+    def load(self):
+        if not (self.index_path and os.path.exists(self.index_path)):
+            return
+        with open(self.index_path, "r") as f:
+            index = json.load(f)
+        self.urls = index["urls"]
+        self.missing = set(index["missing"])
+        self.crawled_months = index["crawled_months"]
+
+    def save(self):
+        if not self.index_path:
+            return
+        index = {"urls": dict(sorted(self.urls.items())),
+                 "missing": sorted(self.missing),
+                 "crawled_months": self.crawled_months}
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def has_next_page(soup):
+        """whether the archive page links to a next page"""
+        for tag in soup.find_all(["a", "link"]):
+            if "next" in (tag.get("rel") or []) \
+                    or "next" in (tag.get("class") or []):
+                return True
+        return False
+
+    def get_archive_links(self, year, month):
+        """
+        All the article links on the archive pages of the month. The pages
+        also list the other press releases of the site, so a page without
+        any article about COVID-19 is not the end of the month.
+        """
+        links = []
+        page = 1
+        while True:
+            if page == 1:
+                url = ARCHIVE_URL.format(year=year, month=month)
+            else:
+                url = ARCHIVE_PAGE_URL.format(year=year, month=month, page=page)
+            r = self.session.get(url)
+            if r.status_code == 404:
+                # no more pages
+                break
+            r.raise_for_status()
+
+            soup = BeautifulSoup(r.content, "lxml",
+                                 parse_only=SoupStrainer(["a", "link"],
+                                                         href=True))
+            hrefs = [tag["href"] for tag in soup.find_all("a")]
+            if not any(POST_REGEX.match(href) for href in hrefs):
+                # a page without any post
+                break
+            links.extend(href for href in hrefs
+                         if ARTICLE_REGEX.match(href) and href not in links)
+            if not self.has_next_page(soup):
+                break
+            page += 1
+        return links
+
+    def crawl_month(self, year, month):
+        print(f"[INFO] Crawling the archive of {year}-{month:02d} ...")
+        crawl_time = datetime.now()
+        # the archive lists the latest articles first
+        for link in reversed(self.get_archive_links(year, month)):
+            date_key = '-'.join(ARTICLE_REGEX.match(link).groups())
+            date_urls = self.urls.setdefault(date_key, [])
+            if link not in date_urls:
+                date_urls.append(link)
+            self.missing.discard(date_key)
+
+        month_key = f"{year}-{month:02d}"
+        self.crawled_months[month_key] = crawl_time.isoformat(timespec='seconds')
+        # the dates already past when crawled but without any article
+        day = 1
+        while True:
+            try:
+                dt = datetime(year, month, day)
+            except ValueError:
+                break
+            date_key = str(dt.date())
+            if dt.date() < crawl_time.date() and date_key not in self.urls:
+                self.missing.add(date_key)
+            day += 1
+        self.save()
+
+    def needs_crawl(self, dt):
+        month_key = dt.strftime('%Y-%m')
+        if month_key not in self.crawled_months:
+            return True
+        # crawl again if the article might have been published after
+        crawl_time = datetime.fromisoformat(self.crawled_months[month_key])
+        return dt.date() >= crawl_time.date()
+
+    def is_missing(self, dt):
+        """
+        Whether the date is known to have no article in the archive, the
+        date is then reported by the scrapers without any request.
+        """
+        return str(dt.date()) in self.missing
+
+    def resolve(self, dt, preferred_url=None):
+        """
+        The URL of the article of the date, or None if not found. If there
+        are several articles on the date, `preferred_url` (i.e. the usual
+        format of the URL) is taken if found, otherwise the oldest one.
+        """
+        date_key = str(dt.date())
+        if date_key not in self.urls and date_key not in self.missing \
+                and self.needs_crawl(dt):
+            self.crawl_month(dt.year, dt.month)
+
+        date_urls = self.urls.get(date_key)
+        if not date_urls:
+            return None
+        if preferred_url in date_urls:
+            return preferred_url
+        return date_urls[0]
@@ -0,0 +1,190 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from state_table import CELL_JUNK, STATE_TOTAL
+
+# an inconsistency found on a date
+Violation = namedtuple("Violation", ["date", "check", "expected", "actual"])
+
+# the daily columns and their cumulative columns
+TALLIES = {"New Case": "Cumulative Case",
+           "Recovered": "Cumulative Recovered",
+           "Death": "Cumulative Death"}
+
+
+class Validator:
+    """
+    Consistency checks of the scraped data, done with NumPy on whole
+    columns:
+        - tally: the cumulative counts are the previous ones plus the
+          daily counts, e.g. the "5 angka" sentence giving 5 for the
+          cumulative recovered
+        - monotonic: the daily counts are never negative and the
+          cumulative counts never decrease
+        - active: Active Case = Cumulative Case - Cumulative Recovered
+          - Cumulative Death
+        - state_new, state_cumu: the sum of the states is the national count
+        - dates: one row per date without any gap
+
+    The last date and the last cumulative counts are kept, so each call of
+    `validate` only checks the rows appended since the previous call.
+    """
+
+    def __init__(self):
+        self.last_date = None
+        # the last cumulative counts, to check the next rows
+        self.totals = {}
+
+    def get_state(self):
+        return {"last_date": str(self.last_date.date()) if self.last_date
+                else None,
+                "totals": dict(self.totals)}
+
+    def set_state(self, state):
+        if not state:
+            return
+        self.last_date = pd.Timestamp(state["last_date"]) \
+            if state["last_date"] else None
+        self.totals = dict(state["totals"])
+
+    @staticmethod
+    def to_array(df, col):
+        """
+        The column as floats, with NaN for the missing values. The cells
+        of the scraped state tables like "28, 640" or "1,234 (5)" are
+        cleaned like `state_table.parse_count`, whatever their dtype.
+        """
+        values = df[col]
+        if not pd.api.types.is_numeric_dtype(values):
+            values = values.astype(str).str.replace(CELL_JUNK, '', regex=True)
+        return pd.to_numeric(values, errors='coerce').to_numpy(
+            dtype=float, na_value=np.nan)
+
+    @staticmethod
+    def to_value(value):
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+    def violations(self, dates, check, mask, expected, actual):
+        return [Violation(dates[i], check, self.to_value(expected[i].item()),
+                          self.to_value(actual[i].item()))
+                for i in np.flatnonzero(mask)]
+
+    def check_dates(self, dates):
+        days = dates.values.astype('datetime64[D]').astype(np.int64)
+        if self.last_date is not None:
+            previous = np.datetime64(self.last_date, 'D').astype(np.int64)
+            days = np.concatenate([[previous], days])
+        gaps = np.diff(days) != 1
+        expected = days[:-1] + 1
+        if self.last_date is None:
+            # the first date is fine
+            gaps = np.concatenate([[False], gaps])
+            expected = np.concatenate([days[:1], expected])
+        return self.violations(
+            dates, "dates", gaps, expected.astype('datetime64[D]').astype(str),
+            np.asarray(dates.date).astype(str))
+
+    def check_tallies(self, df, dates):
+        found = []
+        for daily_col, cumu_col in TALLIES.items():
+            if daily_col not in df or cumu_col not in df:
+                continue
+            daily = self.to_array(df, daily_col)
+            cumu = self.to_array(df, cumu_col)
+
+            found += self.violations(dates, "monotonic", daily < 0,
+                                     np.zeros_like(daily), daily)
+
+            previous = np.concatenate(
+                [[self.totals.get(cumu_col, np.nan)], cumu[:-1]])
+            # checked directly, the daily count may be missing or wrong too
+            last_known = pd.Series(previous).ffill().to_numpy()
+            found += self.violations(dates, f"monotonic: {cumu_col}",
+                                     cumu < last_known, last_known, cumu)
+
+            expected = previous + daily
+            # only where all the values are known
+            mask = ~np.isnan(expected) & ~np.isnan(cumu) & (expected != cumu)
+            found += self.violations(dates, f"tally: {cumu_col}", mask,
+                                     expected, cumu)
+
+            known = cumu[~np.isnan(cumu)]
+            if len(known):
+                self.totals[cumu_col] = float(known[-1])
+        return found
+
+    def check_active(self, df, dates):
+        columns = ["Active Case", "Cumulative Case", "Cumulative Recovered",
+                   "Cumulative Death"]
+        if not all(col in df for col in columns):
+            return []
+        active, case, recovered, death = (self.to_array(df, col)
+                                          for col in columns)
+        expected = case - recovered - death
+        mask = ~np.isnan(active) & ~np.isnan(expected) & (active != expected)
+        return self.violations(dates, "active", mask, expected, active)
+
+    def check_states(self, df, state_df, national_col, check, dates):
+        if state_df is None or national_col not in df:
+            return []
+        state_df = state_df.reindex(dates)
+        states = [col for col in state_df.columns
+                  if col not in (STATE_TOTAL, "URL")]
+        values = np.column_stack([self.to_array(state_df, col)
+                                  for col in states])
+        expected = self.to_array(df, national_col)
+        actual = values.sum(axis=1)
+        mask = ~np.isnan(expected) & ~np.isnan(actual) & (expected != actual)
+        return self.violations(dates, check, mask, expected, actual)
+
+    def validate(self, df, state_new=None, state_cumu=None):
+        """
+        Check the new rows of the national data `df`, and the state tables
+        (with the states as columns) if given, all indexed by date or with
+        a "Date" column. Returns the list of `Violation`.
+        """
+        df = df.set_index("Date") if "Date" in df else df
+        if not len(df):
+            return []
+        dates = pd.DatetimeIndex(df.index)
+        if state_new is not None and "Date" in state_new:
+            state_new = state_new.set_index("Date")
+        if state_cumu is not None and "Date" in state_cumu:
+            state_cumu = state_cumu.set_index("Date")
+
+        found = self.check_dates(dates)
+        found += self.check_tallies(df, dates)
+        found += self.check_active(df, dates)
+        found += self.check_states(df, state_new, "New Case", "state_new",
+                                   dates)
+        found += self.check_states(df, state_cumu, "Cumulative Case",
+                                   "state_cumu", dates)
+        self.last_date = dates[-1]
+        return sorted(found, key=lambda v: (v.date, v.check))
+
+
+def print_violations(violations):
+    for v in violations:
+        print(f"[WARNING] {v.check} on {v.date.date()}: "
+              f"expected {v.expected}, found {v.actual}")
+
+
+if __name__ == '__main__':
+    import time
+
+    from data_store import read_csv_table
+
+    df = read_csv_table("cleaned_all")
+    state_new = read_csv_table("state_all")
+    state_cumu = read_csv_table("state_cumu")
+
+    start_time = time.perf_counter()
+    violations = Validator().validate(df, state_new, state_cumu)
+    total_time = time.perf_counter() - start_time
+    print_violations(violations)
+    print(f"[INFO] {len(violations)} problems found in {len(df)} days "
+          f"({1000 * total_time:.1f} ms)")